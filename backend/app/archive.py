@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+多文件打包下载
+边读取文件边生成ZIP并分块发送，不生成临时压缩包，内存占用与文件数量和大小无关
+
+- 已压缩的媒体（图片、视频、音频、压缩包等）直接存储（STORED），其他文件使用DEFLATE压缩
+- 输出不可回退：每个条目的CRC和大小写在数据描述符中，大文件自动使用ZIP64
+- 包内同名文件自动加序号，磁盘上已缺失的文件跳过；冷存储的文件边解压边写入（见 app.tiering）
+- 已写入压缩包的文件一次性累加下载次数（见 app.counters）
+"""
+
+import logging
+import os
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, List, Sequence
+
+from fastapi.responses import StreamingResponse
+
+from app.counters import record_downloads
+from app.tiering import open_stored_file
+
+logger = logging.getLogger(__name__)
+
+# 每次读取的字节数
+CHUNK_SIZE = 256 * 1024
+# 已压缩格式：再次压缩几乎没有收益，直接存储
+STORED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp4", ".mov", ".avi", ".mkv", ".webm", ".flv", ".wmv",
+    ".mp3", ".aac", ".ogg", ".flac", ".m4a", ".wma",
+    ".zip", ".rar", ".7z", ".gz",
+    ".docx", ".xlsx", ".pptx", ".pdf",
+}
+# ZIP格式支持的最早时间
+ZIP_EPOCH = datetime(1980, 1, 1)
+
+
+@dataclass(frozen=True)
+class ArchiveEntry:
+    """压缩包中的一个文件"""
+    file_id: int
+    filename: str
+    file_path: str
+    storage_tier: str
+    name: str
+    size: int
+    modified_at: datetime
+
+
+class _Sink:
+    """ZipFile的输出目标：收集写入的字节，由生成器取走后发送"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def unique_names(names: Sequence[str]) -> List[str]:
+    """去掉路径部分，同名文件加序号：a.jpg, a (2).jpg"""
+    used = set()
+    result = []
+    for index, name in enumerate(names):
+        name = os.path.basename(name.replace("\\", "/")) or f"file-{index + 1}"
+        candidate = name
+        stem, ext = os.path.splitext(name)
+        counter = 2
+        while candidate.lower() in used:
+            candidate = f"{stem} ({counter}){ext}"
+            counter += 1
+        used.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+def build_entries(records) -> List[ArchiveEntry]:
+    """文件记录 -> 压缩包条目（在请求会话关闭前调用，之后只读取磁盘）"""
+    names = unique_names([record.original_filename for record in records])
+    return [
+        ArchiveEntry(
+            file_id=record.id,
+            filename=record.filename,
+            file_path=record.file_path,
+            storage_tier=record.storage_tier,
+            name=name,
+            size=record.file_size or 0,
+            modified_at=record.updated_at or record.created_at or ZIP_EPOCH,
+        )
+        for record, name in zip(records, names)
+    ]
+
+
+def iter_archive(entries: Sequence[ArchiveEntry]) -> Iterator[bytes]:
+    """逐块生成ZIP内容（同步生成器，由 StreamingResponse 在线程池中迭代）"""
+    sink = _Sink()
+    written = []
+    try:
+        with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+            for entry in entries:
+                try:
+                    source = open_stored_file(entry)
+                except OSError as e:
+                    logger.warning(f"⚠️ 打包时跳过缺失的文件 {entry.file_id}: {e}")
+                    continue
+
+                with source:
+                    info = zipfile.ZipInfo(entry.name, date_time=max(entry.modified_at, ZIP_EPOCH).timetuple()[:6])
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                    # 预估大小用于判断是否需要ZIP64，写入完成后由实际大小覆盖
+                    info.file_size = entry.size
+                    with archive.open(info, "w") as target:
+                        while True:
+                            chunk = source.read(CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            target.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+                written.append(entry.file_id)
+                data = sink.drain()
+                if data:
+                    yield data
+        # 中央目录
+        yield sink.drain()
+    finally:
+        # 客户端中途断开时只统计已完整发送的文件
+        if written:
+            record_downloads(written)
+
+
+def archive_response(records) -> StreamingResponse:
+    """构建ZIP打包下载响应"""
+    entries = build_entries(records)
+    filename = f"files-{datetime.now():%Y%m%d%H%M%S}.zip"
+    return StreamingResponse(
+        iter_archive(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+数据备份与恢复
+将四张记录表做一致性逻辑导出，上传目录和冷存储目录按内容哈希增量备份到本地目录
+
+备份目录结构:
+    <target>/objects/ab/abcdef...        按SHA256存放的上传文件（多个快照共享）
+    <target>/snapshots/<名称>/db/*.ndjson.gz  表数据
+    <target>/snapshots/<名称>/manifest.json   快照清单（表行数/校验和、文件哈希/大小，冷存储文件单独记录在 cold_files）
+    <target>/LATEST                         最近一次快照名称
+
+用法:
+    python -m app.backup backup  --target /data/backup
+    python -m app.backup verify  --target /data/backup [--snapshot 名称]
+    python -m app.backup restore --target /data/backup [--snapshot 名称] --yes
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import DateTime, delete, insert, select
+
+from app.cache import client as cache_client
+from app.config import settings
+from app.database import engine
+from app.entity_cache import invalidate_tables
+from app.export import EXPORT_BATCH_SIZE, serialize_value
+from app.models import CalendarNote, FileRecord, FoodRecord, MovieRecord
+from app.storage_usage import rebuild_ledger
+from app.sync import mark_reset
+
+logger = logging.getLogger(__name__)
+
+# 参与备份的记录表
+BACKUP_MODELS = [FoodRecord, MovieRecord, CalendarNote, FileRecord]
+
+HASH_CHUNK_SIZE = 1024 * 1024
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str) -> str:
+    """流式计算文件SHA256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def object_path(target: str, sha256: str) -> str:
+    """内容寻址对象路径"""
+    return os.path.join(target, "objects", sha256[:2], sha256)
+
+
+def snapshot_dir(target: str, name: str) -> str:
+    return os.path.join(target, "snapshots", name)
+
+
+def latest_snapshot(target: str) -> Optional[str]:
+    """读取最近一次快照名称"""
+    path = os.path.join(target, "LATEST")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def load_manifest(target: str, name: str) -> dict:
+    with open(os.path.join(snapshot_dir(target, name), "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dump_tables(connection, db_dir: str) -> Dict[str, dict]:
+    """
+    在同一个一致性快照事务中导出所有记录表
+
+    Returns:
+        dict: 表名 -> {file, rows, sha256}
+    """
+    if connection.dialect.name == "mysql":
+        connection.exec_driver_sql("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        connection.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+
+    tables = {}
+    for model in BACKUP_MODELS:
+        table = model.__table__
+        columns = [column.name for column in table.columns]
+        filename = f"{table.name}.ndjson.gz"
+        digest = hashlib.sha256()
+        rows = 0
+
+        result = connection.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(
+            select(table).order_by(table.c.id)
+        )
+        with gzip.open(os.path.join(db_dir, filename), "wb") as out:
+            for partition in result.partitions():
+                lines = "".join(
+                    json.dumps(
+                        {name: serialize_value(value) for name, value in zip(columns, row)},
+                        ensure_ascii=False
+                    ) + "\n"
+                    for row in partition
+                ).encode("utf-8")
+                digest.update(lines)
+                out.write(lines)
+                rows += len(partition)
+
+        tables[table.name] = {"file": filename, "rows": rows, "sha256": digest.hexdigest()}
+        logger.info(f"📦 导出 {table.name}: {rows} 行")
+
+    connection.rollback()
+    return tables
+
+
+def iter_upload_files(upload_dir: str):
+    """遍历上传目录，返回(相对路径, stat)"""
+    for root, _, filenames in os.walk(upload_dir):
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+            yield os.path.relpath(path, upload_dir).replace(os.sep, "/"), os.stat(path)
+
+
+def backup_uploads(target: str, upload_dir: str, previous: Dict[str, dict]) -> Tuple[Dict[str, dict], dict]:
+    """
+    增量备份上传目录：大小和修改时间未变的文件沿用上次的哈希，对象已存在的文件不再复制
+
+    Returns:
+        (文件清单, 统计信息)
+    """
+    files = {}
+    stats = {"files": 0, "hashed": 0, "copied": 0, "copied_bytes": 0}
+
+    for rel_path, st in iter_upload_files(upload_dir):
+        stats["files"] += 1
+        old = previous.get(rel_path)
+        if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            sha256 = old["sha256"]
+        else:
+            sha256 = file_sha256(os.path.join(upload_dir, rel_path))
+            stats["hashed"] += 1
+
+        dest = object_path(target, sha256)
+        if not os.path.exists(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp = dest + ".part"
+            shutil.copyfile(os.path.join(upload_dir, rel_path), tmp)
+            os.replace(tmp, dest)
+            stats["copied"] += 1
+            stats["copied_bytes"] += st.st_size
+
+        files[rel_path] = {"sha256": sha256, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    return files, stats
+
+
+def create_backup(target: str, upload_dir: str = None, cold_dir: str = None) -> str:
+    """
+    创建一次快照备份
+
+    Returns:
+        str: 快照名称
+    """
+    upload_dir = upload_dir or settings.upload_dir
+    cold_dir = cold_dir or settings.cold_storage_dir
+    name = datetime.now().strftime("%Y%m%d-%H%M%S")
+    snap_dir = snapshot_dir(target, name)
+    db_dir = os.path.join(snap_dir, "db")
+    os.makedirs(db_dir, exist_ok=True)
+
+    previous_name = latest_snapshot(target)
+    previous = load_manifest(target, previous_name) if previous_name else {}
+
+    # 先导出数据库：此后删除的文件仍会保留在上传目录中，保证记录引用的文件都能备份到
+    with engine.connect() as connection:
+        tables = dump_tables(connection, db_dir)
+
+    files, stats = backup_uploads(target, upload_dir, previous.get("files", {}))
+    # 冷存储中是压缩后的内容，恢复时原样放回
+    cold_files, cold_stats = backup_uploads(target, cold_dir, previous.get("cold_files", {}))
+    for key, value in cold_stats.items():
+        stats[key] += value
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "name": name,
+        "created_at": datetime.now().isoformat(),
+        "previous": previous_name,
+        "tables": tables,
+        "files": files,
+        "cold_files": cold_files,
+    }
+    with open(os.path.join(snap_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    with open(os.path.join(target, "LATEST"), "w", encoding="utf-8") as f:
+        f.write(name)
+
+    logger.info(
+        f"✅ 快照 {name} 完成: 文件 {stats['files']} 个, 重新计算哈希 {stats['hashed']} 个, "
+        f"新复制 {stats['copied']} 个 ({stats['copied_bytes'] / 1024 / 1024:.1f}MB)"
+    )
+    return name
+
+
+def verify_backup(target: str, name: str = None, quick: bool = False) -> list:
+    """
+    校验快照完整性
+
+    Args:
+        quick: 只检查对象存在与大小，不重新计算哈希
+
+    Returns:
+        list: 错误信息列表，为空表示校验通过
+    """
+    name = name or latest_snapshot(target)
+    manifest = load_manifest(target, name)
+    db_dir = os.path.join(snapshot_dir(target, name), "db")
+    errors = []
+
+    for table_name, info in manifest["tables"].items():
+        path = os.path.join(db_dir, info["file"])
+        if not os.path.exists(path):
+            errors.append(f"缺少表数据文件: {info['file']}")
+            continue
+        digest = hashlib.sha256()
+        rows = 0
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                digest.update(line)
+                rows += 1
+        if rows != info["rows"] or digest.hexdigest() != info["sha256"]:
+            errors.append(f"表数据校验失败: {table_name}")
+
+    for rel_path, info in list(manifest["files"].items()) + list(manifest.get("cold_files", {}).items()):
+        path = object_path(target, info["sha256"])
+        if not os.path.exists(path):
+            errors.append(f"缺少文件对象: {rel_path}")
+        elif os.path.getsize(path) != info["size"]:
+            errors.append(f"文件大小不一致: {rel_path}")
+        elif not quick and file_sha256(path) != info["sha256"]:
+            errors.append(f"文件哈希不一致: {rel_path}")
+
+    return errors
+
+
+def parse_row(table, row: dict) -> dict:
+    """把导出的JSON行转换回可插入的值"""
+    for column in table.columns:
+        value = row.get(column.name)
+        if value is not None and isinstance(column.type, DateTime):
+            row[column.name] = datetime.fromisoformat(value)
+    return row
+
+
+def restore_backup(target: str, name: str = None, upload_dir: str = None, cold_dir: str = None):
+    """从快照恢复数据库记录表、上传目录和冷存储目录（会覆盖现有数据）"""
+    name = name or latest_snapshot(target)
+    upload_dir = upload_dir or settings.upload_dir
+    cold_dir = cold_dir or settings.cold_storage_dir
+    manifest = load_manifest(target, name)
+    db_dir = os.path.join(snapshot_dir(target, name), "db")
+
+    with engine.begin() as connection:
+        # 按依赖逆序清空，按顺序写入
+        for model in reversed(BACKUP_MODELS):
+            connection.execute(delete(model.__table__))
+
+        for model in BACKUP_MODELS:
+            table = model.__table__
+            info = manifest["tables"][table.name]
+            batch = []
+            with gzip.open(os.path.join(db_dir, info["file"]), "rt", encoding="utf-8") as f:
+                for line in f:
+                    batch.append(parse_row(table, json.loads(line)))
+                    if len(batch) >= EXPORT_BATCH_SIZE:
+                        connection.execute(insert(table), batch)
+                        batch = []
+            if batch:
+                connection.execute(insert(table), batch)
+            logger.info(f"♻️ 恢复 {table.name}: {info['rows']} 行")
+
+    rebuild_ledger()
+    # Core语句直接写表，不经过ORM会话，需手动失效共享缓存并要求同步客户端全量拉取
+    cache_client.invalidate([model.__tablename__ for model in BACKUP_MODELS] + ["storage_usage"])
+    invalidate_tables(model.__tablename__ for model in BACKUP_MODELS)
+    mark_reset()
+
+    restored = 0
+    entries = [(upload_dir, rel_path, info) for rel_path, info in manifest["files"].items()]
+    entries += [(cold_dir, rel_path, info) for rel_path, info in manifest.get("cold_files", {}).items()]
+    for base_dir, rel_path, info in entries:
+        dest = os.path.join(base_dir, rel_path)
+        if os.path.exists(dest) and os.path.getsize(dest) == info["size"] and file_sha256(dest) == info["sha256"]:
+            continue
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(object_path(target, info["sha256"]), dest + ".part")
+        os.replace(dest + ".part", dest)
+        restored += 1
+
+    logger.info(f"✅ 快照 {name} 恢复完成，恢复文件 {restored} 个")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="小雨微寒数据备份工具")
+    parser.add_argument("command", choices=["backup", "verify", "restore"])
+    parser.add_argument("--target", required=True, help="备份目录")
+    parser.add_argument("--snapshot", help="快照名称（默认最近一次）")
+    parser.add_argument("--upload-dir", help="上传目录（默认使用配置）")
+    parser.add_argument("--cold-dir", help="冷存储目录（默认使用配置）")
+    parser.add_argument("--quick", action="store_true", help="校验时只检查文件大小")
+    parser.add_argument("--yes", action="store_true", help="确认恢复（会覆盖现有数据）")
+    args = parser.parse_args()
+
+    target = os.path.abspath(args.target)
+
+    if args.command == "backup":
+        os.makedirs(target, exist_ok=True)
+        create_backup(target, args.upload_dir, args.cold_dir)
+    elif args.command == "verify":
+        errors = verify_backup(target, args.snapshot, args.quick)
+        for error in errors:
+            print(f"❌ {error}")
+        if errors:
+            return 1
+        print("✅ 快照校验通过")
+    else:
+        if not args.yes:
+            print("❌ 恢复会覆盖数据库记录和上传文件，请添加 --yes 确认")
+            return 1
+        restore_backup(target, args.snapshot, args.upload_dir, args.cold_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+共享缓存客户端与接口响应缓存
+- 通过unix socket访问 app.cache_server 守护进程，所有worker共用同一份缓存
+- 守护进程不可用时按未命中处理（fail open），并在一段时间内不再重连
+- 数据提交后按表递增版本号并删除相关缓存（见 app.changes）
+"""
+
+import json
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.cache_server import FRAME_HEADER, decode_body, encode_frame
+from app.changes import Change, on_commit
+from app.config import settings
+from app.database import read_route
+from app.profiler import profiling
+
+logger = logging.getLogger(__name__)
+
+# 请求超时（秒），本机socket正常情况下远小于该值
+SOCKET_TIMEOUT = 0.2
+# 连接失败后暂停访问缓存的时长
+RETRY_AFTER_SECONDS = 5.0
+
+# 接口路径前缀 -> 响应依赖的表
+ROUTE_TABLES = [
+    ("/api/food", ("food_records",)),
+    ("/api/movie", ("movie_records", "movie_similar")),
+    ("/api/calendar", ("calendar_notes",)),
+    ("/api/files", ("file_records", "storage_usage")),
+    ("/api/timeline", ("food_records", "movie_records", "calendar_notes", "file_records")),
+]
+# 不缓存的路径（流式导出、文件下载、打包下载）
+UNCACHED_PATTERNS = ("/export", "/files/download/", "/files/archive")
+
+
+class CacheClient:
+    """缓存守护进程客户端（每个线程一个连接）"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.local = threading.local()
+        self.down_until = 0.0
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self.local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(SOCKET_TIMEOUT)
+            sock.connect(self.socket_path)
+            self.local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self.local, "sock", None)
+        self.local.sock = None
+        if sock is not None:
+            sock.close()
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = sock.recv(size)
+            if not chunk:
+                raise ConnectionError("缓存连接已关闭")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def call(self, header: dict, value: bytes = b"") -> Optional[Tuple[dict, bytes]]:
+        """发送请求，失败时返回None"""
+        if not settings.cache_enabled or time.monotonic() < self.down_until:
+            return None
+        try:
+            sock = self._connection()
+            sock.sendall(encode_frame(header, value))
+            length = FRAME_HEADER.unpack(self._recv_exact(sock, FRAME_HEADER.size))[0]
+            return decode_body(self._recv_exact(sock, length))
+        except (OSError, ValueError) as e:
+            self._close()
+            self.down_until = time.monotonic() + RETRY_AFTER_SECONDS
+            logger.warning(f"⚠️ 共享缓存不可用，{RETRY_AFTER_SECONDS:.0f}秒内跳过缓存: {e}")
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        result = self.call({"op": "get", "key": key})
+        if result and result[0].get("hit"):
+            return result[1]
+        return None
+
+    def versions(self, tags: Iterable[str]) -> Optional[Dict[str, int]]:
+        """读取表版本号（计算结果之前读取，写入时用于检测期间是否有修改）"""
+        result = self.call({"op": "versions", "tags": list(tags)})
+        return result[0]["versions"] if result else None
+
+    def set(self, key: str, value: bytes, versions: Dict[str, int], ttl: float = None) -> bool:
+        ttl = settings.cache_ttl_seconds if ttl is None else ttl
+        result = self.call({"op": "set", "key": key, "tags": versions, "ttl": ttl}, value)
+        return bool(result and result[0].get("stored"))
+
+    def invalidate(self, tags: Iterable[str]):
+        self.call({"op": "invalidate", "tags": sorted(set(tags))})
+
+    def stats(self) -> Optional[dict]:
+        result = self.call({"op": "stats"})
+        return result[0]["stats"] if result else None
+
+
+client = CacheClient(settings.cache_socket_path)
+
+
+@on_commit
+def invalidate_changes(changes: List[Change]):
+    """数据提交后失效相关表的缓存"""
+    client.invalidate(change.table for change in changes)
+
+
+def route_tables(path: str) -> Optional[Tuple[str, ...]]:
+    """可缓存的接口返回其依赖的表，否则返回None"""
+    if any(pattern in path for pattern in UNCACHED_PATTERNS):
+        return None
+    for prefix, tables in ROUTE_TABLES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return tables
+    return None
+
+
+def replica_caught_up(versions: Dict[str, int]) -> bool:
+    """
+    响应由只读副本计算时，只有副本心跳晚于相关表最近一次写入才写入缓存，
+    否则可能把副本上的旧数据以新版本号缓存下来
+    （表版本号由缓存守护进程按写入时刻的纳秒时间生成）
+    """
+    route = read_route.get()
+    if not route or route.get("beat_ms") is None:
+        return True
+    return route["beat_ms"] * 1_000_000 > max(versions.values(), default=0)
+
+
+def cached_json(key: str, tables: Iterable[str], compute: Callable[[], Any], ttl: float = None) -> Any:
+    """读取缓存的JSON结果，未命中时计算并写入（版本号在计算前读取，期间表被修改则不写入）"""
+    body = client.get(key)
+    if body is not None:
+        return json.loads(body)
+    versions = client.versions(tables)
+    value = compute()
+    if versions is not None and replica_caught_up(versions):
+        client.set(key, json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), versions, ttl)
+    return value
+
+
+class ResponseCacheMiddleware:
+    """ASGI中间件：缓存GET接口的JSON响应"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not settings.cache_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        tables = route_tables(scope["path"])
+        if tables is None or profiling(scope):
+            await self.app(scope, receive, send)
+            return
+
+        query = "&".join(sorted(scope.get("query_string", b"").decode("latin-1").split("&")))
+        key = f"resp:{scope['path']}?{query}"
+
+        body = client.get(key)
+        if body is not None:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-cache", b"HIT"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        versions = client.versions(tables)
+        if versions is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"cacheable": False, "chunks": [], "size": 0}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                state["cacheable"] = message["status"] == 200 and content_type.startswith(b"application/json")
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-cache", b"MISS")]}
+            elif message["type"] == "http.response.body" and state["cacheable"]:
+                chunk = message.get("body", b"")
+                state["size"] += len(chunk)
+                if state["size"] > settings.cache_max_entry_bytes:
+                    state["cacheable"] = False
+                    state["chunks"] = []
+                else:
+                    state["chunks"].append(chunk)
+                if not message.get("more_body", False) and state["cacheable"] and replica_caught_up(versions):
+                    client.set(key, b"".join(state["chunks"]), versions)
+            await send(message)
+
+        await self.app(scope, receive, capture)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+本机共享缓存守护进程
+所有gunicorn worker（以及任务worker）通过unix socket读写同一份缓存
+
+- 按字节预算做LRU淘汰，条目可设置过期时间
+- 每个条目带有所依赖表的版本号（标签）；表被写入后版本号递增，相关条目立即删除，
+  写入缓存时若携带的版本号已过期（计算期间表被修改）则拒绝写入
+- 版本号以守护进程启动时的纳秒时间为起点，重启后不会与旧版本号重复；
+  记录级标签很多时定期抬高起点并清空已记录的版本号
+- 记录命中/未命中等计数
+- 定期及退出时把最近使用的条目写入快照，重启后校验并载入（见 app.cache_snapshot）
+
+协议：每个帧为 4字节长度 + JSON头 + "\\n" + 值（二进制）
+
+用法:
+    python -m app.cache_server   # 通常由gunicorn的on_starting钩子启动
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct("<I")
+# 单个帧的最大长度（防止异常客户端耗尽内存）
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+# 每个条目的额外开销估算（字典、元组等）
+ENTRY_OVERHEAD = 200
+# 记录级标签（实体缓存）的版本号超过该数量时整体重置
+MAX_TAG_VERSIONS = 100000
+
+
+def encode_frame(header: dict, value: bytes = b"") -> bytes:
+    body = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n" + value
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def decode_body(body: bytes) -> Tuple[dict, bytes]:
+    header, _, value = body.partition(b"\n")
+    return json.loads(header), value
+
+
+class CacheStore:
+    """带标签版本的LRU缓存"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Tuple[bytes, Dict[str, int], float, int]]" = OrderedDict()
+        self.tag_keys: Dict[str, set] = {}
+        self.base_version = time.time_ns()
+        self.started_version = self.base_version
+        self.versions: Dict[str, int] = {}
+        self.bytes = 0
+        self.counters = {
+            "hits": 0, "misses": 0, "sets": 0, "stale_sets": 0, "evictions": 0, "invalidations": 0, "restored": 0
+        }
+
+    def version(self, tag: str) -> int:
+        return self.versions.get(tag, self.base_version)
+
+    def _remove(self, key: str):
+        value, tags, _, size = self.entries.pop(key)
+        self.bytes -= size
+        for tag in tags:
+            keys = self.tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_keys[tag]
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        if entry[2] and entry[2] < time.monotonic():
+            self._remove(key)
+            self.counters["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return entry[0]
+
+    def set(self, key: str, value: bytes, tags: Dict[str, int], ttl: float) -> bool:
+        """写入条目，标签版本号过期时拒绝"""
+        if any(self.version(tag) != version for tag, version in tags.items()):
+            self.counters["stale_sets"] += 1
+            return False
+
+        size = len(key) + len(value) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return False
+        if key in self.entries:
+            self._remove(key)
+
+        self.entries[key] = (value, tags, time.monotonic() + ttl if ttl else 0, size)
+        self.bytes += size
+        for tag in tags:
+            self.tag_keys.setdefault(tag, set()).add(key)
+        self.counters["sets"] += 1
+
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.counters["evictions"] += 1
+        return True
+
+    def invalidate(self, tags) -> Dict[str, int]:
+        """递增表版本号并删除依赖这些表的条目"""
+        if len(self.versions) > MAX_TAG_VERSIONS:
+            # 抬高起点并清空：已缓存的条目仍然有效，计算中的结果携带旧版本号，写入时会被拒绝
+            self.base_version = max(time.time_ns(), max(self.versions.values()) + 1)
+            self.versions.clear()
+        for tag in tags:
+            self.versions[tag] = max(self.version(tag), time.time_ns()) + 1
+            for key in list(self.tag_keys.pop(tag, ())):
+                if key in self.entries:
+                    self._remove(key)
+            self.counters["invalidations"] += 1
+        return {tag: self.version(tag) for tag in tags}
+
+    def invalidated_since_start(self, tag: str) -> bool:
+        return tag in self.versions or self.base_version != self.started_version
+
+    def snapshot_entries(self, max_bytes: int) -> List[Tuple[str, bytes, List[str], float]]:
+        """按最近使用顺序导出未过期的条目，总大小不超过 max_bytes"""
+        now = time.monotonic()
+        entries = []
+        total = 0
+        for key, (value, tags, expires, size) in reversed(self.entries.items()):
+            if expires and expires <= now:
+                continue
+            total += size
+            if total > max_bytes:
+                break
+            entries.append((key, value, list(tags), expires - now if expires else 0))
+        return entries
+
+    def restore(self, entries) -> int:
+        """
+        载入快照条目（最近使用的在前），放在LRU的冷端，不挤占启动后写入的条目
+
+        依赖的标签自启动以来被失效过的条目跳过（校验快照期间发生的写入）
+        """
+        restored = 0
+        for key, value, tags, ttl in entries:
+            if key in self.entries or any(self.invalidated_since_start(tag) for tag in tags):
+                continue
+            size = len(key) + len(value) + ENTRY_OVERHEAD
+            if self.bytes + size > self.max_bytes:
+                break
+            self.entries[key] = (value, {tag: self.version(tag) for tag in tags}, time.monotonic() + ttl if ttl else 0, size)
+            self.entries.move_to_end(key, last=False)
+            self.bytes += size
+            for tag in tags:
+                self.tag_keys.setdefault(tag, set()).add(key)
+            restored += 1
+        self.counters["restored"] += restored
+        return restored
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "pid": os.getpid(),
+        }
+
+    def handle(self, header: dict, value: bytes) -> Tuple[dict, bytes]:
+        op = header.get("op")
+        if op == "get":
+            found = self.get(header["key"])
+            return ({"hit": True}, found) if found is not None else ({"hit": False}, b"")
+        if op == "set":
+            return {"stored": self.set(header["key"], value, header.get("tags") or {}, header.get("ttl") or 0)}, b""
+        if op == "versions":
+            return {"versions": {tag: self.version(tag) for tag in header.get("tags", [])}}, b""
+        if op == "invalidate":
+            return {"versions": self.invalidate(header.get("tags", []))}, b""
+        if op == "stats":
+            return {"stats": self.stats()}, b""
+        return {"error": f"unknown op: {op}"}, b""
+
+
+async def serve_client(store: CacheStore, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))[0]
+            if length > MAX_FRAME_SIZE:
+                break
+            header, value = decode_body(await reader.readexactly(length))
+            writer.write(encode_frame(*store.handle(header, value)))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    except Exception as e:
+        logger.error(f"缓存请求处理失败: {e}")
+    finally:
+        writer.close()
+
+
+def save_snapshot(store: CacheStore, path: str):
+    """写入快照（退出时调用）"""
+    from app.cache_snapshot import write_snapshot
+
+    entries = store.snapshot_entries(settings.cache_snapshot_max_bytes)
+    size = write_snapshot(path, entries)
+    logger.info(f"🗄️ 缓存快照已写入: {len(entries)} 个条目, {size / 1024 / 1024:.1f}MB")
+
+
+async def snapshot_loop(store: CacheStore, path: str, loaded: asyncio.Event):
+    """启动时校验并载入快照，之后定期写入快照（缓存有变化时）"""
+    # 快照模块使用本模块的帧格式，延迟导入避免循环导入
+    from app.cache_snapshot import validated_entries, write_snapshot
+
+    try:
+        entries = await asyncio.to_thread(validated_entries, path)
+        if entries:
+            logger.info(f"🗄️ 从快照载入 {store.restore(entries)} 个缓存条目")
+    except Exception as e:
+        logger.warning(f"⚠️ 载入缓存快照失败: {e}")
+    loaded.set()
+
+    interval = settings.cache_snapshot_interval_seconds
+    if interval <= 0:
+        return
+    last_state = None
+    while True:
+        await asyncio.sleep(interval)
+        state = (store.counters["sets"], store.counters["invalidations"], store.counters["evictions"], len(store.entries))
+        if state == last_state:
+            continue
+        try:
+            entries = store.snapshot_entries(settings.cache_snapshot_max_bytes)
+            await asyncio.to_thread(write_snapshot, path, entries)
+            last_state = state
+        except Exception as e:
+            logger.warning(f"⚠️ 写入缓存快照失败: {e}")
+
+
+async def serve(socket_path: str, max_bytes: int):
+    store = CacheStore(max_bytes)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = await asyncio.start_unix_server(lambda r, w: serve_client(store, r, w), path=socket_path)
+    os.chmod(socket_path, 0o600)
+    logger.info(f"🗄️ 缓存守护进程已启动: {socket_path} (预算 {max_bytes / 1024 / 1024:.0f}MB)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    snapshot_path = settings.cache_snapshot_path
+    snapshot_loaded = asyncio.Event()
+    snapshot_task = asyncio.create_task(snapshot_loop(store, snapshot_path, snapshot_loaded)) if snapshot_path else None
+
+    async with server:
+        await stop.wait()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+    # 快照尚未载入完就退出时保留原快照
+    if snapshot_task is not None and snapshot_loaded.is_set():
+        try:
+            save_snapshot(store, snapshot_path)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入缓存快照失败: {e}")
+    logger.info(f"缓存守护进程退出: {store.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本机共享缓存守护进程")
+    parser.add_argument("--socket", default=settings.cache_socket_path, help="unix socket路径")
+    parser.add_argument("--max-bytes", type=int, default=settings.cache_max_bytes, help="缓存字节预算")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.socket, args.max_bytes))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
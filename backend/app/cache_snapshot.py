@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+共享缓存快照
+缓存守护进程定期（以及退出时）把最近使用的条目写入快照文件（默认位于 /dev/shm），
+重启后先按 change_log 校验再载入，gunicorn整体重启（如 update.sh）后缓存不必从零开始
+
+- 快照只保存条目的键、值、依赖的标签和剩余有效期，按最近使用顺序保存，总大小受 CACHE_SNAPSHOT_MAX_BYTES 限制
+- 校验：读取快照时刻（减去 SYNC_SETTLE_SECONDS 提交顺序窗口）之后写入的变更，
+  依赖被修改的表或记录的条目丢弃；依赖未写入 change_log 的表（如存储台账、相似电影）的条目无法校验，同样丢弃；
+  期间发生过整体重置（备份恢复）或快照超过 CACHE_SNAPSHOT_MAX_AGE_SECONDS 时不载入
+- 校验期间守护进程照常服务；校验通过的条目只在其依赖的标签自启动以来未被失效时才载入（见 CacheStore.restore）
+
+文件格式：与缓存协议相同的帧，首帧为元信息，其后每帧一个条目
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.cache_server import FRAME_HEADER, decode_body, encode_frame
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# (键, 值, 依赖的标签, 剩余有效期秒数，0表示不过期)
+SnapshotEntry = Tuple[str, bytes, List[str], float]
+
+
+def write_snapshot(path: str, entries: List[SnapshotEntry]) -> int:
+    """写入快照文件（先写临时文件再改名），返回文件大小"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(encode_frame({"version": SNAPSHOT_VERSION, "created_at": time.time(), "entries": len(entries)}))
+            for key, value, tags, ttl in entries:
+                f.write(encode_frame({"key": key, "tags": tags, "ttl": ttl}, value))
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return os.path.getsize(path)
+
+
+def _read_frames(f) -> Iterator[Tuple[dict, bytes]]:
+    while True:
+        prefix = f.read(FRAME_HEADER.size)
+        if len(prefix) < FRAME_HEADER.size:
+            return
+        length = FRAME_HEADER.unpack(prefix)[0]
+        body = f.read(length)
+        if len(body) < length:
+            raise ValueError("快照文件不完整")
+        yield decode_body(body)
+
+
+def read_snapshot(path: str) -> Tuple[Optional[datetime], List[SnapshotEntry]]:
+    """
+    读取快照，剩余有效期按快照至今经过的时间扣减，已过期的条目跳过
+
+    Returns:
+        (快照时间, 条目列表)；文件不存在、版本不符或超过最大保留时长时为 (None, [])
+    """
+    if not os.path.exists(path):
+        return None, []
+    entries = []
+    with open(path, "rb") as f:
+        frames = _read_frames(f)
+        meta, _ = next(frames, ({}, b""))
+        if meta.get("version") != SNAPSHOT_VERSION:
+            return None, []
+        age = time.time() - meta["created_at"]
+        if age < 0 or age > settings.cache_snapshot_max_age_seconds:
+            logger.info(f"🗄️ 缓存快照已过期({age:.0f}s)，不载入")
+            return None, []
+        for header, value in frames:
+            ttl = header["ttl"]
+            if ttl:
+                ttl -= age
+                if ttl <= 0:
+                    continue
+            entries.append((header["key"], value, header["tags"], ttl))
+    return datetime.fromtimestamp(meta["created_at"]), entries
+
+
+def stale_tag_checker(since: datetime) -> Optional[Callable[[str], bool]]:
+    """
+    读取 since 之后的变更，返回判断标签是否已失效的函数；发生过整体重置时返回None
+
+    标签形式：表名（接口响应）、表名:* / 表名:ID / 表名:字段=值（实体缓存，见 app.entity_cache）
+    """
+    # 只在载入快照时使用数据库，守护进程平时不连接数据库
+    from app.database import SessionLocal
+    from app.models import ChangeLog
+    from app.sync import RESET, TRACKED_TABLES
+
+    db = SessionLocal()
+    try:
+        rows = db.query(ChangeLog.table_name, ChangeLog.record_id, ChangeLog.op).filter(
+            ChangeLog.created_at >= since - timedelta(seconds=settings.sync_settle_seconds)
+        ).distinct().all()
+    finally:
+        db.close()
+
+    changed: Dict[str, Optional[Set[str]]] = {}
+    for table, record_id, op in rows:
+        if op == RESET:
+            return None
+        if record_id is None:
+            # 批量语句：整张表的记录都可能变化
+            changed[table] = None
+        elif changed.get(table, set()) is not None:
+            changed.setdefault(table, set()).add(str(record_id))
+
+    def is_stale(tag: str) -> bool:
+        table, _, rest = tag.partition(":")
+        if table not in TRACKED_TABLES:
+            return True
+        if table not in changed:
+            return False
+        ids = changed[table]
+        if not rest or ids is None or "=" in rest:
+            # 表级标签、批量修改，或按其他字段查找的记录（无法由ID对应）
+            return True
+        return rest in ids
+
+    return is_stale
+
+
+def validated_entries(path: str) -> List[SnapshotEntry]:
+    """读取快照并丢弃可能已过期的条目"""
+    created_at, entries = read_snapshot(path)
+    if not entries:
+        return []
+    is_stale = stale_tag_checker(created_at)
+    if is_stale is None:
+        logger.info("🗄️ 快照之后数据被整体重置，不载入缓存快照")
+        return []
+    valid = [entry for entry in entries if not any(is_stale(tag) for tag in entry[2])]
+    logger.info(f"🗄️ 缓存快照校验: {len(valid)}/{len(entries)} 个条目有效")
+    return valid
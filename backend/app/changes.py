@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+数据变更捕获
+监听ORM会话事件，收集事务中被写入的表和记录，在提交后通知订阅者（缓存失效等）
+
+- 修改/删除的对象在 before_flush 中收集（此时属性历史完整，设置 deleted_at 的文件记录视为删除），
+  新增的对象在 after_flush 中收集（此时才有自增ID）
+- query.update()/query.delete() 及 session.execute(insert(...)) 等批量语句在 do_orm_execute 中按表收集（记录ID为None）；
+  通过 track_record_ids 登记的表，批量UPDATE/DELETE执行前先查询受影响的记录ID；
+  批量INSERT后由调用方读回ID并通过 record_ids 替换整表变更
+- 事务回滚时丢弃已收集的变更
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Set
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+
+@dataclass(frozen=True)
+class Change:
+    """一条数据变更"""
+    table: str
+    record_id: Optional[int]
+    op: str
+
+
+_listeners: List[Callable[[List[Change]], None]] = []
+# 批量语句需要解析记录ID的表
+_id_tables: Set[str] = set()
+
+
+def on_commit(listener: Callable[[List[Change]], None]):
+    """注册提交后回调（参数为本次事务的变更列表），回调异常只记录日志"""
+    _listeners.append(listener)
+    return listener
+
+
+def notify(changes: List[Change]):
+    """通知订阅者（Core语句直接写表时由调用方手动调用）"""
+    if not changes:
+        return
+    for listener in _listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            logger.error(f"数据变更回调失败: {e}")
+
+
+def track_record_ids(tables: Iterable[str]):
+    """登记需要记录ID的表（批量UPDATE/DELETE会额外执行一次查询）"""
+    _id_tables.update(tables)
+
+
+def record_ids(session: Session, table: str, ids: Iterable[int], op: str = INSERT):
+    """
+    批量语句写入的记录ID由调用方读回后登记，替换该表的整表变更（否则同步客户端会收到全量重置）
+
+    Args:
+        session: 执行批量语句的会话（提交前调用）
+        table: 表名
+        ids: 写入的记录ID
+        op: 批量语句的操作类型
+    """
+    pending = _pending(session)
+    pending[:] = [change for change in pending if change != Change(table, None, op)]
+    pending.extend(Change(table, record_id, op) for record_id in ids)
+
+
+def _pending(session: Session) -> list:
+    return session.info.setdefault("pending_changes", [])
+
+
+def _object_change(obj, op: str) -> Optional[Change]:
+    table = getattr(obj, "__tablename__", None)
+    if table is None:
+        return None
+    # 赋值为SQL表达式的属性（deleted_at=func.now()）在flush执行后立即过期，历史只能在 before_flush 中读取
+    state = inspect(obj)
+    if op == UPDATE and "deleted_at" in state.attrs.keys():
+        added = state.attrs.deleted_at.history.added
+        if added and added[0] is not None:
+            op = DELETE
+    return Change(table, getattr(obj, "id", None), op)
+
+
+@event.listens_for(Session, "before_flush")
+def _before_flush(session: Session, flush_context, instances):
+    pending = _pending(session)
+    for objects, op in ((session.dirty, UPDATE), (session.deleted, DELETE)):
+        for obj in objects:
+            if op == UPDATE and not session.is_modified(obj, include_collections=False):
+                continue
+            change = _object_change(obj, op)
+            if change is not None:
+                pending.append(change)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context):
+    pending = _pending(session)
+    for obj in session.new:
+        change = _object_change(obj, INSERT)
+        if change is not None:
+            pending.append(change)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            if orm_execute_state.is_delete:
+                op = DELETE
+            elif orm_execute_state.is_insert:
+                op = INSERT
+            else:
+                op = UPDATE
+            session = orm_execute_state.session
+            whereclause = getattr(orm_execute_state.statement, "whereclause", None)
+            if op != INSERT and table.name in _id_tables and "id" in table.c:
+                stmt = select(table.c.id)
+                if whereclause is not None:
+                    stmt = stmt.where(whereclause)
+                _pending(session).extend(Change(table.name, record_id, op) for record_id in session.scalars(stmt))
+            else:
+                _pending(session).append(Change(table.name, None, op))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    changes = session.info.pop("pending_changes", None)
+    if changes:
+        notify(list(dict.fromkeys(changes)))
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop("pending_changes", None)
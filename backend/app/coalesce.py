@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+相同只读请求的合并（single-flight）
+同一worker上并发到达的相同GET请求（路径 + 排序后的查询参数）只执行一次，
+其余请求等待并直接复用第一个请求的响应字节；完成后的响应在 COALESCE_WINDOW_SECONDS 内继续复用
+
+- 只处理可缓存的接口（见 app.cache.route_tables），流式导出和文件下载不合并
+- 本worker提交写入后立即丢弃相关表的已完成结果；刚写入过的客户端（固定主库窗口内）不参与合并
+- 被采样分析的请求（见 app.profiler）不参与合并
+- 由只读副本计算的结果只复用给同样会读副本的请求：副本延迟超过阈值、读路由回到主库后重新执行
+- 首个请求失败、响应过大或非200时，等待中的请求各自执行
+- 统计节省的执行次数，见 /api/health/coalesce
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.cache import route_tables
+from app.changes import Change, on_commit
+from app.config import settings
+from app.database import read_route, replicas
+from app.profiler import profiling
+from app.read_routing import pinned_to_primary
+
+logger = logging.getLogger(__name__)
+
+# 已完成结果超过该数量时清理过期条目
+MAX_FLIGHTS = 1024
+
+
+class Flight:
+    """一次正在执行或刚完成的请求"""
+
+    def __init__(self, tables: Tuple[str, ...]):
+        self.tables = tables
+        self.done = asyncio.Event()
+        self.shareable = False
+        self.status = 0
+        self.headers: List[tuple] = []
+        self.body = b""
+        self.finished_at = 0.0
+        # 是否由只读副本计算
+        self.replica = False
+
+    def fresh(self) -> bool:
+        return self.shareable and time.monotonic() - self.finished_at <= settings.coalesce_window_seconds
+
+
+class SingleFlight:
+    """进行中/刚完成的请求表（每个worker一个）"""
+
+    def __init__(self):
+        self.flights: Dict[str, Flight] = {}
+        self.counters = {"executed": 0, "coalesced": 0, "window_hits": 0, "not_shared": 0}
+
+    def drop_tables(self, tables):
+        tables = set(tables)
+        for key, flight in list(self.flights.items()):
+            if flight.done.is_set() and tables.intersection(flight.tables):
+                del self.flights[key]
+
+    def prune(self):
+        if len(self.flights) <= MAX_FLIGHTS:
+            return
+        for key, flight in list(self.flights.items()):
+            if flight.done.is_set() and not flight.fresh():
+                del self.flights[key]
+
+    def stats(self) -> dict:
+        saved = self.counters["coalesced"] + self.counters["window_hits"]
+        total = saved + self.counters["executed"]
+        return {
+            **self.counters,
+            "saved": saved,
+            "saved_rate": round(saved / total, 4) if total else 0,
+            "in_flight": sum(1 for flight in self.flights.values() if not flight.done.is_set()),
+        }
+
+
+single_flight = SingleFlight()
+
+
+@on_commit
+def drop_changed(changes: List[Change]):
+    """本worker写入后丢弃依赖这些表的已完成结果"""
+    single_flight.drop_tables(change.table for change in changes)
+
+
+def request_key(scope) -> str:
+    query = "&".join(sorted(scope.get("query_string", b"").decode("latin-1").split("&")))
+    return f"{scope['path']}?{query}"
+
+
+class SingleFlightMiddleware:
+    """ASGI中间件：合并并发的相同GET请求"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not settings.coalesce_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        tables = route_tables(scope["path"])
+        if tables is None or pinned_to_primary(scope) or profiling(scope):
+            await self.app(scope, receive, send)
+            return
+
+        key = request_key(scope)
+        flight = single_flight.flights.get(key)
+        if flight is not None:
+            if not flight.done.is_set():
+                await flight.done.wait()
+                if flight.shareable and await self._same_route(flight):
+                    single_flight.counters["coalesced"] += 1
+                    await self._replay(flight, send)
+                    return
+            elif flight.fresh() and await self._same_route(flight):
+                single_flight.counters["window_hits"] += 1
+                await self._replay(flight, send)
+                return
+
+        await self._lead(key, tables, scope, receive, send)
+
+    async def _lead(self, key: str, tables: Tuple[str, ...], scope, receive, send):
+        """执行请求，边发送边记录响应，供等待中的相同请求复用"""
+        flight = Flight(tables)
+        single_flight.flights[key] = flight
+        single_flight.prune()
+        state = {"shareable": False, "chunks": [], "size": 0, "complete": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                state["shareable"] = message["status"] == 200
+                flight.status = message["status"]
+                flight.headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body" and state["shareable"]:
+                chunk = message.get("body", b"")
+                state["size"] += len(chunk)
+                if state["size"] > settings.cache_max_entry_bytes:
+                    state["shareable"] = False
+                    state["chunks"] = []
+                else:
+                    state["chunks"].append(chunk)
+                if not message.get("more_body", False):
+                    state["complete"] = True
+            await send(message)
+
+        single_flight.counters["executed"] += 1
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            flight.shareable = state["shareable"] and state["complete"]
+            flight.body = b"".join(state["chunks"]) if flight.shareable else b""
+            flight.finished_at = time.monotonic()
+            route = read_route.get()
+            flight.replica = bool(route) and route.get("beat_ms") is not None
+            if not flight.shareable:
+                single_flight.counters["not_shared"] += 1
+                if single_flight.flights.get(key) is flight:
+                    del single_flight.flights[key]
+            flight.done.set()
+
+    @staticmethod
+    async def _same_route(flight: Flight) -> bool:
+        """副本计算的结果只在当前仍有延迟在阈值内的副本时复用（选择副本可能需要重新测量延迟，放到线程池）"""
+        if not flight.replica:
+            return True
+        return await run_in_threadpool(replicas.choose) is not None
+
+    @staticmethod
+    async def _replay(flight: Flight, send):
+        headers = [(name, value) for name, value in flight.headers if name not in (b"x-cache", b"set-cookie")]
+        await send({
+            "type": "http.response.start",
+            "status": flight.status,
+            "headers": headers + [(b"x-coalesced", b"1")],
+        })
+        await send({"type": "http.response.body", "body": flight.body})
@@ -4,7 +4,7 @@
 """
 
 import os
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -20,6 +20,12 @@ class Settings(BaseSettings):
     db_password: str = Field(..., env="DB_PASSWORD")
     db_name: str = Field(..., env="DB_NAME")
     
+    # 只读副本配置（JSON列表，为空时所有请求使用主库）
+    replica_urls: List[str] = Field([], env="REPLICA_URLS")
+    replica_max_lag_seconds: float = Field(5.0, env="REPLICA_MAX_LAG_SECONDS")  # 复制延迟超过该值时读请求回到主库
+    replica_lag_check_seconds: float = Field(1.0, env="REPLICA_LAG_CHECK_SECONDS")  # 复制延迟测量间隔
+    read_your_writes_seconds: float = Field(10.0, env="READ_YOUR_WRITES_SECONDS")  # 写请求后该客户端读主库的时长
+    
     # 应用配置
     secret_key: str = Field(..., env="SECRET_KEY")
     algorithm: str = Field("HS256", env="ALGORITHM")
@@ -28,12 +34,105 @@ class Settings(BaseSettings):
     # 文件上传配置
     upload_dir: str = Field("uploads", env="UPLOAD_DIR")
     max_file_size: int = Field(10485760, env="MAX_FILE_SIZE")  # 10MB
+    storage_quota_bytes: int = Field(0, env="STORAGE_QUOTA_BYTES")  # 总容量配额，0表示不限
+    storage_category_quotas: Dict[str, int] = Field({}, env="STORAGE_CATEGORY_QUOTAS")  # 分类配额(JSON): {"相册": 1073741824}
+    storage_type_quotas: Dict[str, int] = Field({}, env="STORAGE_TYPE_QUOTAS")  # 文件类型配额(JSON): {"视频": 5368709120}
+    upload_batch_max_files: int = Field(200, env="UPLOAD_BATCH_MAX_FILES")  # 单次批量上传的文件数上限
+    upload_batch_concurrency: int = Field(4, env="UPLOAD_BATCH_CONCURRENCY")  # 批量上传并发写入磁盘的文件数
+    archive_max_files: int = Field(1000, env="ARCHIVE_MAX_FILES")  # 单次打包下载的文件数上限
+    download_count_flush_seconds: int = Field(10, env="DOWNLOAD_COUNT_FLUSH_SECONDS")  # 下载次数批量写入周期，0表示每次下载立即写入
+    file_gc_interval_seconds: int = Field(21600, env="FILE_GC_INTERVAL_SECONDS")  # 文件对账周期，0表示不自动执行
+    file_gc_grace_seconds: int = Field(3600, env="FILE_GC_GRACE_SECONDS")  # 新于该时长的文件不视为孤儿
+    cold_storage_dir: str = Field("uploads_cold", env="COLD_STORAGE_DIR")  # 冷存储目录（可挂载其他磁盘）
+    tiering_interval_seconds: int = Field(86400, env="TIERING_INTERVAL_SECONDS")  # 分层调度周期，0表示不自动执行
+    tiering_cold_after_days: int = Field(90, env="TIERING_COLD_AFTER_DAYS")  # 上传/上次分层后超过该天数的文件可降冷
+    tiering_cold_max_downloads: int = Field(0, env="TIERING_COLD_MAX_DOWNLOADS")  # 冷却期内下载次数不超过该值才降冷
+    tiering_promote_downloads: int = Field(3, env="TIERING_PROMOTE_DOWNLOADS")  # 降冷后下载达到该次数时升热
+    tiering_min_size_bytes: int = Field(65536, env="TIERING_MIN_SIZE_BYTES")  # 小于该大小的文件不降冷
+    tiering_zstd_level: int = Field(10, env="TIERING_ZSTD_LEVEL")  # zstd压缩级别
+    tiering_batch_size: int = Field(500, env="TIERING_BATCH_SIZE")  # 每次调度最多加入的降冷/升热任务数
+    
+    # 后台任务队列配置（python -m app.worker）
+    job_queue_concurrency: Dict[str, int] = Field(
+        {"default": 2, "media": 2, "files": 1, "similar": 1}, env="JOB_QUEUE_CONCURRENCY"
+    )  # 各队列同时执行的任务数上限(JSON，所有worker合计)
+    job_poll_interval_seconds: float = Field(1.0, env="JOB_POLL_INTERVAL_SECONDS")  # 队列为空时的轮询间隔
+    job_visibility_timeout_seconds: int = Field(300, env="JOB_VISIBILITY_TIMEOUT_SECONDS")  # 未续期的任务超时后重新入队
+    job_max_attempts: int = Field(5, env="JOB_MAX_ATTEMPTS")  # 默认最大执行次数
+    job_backoff_seconds: int = Field(10, env="JOB_BACKOFF_SECONDS")  # 重试退避基数（指数增长）
+    job_backoff_max_seconds: int = Field(3600, env="JOB_BACKOFF_MAX_SECONDS")  # 重试退避上限
+    job_retention_seconds: int = Field(604800, env="JOB_RETENTION_SECONDS")  # 已完成任务保留时长
+    
+    # 相似电影索引配置（python -m app.similar build 全量重建）
+    similar_top_k: int = Field(10, env="SIMILAR_TOP_K")  # 每部电影保存的相似电影数
+    similar_index_path: str = Field("data/movie_similar.npz", env="SIMILAR_INDEX_PATH")  # 特征矩阵与top-k文件
+    
+    # 增量同步配置（/api/sync）
+    sync_settle_seconds: float = Field(5.0, env="SYNC_SETTLE_SECONDS")  # 变更写入后多久同步令牌才越过它（覆盖事务提交顺序与序号不一致的窗口）
+    sync_retention_days: int = Field(30, env="SYNC_RETENTION_DAYS")  # 变更日志保留天数，更早的令牌需要全量同步
+    sync_compact_interval_seconds: int = Field(3600, env="SYNC_COMPACT_INTERVAL_SECONDS")  # 变更日志压缩周期，0表示不自动执行
+    
+    # 相同GET请求合并配置
+    coalesce_enabled: bool = Field(True, env="COALESCE_ENABLED")
+    coalesce_window_seconds: float = Field(0.5, env="COALESCE_WINDOW_SECONDS")  # 完成后的响应继续复用的时长
+    
+    # 数据变更推送配置（/api/events）
+    events_poll_interval_seconds: float = Field(0.5, env="EVENTS_POLL_INTERVAL_SECONDS")  # 每个worker轮询变更日志的间隔
+    events_heartbeat_seconds: float = Field(15.0, env="EVENTS_HEARTBEAT_SECONDS")  # 心跳间隔（需小于nginx的proxy_read_timeout）
+    events_retry_ms: int = Field(3000, env="EVENTS_RETRY_MS")  # 浏览器断线重连间隔
+    events_queue_size: int = Field(256, env="EVENTS_QUEUE_SIZE")  # 每个连接积压的事件上限，超过后改为推送reset
+    events_max_connections_per_worker: int = Field(2000, env="EVENTS_MAX_CONNECTIONS_PER_WORKER")  # 每个worker的推送连接上限
+    
+    # 采样分析配置（按需分析单个请求 / 持续低频采样，输出折叠栈）
+    profile_token: Optional[str] = Field(None, env="PROFILE_TOKEN")  # 按需分析口令（请求头X-Profile-Token），为空时关闭
+    profile_interval_ms: float = Field(5.0, env="PROFILE_INTERVAL_MS")  # 按需分析的采样间隔
+    profile_continuous_hz: float = Field(0, env="PROFILE_CONTINUOUS_HZ")  # 持续采样频率，0表示关闭
+    profile_flush_seconds: int = Field(60, env="PROFILE_FLUSH_SECONDS")  # 持续采样结果写入文件的周期
+    profile_dir: str = Field("logs/profiles", env="PROFILE_DIR")
+    
+    # 限流配置（令牌桶状态保存在共享内存中，所有worker共用）
+    rate_limit_enabled: bool = Field(True, env="RATE_LIMIT_ENABLED")
+    rate_limit_rules: Dict[str, List[float]] = Field({
+        "default": [10, 60],
+        "search": [1, 10],
+        "upload": [0.2, 5],
+        "download": [2, 30],
+        "export": [0.05, 2],
+    }, env="RATE_LIMIT_RULES")  # 路由类别 -> [每秒补充令牌数, 桶容量](JSON)
+    rate_limit_shm_path: Optional[str] = Field("/dev/shm/xiaoyuweihan-ratelimit", env="RATE_LIMIT_SHM_PATH")
+    rate_limit_groups: int = Field(8192, env="RATE_LIMIT_GROUPS")  # 哈希表分组数（每组8个客户端槽位）
+    rate_limit_trusted_proxies: List[str] = Field(["127.0.0.1", "::1"], env="RATE_LIMIT_TRUSTED_PROXIES")  # 信任其X-Real-IP的代理
+    max_in_flight_per_worker: int = Field(64, env="MAX_IN_FLIGHT_PER_WORKER")  # 每个worker在途请求上限，0表示不限
+    
+    # 共享缓存配置（app.cache_server 守护进程，由gunicorn启动）
+    cache_enabled: bool = Field(True, env="CACHE_ENABLED")
+    cache_socket_path: str = Field("/dev/shm/xiaoyuweihan-cache.sock", env="CACHE_SOCKET_PATH")
+    cache_max_bytes: int = Field(67108864, env="CACHE_MAX_BYTES")  # 缓存字节预算 64MB
+    cache_max_entry_bytes: int = Field(1048576, env="CACHE_MAX_ENTRY_BYTES")  # 单个响应超过该大小不缓存
+    cache_ttl_seconds: int = Field(300, env="CACHE_TTL_SECONDS")  # 兜底过期时间（正常由写入时失效）
+    cache_snapshot_path: str = Field("/dev/shm/xiaoyuweihan-cache.snapshot", env="CACHE_SNAPSHOT_PATH")  # 缓存快照文件，为空表示不使用快照
+    cache_snapshot_interval_seconds: int = Field(60, env="CACHE_SNAPSHOT_INTERVAL_SECONDS")  # 快照写入周期，0表示只在退出时写入
+    cache_snapshot_max_bytes: int = Field(16777216, env="CACHE_SNAPSHOT_MAX_BYTES")  # 快照最多保存的条目大小 16MB
+    cache_snapshot_max_age_seconds: int = Field(3600, env="CACHE_SNAPSHOT_MAX_AGE_SECONDS")  # 超过该时长的快照不再载入
+    entity_cache_ttl_seconds: int = Field(600, env="ENTITY_CACHE_TTL_SECONDS")  # 详情/下载按主键缓存的记录过期时间
+    
+    # 前端静态资源配置（build_static.py 构建产物目录，为空时由nginx提供）
+    static_dir: Optional[str] = Field(None, env="STATIC_DIR")
     
     # 服务器配置
     host: str = Field("0.0.0.0", env="HOST")
     port: int = Field(8000, env="PORT")
     debug: bool = Field(False, env="DEBUG")
     
+    # 启动时表结构检查: fingerprint(指纹一致则跳过) / always(每次create_all) / off
+    schema_check: str = Field("fingerprint", env="SCHEMA_CHECK")
+    
+    # worker预热（生命周期就绪前打开连接池、请求一遍GET接口）
+    warmup_enabled: bool = Field(True, env="WARMUP_ENABLED")
+    warmup_pool_connections: int = Field(5, env="WARMUP_POOL_CONNECTIONS")  # 每个连接池预先打开的连接数
+    warmup_paths: List[str] = Field([], env="WARMUP_PATHS")  # 额外预热的路径(JSON): ["/api/food/1"]
+    warmup_timeout_seconds: float = Field(15.0, env="WARMUP_TIMEOUT_SECONDS")  # 预热超时，超时后直接开始接受请求
+    
     class Config:
         env_file = [".env.local", ".env"]
         env_file_encoding = "utf-8"
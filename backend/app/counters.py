@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+下载次数的批量写入
+下载接口只在本worker内存中累加，由后台任务每 DOWNLOAD_COUNT_FLUSH_SECONDS 合并写入：
+相同增量的记录合并为一条 UPDATE file_records SET download_count = download_count + n WHERE id IN (...)
+
+- 下载请求不再写数据库，配合实体缓存命中时完全不访问数据库
+- 写入失败时计数放回，下个周期重试；worker正常退出时写入剩余计数，异常退出会丢失最近一个周期的计数
+- DOWNLOAD_COUNT_FLUSH_SECONDS 为0时每次下载立即写入
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import FileRecord
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending: Dict[int, int] = {}
+
+
+def record_download(file_id: int):
+    """记录一次下载"""
+    record_downloads([file_id])
+
+
+def record_downloads(file_ids: Iterable[int]):
+    """记录一批下载（如打包下载中的每个文件各一次）"""
+    with _lock:
+        for file_id in file_ids:
+            _pending[file_id] = _pending.get(file_id, 0) + 1
+    if settings.download_count_flush_seconds <= 0:
+        flush()
+
+
+def flush() -> int:
+    """写入累计的下载次数，返回涉及的记录数"""
+    global _pending
+    with _lock:
+        batch, _pending = _pending, {}
+    if not batch:
+        return 0
+
+    by_increment: Dict[int, list] = {}
+    for file_id, count in batch.items():
+        by_increment.setdefault(count, []).append(file_id)
+
+    db = SessionLocal()
+    try:
+        for count, file_ids in by_increment.items():
+            db.query(FileRecord).filter(FileRecord.id.in_(file_ids)).update(
+                {FileRecord.download_count: FileRecord.download_count + count},
+                synchronize_session=False,
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _lock:
+            for file_id, count in batch.items():
+                _pending[file_id] = _pending.get(file_id, 0) + count
+        raise
+    finally:
+        db.close()
+    return len(batch)
+
+
+async def periodic_flush():
+    """周期性写入下载次数（在应用生命周期中启动）"""
+    interval = settings.download_count_flush_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(flush)
+        except Exception as e:
+            logger.error(f"写入下载次数失败: {e}")
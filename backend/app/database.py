@@ -3,11 +3,20 @@
 数据库连接和会话管理
 """
 
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, BigInteger, String, DateTime, select, text, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateTable, CreateIndex, CreateColumn
+from sqlalchemy.sql import func
+from sqlalchemy.sql.dml import UpdateBase
+from contextlib import contextmanager
+from contextvars import ContextVar
+import hashlib
 import logging
+import random
+import threading
+import time
 
 from app.config import settings
 
@@ -15,34 +24,163 @@ from app.config import settings
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 数据库引擎配置
-engine = create_engine(
-    settings.database_url,
-    poolclass=QueuePool,
-    pool_size=20,
-    max_overflow=30,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=settings.debug,
-    connect_args={
-        "charset": "utf8mb4",
-        "autocommit": False
-    }
+
+def make_engine(url: str, pool_size: int = 20, max_overflow: int = 30):
+    """创建数据库引擎（主库与只读副本使用相同的连接参数）"""
+    return create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=settings.debug,
+        connect_args={
+            "charset": "utf8mb4",
+            "autocommit": False
+        } if url.startswith("mysql") else {"check_same_thread": False} if url.startswith("sqlite") else {}
+    )
+
+
+# 数据库引擎配置（主库）
+engine = make_engine(settings.database_url)
+
+# 创建基础模型类
+Base = declarative_base()
+
+# 元数据
+metadata = MetaData()
+
+# 表结构指纹记录表
+schema_meta = Table(
+    "schema_meta",
+    Base.metadata,
+    Column("name", String(50), primary_key=True, comment="名称"),
+    Column("fingerprint", String(64), nullable=False, comment="表结构指纹"),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now(), comment="更新时间"),
 )
 
+SCHEMA_NAME = "app"
+
+# 复制延迟心跳表：主库定期写入当前时间，从副本读出的值与当前时间之差即为复制延迟
+replica_heartbeat = Table(
+    "replica_heartbeat",
+    Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("beat_ms", BigInteger, nullable=False, comment="主库写入时的时间戳(毫秒)"),
+)
+
+# 当前请求的读路由：None 表示使用主库；只读请求为字典，记录本次使用的副本心跳
+read_route: ContextVar = ContextVar("read_route", default=None)
+
+
+class ReplicaSet:
+    """只读副本集合：定期测量复制延迟，延迟超过阈值的副本不参与读路由"""
+
+    def __init__(self, urls):
+        self.engines = [make_engine(url, pool_size=10, max_overflow=20) for url in urls]
+        # 每个副本最近一次测得的心跳(毫秒)，None 表示不可用
+        self.beats = [None] * len(self.engines)
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def write_heartbeat(self, now_ms: int):
+        """在主库写入心跳（多个worker同时写入时只保留较新的值）"""
+        with engine.begin() as connection:
+            updated = connection.execute(
+                replica_heartbeat.update()
+                .where(replica_heartbeat.c.id == 1, replica_heartbeat.c.beat_ms < now_ms)
+                .values(beat_ms=now_ms)
+            ).rowcount
+            if not updated and connection.execute(
+                select(replica_heartbeat.c.id).where(replica_heartbeat.c.id == 1)
+            ).first() is None:
+                connection.execute(replica_heartbeat.insert().values(id=1, beat_ms=now_ms))
+
+    def check(self):
+        """写入主库心跳并读取各副本的心跳"""
+        self.write_heartbeat(int(time.time() * 1000))
+        for index, replica in enumerate(self.engines):
+            try:
+                with replica.connect() as connection:
+                    self.beats[index] = connection.execute(
+                        select(replica_heartbeat.c.beat_ms).where(replica_heartbeat.c.id == 1)
+                    ).scalar()
+            except Exception as e:
+                self.beats[index] = None
+                logger.warning(f"⚠️ 只读副本{index}不可用: {e}")
+
+    def refresh(self):
+        """距上次测量超过检查间隔时重新测量（同一时间只有一个线程测量，其他线程沿用旧结果）"""
+        if time.monotonic() - self.checked_at < settings.replica_lag_check_seconds:
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.check()
+        except Exception as e:
+            self.beats = [None] * len(self.engines)
+            logger.warning(f"⚠️ 复制延迟检查失败，读请求使用主库: {e}")
+        finally:
+            self.checked_at = time.monotonic()
+            self.lock.release()
+
+    def lag_seconds(self) -> list:
+        now_ms = time.time() * 1000
+        return [None if beat is None else round((now_ms - beat) / 1000, 3) for beat in self.beats]
+
+    def choose(self):
+        """
+        随机选择一个延迟在阈值内的副本
+
+        Returns:
+            (引擎, 心跳毫秒) 或 None（全部副本不可用或延迟过大，使用主库）
+        """
+        if not self.engines:
+            return None
+        self.refresh()
+        max_lag_ms = settings.replica_max_lag_seconds * 1000
+        now_ms = time.time() * 1000
+        healthy = [
+            (replica, beat) for replica, beat in zip(self.engines, self.beats)
+            if beat is not None and now_ms - beat <= max_lag_ms
+        ]
+        return random.choice(healthy) if healthy else None
+
+
+replicas = ReplicaSet(settings.replica_urls)
+
+
+def is_write(clause) -> bool:
+    """INSERT/UPDATE/DELETE 以及 SELECT ... FOR UPDATE 必须在主库执行"""
+    return isinstance(clause, UpdateBase) or getattr(clause, "_for_update_arg", None) is not None
+
+
+class RoutingSession(Session):
+    """读写分离会话：只读请求中的查询发往副本，写入、加锁查询和其他请求使用主库"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        route = read_route.get()
+        if route is None or self._flushing or is_write(clause):
+            return engine
+
+        # 同一会话固定使用一个副本，保证请求内读到的数据一致
+        if "replica" not in self.info:
+            self.info["replica"] = replicas.choose()
+            if self.info["replica"] is not None:
+                beat = self.info["replica"][1]
+                route["beat_ms"] = beat if route.get("beat_ms") is None else min(route["beat_ms"], beat)
+        return self.info["replica"][0] if self.info["replica"] is not None else engine
+
+
 # 创建会话工厂
 SessionLocal = sessionmaker(
+    class_=RoutingSession,
     autocommit=False,
     autoflush=False,
     bind=engine
 )
 
-# 创建基础模型类
-Base = declarative_base()
-
-# 元数据
-metadata = MetaData()
-
 
 def get_db() -> Session:
     """
@@ -73,6 +211,117 @@ def create_tables():
         raise
 
 
+def upgrade_tables(connection):
+    """
+    为已存在的表补齐新增的列和索引（create_all 只会创建缺失的表）
+    新增列需可为空或带有服务端默认值
+    """
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {ddl}"))
+                logger.info(f"➕ 新增列 {table.name}.{column.name}")
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(connection)
+                logger.info(f"➕ 新增索引 {index.name}")
+
+
+def schema_fingerprint() -> str:
+    """
+    计算当前模型定义的表结构指纹
+    
+    Returns:
+        str: 所有建表/建索引语句的SHA256摘要
+    """
+    import app.models  # noqa: F401  确保所有模型已注册到元数据
+
+    statements = []
+    for table in Base.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            statements.append(str(CreateIndex(index).compile(dialect=engine.dialect)))
+    return hashlib.sha256("\n".join(statements).encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def named_lock(connection, name: str, timeout: int = 30):
+    """
+    MySQL命名锁，用于多个worker之间互斥执行（其他数据库直接放行）
+    
+    Yields:
+        bool: 是否获得锁
+    """
+    if connection.dialect.name != "mysql":
+        yield True
+        return
+
+    acquired = connection.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"), {"name": name, "timeout": timeout}
+    ).scalar() == 1
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+
+
+def read_schema_fingerprint(connection):
+    """读取数据库中记录的表结构指纹，表不存在时返回None"""
+    try:
+        return connection.execute(
+            select(schema_meta.c.fingerprint).where(schema_meta.c.name == SCHEMA_NAME)
+        ).scalar()
+    except Exception:
+        connection.rollback()
+        return None
+
+
+def ensure_schema() -> bool:
+    """
+    按表结构指纹检查数据库表，仅在模型有变化时执行建表
+    
+    Returns:
+        bool: 是否执行了建表
+    """
+    fingerprint = schema_fingerprint()
+
+    with engine.connect() as connection:
+        if read_schema_fingerprint(connection) == fingerprint:
+            logger.info("✅ 数据库表结构指纹一致，跳过建表检查")
+            return False
+
+        with named_lock(connection, "xywh_schema"):
+            # 获得锁后再检查一次，其他worker可能已完成建表
+            if read_schema_fingerprint(connection) == fingerprint:
+                return False
+
+            create_tables()
+            upgrade_tables(connection)
+
+            updated = connection.execute(
+                schema_meta.update()
+                .where(schema_meta.c.name == SCHEMA_NAME)
+                .values(fingerprint=fingerprint, updated_at=func.now())
+            ).rowcount
+            if not updated:
+                connection.execute(schema_meta.insert().values(name=SCHEMA_NAME, fingerprint=fingerprint))
+            connection.commit()
+
+    logger.info(f"✅ 表结构指纹已更新: {fingerprint[:12]}")
+    return True
+
+
 def test_connection():
     """测试数据库连接"""
     try:
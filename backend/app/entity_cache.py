@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+实体缓存（按主键的二级缓存）
+详情接口和文件下载按主键（日历备注按日期）读取单条记录，命中时不访问数据库
+
+- 条目存放在共享缓存守护进程中（所有worker共用，LRU + ENTITY_CACHE_TTL_SECONDS），
+  内容为记录的列值；不存在的记录同样缓存，新增后随之失效
+- 每个条目带记录级标签 "<表>:<id>"（按日期查找的为 "<表>:date=<日期>"），提交后只失效被修改的记录；
+  无法确定记录的批量语句失效整张表的实体（标签 "<表>:*"）
+- 命中返回的是游离的模型实例（不属于任何会话），只用于读取，需要修改的接口仍从会话中查询
+"""
+
+import functools
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, List
+
+from sqlalchemy import DateTime, event, inspect
+from sqlalchemy.orm import Session
+
+from app.cache import client, replica_caught_up
+from app.changes import Change, on_commit
+from app.config import settings
+from app.models import CalendarNote, FileRecord
+
+# 只缓存可见的记录（已软删除的文件视为不存在）
+VISIBLE = {
+    FileRecord: (FileRecord.deleted_at.is_(None),),
+}
+# 按非主键唯一字段查找的模型：表名 -> 字段名（字段值变化时在flush中收集失效标签）
+LOOKUP_FIELDS = {
+    CalendarNote.__tablename__: "date",
+}
+
+
+def table_tag(table: str) -> str:
+    """整张表的实体标签"""
+    return f"{table}:*"
+
+
+def entity_tag(table: str, field: str, value) -> str:
+    return f"{table}:{value}" if field == "id" else f"{table}:{field}={value}"
+
+
+def _columns(model) -> List:
+    return list(inspect(model).column_attrs)
+
+
+@functools.lru_cache(maxsize=None)
+def _fingerprint(model) -> str:
+    """列名指纹：表结构变化后不读取旧格式的条目"""
+    names = ",".join(attr.key for attr in _columns(model))
+    return format(zlib.crc32(names.encode("utf-8")), "08x")
+
+
+def encode(model, record) -> bytes:
+    if record is None:
+        return b"null"
+    values = {}
+    for attr in _columns(model):
+        value = getattr(record, attr.key)
+        values[attr.key] = value.isoformat() if isinstance(value, datetime) else value
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode(model, body: bytes):
+    values = json.loads(body)
+    if values is None:
+        return None
+    for attr in _columns(model):
+        value = values.get(attr.key)
+        if isinstance(value, str) and isinstance(attr.columns[0].type, DateTime):
+            values[attr.key] = datetime.fromisoformat(value)
+    return model(**values)
+
+
+def _lookup(db: Session, model, field: str, value):
+    table = model.__tablename__
+    key = f"entity:{table}:{_fingerprint(model)}:{field}={value}"
+    body = client.get(key)
+    if body is not None:
+        return decode(model, body)
+
+    # 版本号在查询之前读取，期间记录被修改则不写入
+    versions = client.versions([entity_tag(table, field, value), table_tag(table)])
+    record = db.query(model).filter(getattr(model, field) == value, *VISIBLE.get(model, ())).first()
+    if versions is not None and replica_caught_up(versions):
+        client.set(key, encode(model, record), versions, settings.entity_cache_ttl_seconds)
+    return record
+
+
+def get_entity(db: Session, model, record_id: int):
+    """按主键读取记录，不存在时返回None"""
+    return _lookup(db, model, "id", record_id)
+
+
+def get_entity_by(db: Session, model, field: str, value):
+    """按唯一字段读取记录（字段需登记在 LOOKUP_FIELDS 中）"""
+    if LOOKUP_FIELDS.get(model.__tablename__) != field:
+        raise ValueError(f"{model.__tablename__}.{field} 未登记为实体缓存的查找字段")
+    return _lookup(db, model, field, value)
+
+
+@on_commit
+def invalidate_entities(changes: List[Change]):
+    """提交后失效被修改记录的实体"""
+    tags = {
+        table_tag(change.table) if change.record_id is None else entity_tag(change.table, "id", change.record_id)
+        for change in changes
+    }
+    client.invalidate(tags)
+
+
+def _pending_tags(session: Session) -> set:
+    return session.info.setdefault("entity_tags", set())
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_lookup_tags(session: Session, flush_context, instances):
+    """按字段查找的记录：收集修改前后的字段值"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        field = LOOKUP_FIELDS.get(getattr(obj, "__tablename__", None))
+        if field is None:
+            continue
+        history = inspect(obj).attrs[field].history
+        for value in history.sum():
+            _pending_tags(session).add(entity_tag(obj.__tablename__, field, value))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_tags(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None and table.name in LOOKUP_FIELDS:
+            _pending_tags(orm_execute_state.session).add(table_tag(table.name))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_lookup_tags(session: Session):
+    tags = session.info.pop("entity_tags", None)
+    if tags:
+        client.invalidate(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_lookup_tags(session: Session):
+    session.info.pop("entity_tags", None)
+
+
+def invalidate_tables(tables: Iterable[str]):
+    """数据被整体替换（如备份恢复）后失效这些表的全部实体"""
+    client.invalidate(table_tag(table) for table in tables)
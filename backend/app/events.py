@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+数据变更推送（Server-Sent Events）
+各写入接口的变更已在同一事务中写入 change_log（见 app.sync），每个worker由一个轮询任务
+读取新的变更并分发给本worker上的所有事件流连接，跨worker不需要额外的消息中间件
+
+- 每个worker只有一个轮询任务和一个心跳定时器，空闲连接只占用一个等待中的队列，
+  连接数再多也不会增加数据库查询
+- 没有连接时轮询任务挂起，不访问数据库
+- 变更序号的分配顺序与提交顺序不一定一致：轮询从已稳定的序号之后读取，
+  等待窗口内已推送的序号记录在集合中避免重复
+- 断线重连时按 Last-Event-ID 补发错过的变更；错过的变更已被压缩或积压过多时推送 reset 事件，
+  客户端应重新拉取列表
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ChangeLog
+from app.sync import RESET, TRACKED_TABLES, horizon, settled_seq
+
+logger = logging.getLogger(__name__)
+
+# 单次轮询/补发读取的最大变更数
+POLL_BATCH_SIZE = 1000
+# 队列中的心跳与关闭标记
+HEARTBEAT = "heartbeat"
+CLOSE = "close"
+
+
+@dataclass(eq=False)
+class Subscriber:
+    """一个事件流连接"""
+    types: Optional[Set[str]]
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(settings.events_queue_size))
+
+    def wants(self, event: dict) -> bool:
+        return event["op"] == RESET or self.types is None or event["entity"] in self.types
+
+    def offer(self, item):
+        """放入队列；积压已满时清空并改为推送 reset（客户端重新拉取即可恢复）"""
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(reset_event())
+
+
+def reset_event() -> dict:
+    return {"seq": None, "entity": None, "id": None, "op": RESET, "version": None}
+
+
+def to_event(entry: ChangeLog) -> dict:
+    if entry.op == RESET or entry.table_name not in TRACKED_TABLES:
+        return {**reset_event(), "seq": entry.seq, "version": entry.seq}
+    return {
+        "seq": entry.seq,
+        "entity": TRACKED_TABLES[entry.table_name],
+        "id": entry.record_id,
+        "op": entry.op,
+        "version": entry.seq,
+    }
+
+
+def format_event(event: dict) -> str:
+    """SSE 文本帧（reset 事件不带ID，重连时仍从上一个变更继续）"""
+    data = json.dumps({key: event[key] for key in ("entity", "id", "op", "version")}, separators=(",", ":"))
+    if event["seq"] is None or event["op"] == RESET:
+        return f"event: reset\ndata: {data}\n\n"
+    return f"id: {event['seq']}\nevent: change\ndata: {data}\n\n"
+
+
+class ChangeBroker:
+    """本worker的变更分发器"""
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.watermark: Optional[int] = None
+        self.emitted: Set[int] = set()
+
+    def subscribe(self, types: Optional[Set[str]]) -> Subscriber:
+        subscriber = Subscriber(types)
+        self.subscribers.add(subscriber)
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def poll(self) -> List[dict]:
+        """读取稳定水位之后尚未推送的变更，并推进水位（在线程池中执行）"""
+        db = SessionLocal()
+        try:
+            if self.watermark is None:
+                # 首次轮询（或空闲后恢复）从当前位置开始，历史变更由各连接按 Last-Event-ID 补发
+                self.watermark = settled_seq(db)
+                self.emitted.clear()
+            entries = db.query(ChangeLog).filter(
+                ChangeLog.seq > self.watermark
+            ).order_by(ChangeLog.seq).limit(POLL_BATCH_SIZE).all()
+        finally:
+            db.close()
+
+        events = [to_event(entry) for entry in entries if entry.seq not in self.emitted]
+        self.emitted.update(event["seq"] for event in events)
+
+        cutoff = datetime.now() - timedelta(seconds=settings.sync_settle_seconds)
+        for entry in entries:
+            if entry.created_at > cutoff:
+                break
+            self.watermark = entry.seq
+        self.emitted = {seq for seq in self.emitted if seq > self.watermark}
+        return events
+
+    def publish(self, item):
+        for subscriber in list(self.subscribers):
+            if item in (HEARTBEAT, CLOSE) or subscriber.wants(item):
+                subscriber.offer(item)
+
+    async def run(self):
+        """轮询循环（在应用生命周期中启动）"""
+        self.wakeup = asyncio.Event()
+        last_heartbeat = time.monotonic()
+        while True:
+            if not self.subscribers:
+                self.watermark = None
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                last_heartbeat = time.monotonic()
+
+            try:
+                for event in await run_in_threadpool(self.poll):
+                    self.publish(event)
+            except Exception as e:
+                logger.error(f"变更轮询失败: {e}")
+
+            if time.monotonic() - last_heartbeat >= settings.events_heartbeat_seconds:
+                self.publish(HEARTBEAT)
+                last_heartbeat = time.monotonic()
+            await asyncio.sleep(settings.events_poll_interval_seconds)
+
+    def close(self):
+        """关闭所有连接（服务停止时调用）"""
+        self.publish(CLOSE)
+
+
+broker = ChangeBroker()
+
+
+def replay(last_event_id: int, types: Optional[Set[str]]) -> List[dict]:
+    """补发断线期间的变更；已被压缩或积压过多时返回单个 reset 事件"""
+    db = SessionLocal()
+    try:
+        if last_event_id < horizon(db):
+            return [reset_event()]
+        entries = db.query(ChangeLog).filter(
+            ChangeLog.seq > last_event_id
+        ).order_by(ChangeLog.seq).limit(POLL_BATCH_SIZE + 1).all()
+    finally:
+        db.close()
+    if len(entries) > POLL_BATCH_SIZE:
+        return [reset_event()]
+    events = [to_event(entry) for entry in entries]
+    return [event for event in events if event["op"] == RESET or types is None or event["entity"] in types]
+
+
+async def event_stream(subscriber: Subscriber, replayed: List[dict]) -> AsyncIterator[str]:
+    """事件流：先补发，再推送实时变更和心跳"""
+    try:
+        yield f"retry: {settings.events_retry_ms}\n\n"
+        sent = set()
+        for event in replayed:
+            sent.add(event["seq"])
+            yield format_event(event)
+        while True:
+            item = await subscriber.queue.get()
+            if item == CLOSE:
+                return
+            if item == HEARTBEAT:
+                yield ": ping\n\n"
+                continue
+            if item["seq"] is not None and item["seq"] in sent:
+                continue
+            yield format_event(item)
+    finally:
+        broker.unsubscribe(subscriber)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+数据导出
+通过服务端游标流式读取整张表，以NDJSON或CSV格式分块输出，内存占用与表大小无关
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterator, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.database import SessionLocal
+
+# 每批从游标读取的行数，同时也是每个输出块包含的行数
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMAT_PATTERN = r"^(ndjson|csv)$"
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def serialize_value(value):
+    """转换为可JSON/CSV输出的值"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(model, updated_since: Optional[datetime] = None, where=None) -> Iterator[list]:
+    """
+    使用服务端游标分批读取模型对应表的所有行
+
+    Args:
+        model: ORM模型类
+        updated_since: 仅导出该时间之后更新的记录
+        where: 额外的过滤条件
+
+    Yields:
+        list: 每批最多 EXPORT_BATCH_SIZE 行（Row对象）
+    """
+    table = model.__table__
+    stmt = select(table).order_by(table.c.id)
+    if updated_since is not None:
+        stmt = stmt.where(table.c.updated_at >= updated_since)
+    if where is not None:
+        stmt = stmt.where(where)
+
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            stmt,
+            execution_options={"stream_results": True, "yield_per": EXPORT_BATCH_SIZE}
+        )
+        for partition in result.partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def iter_ndjson(model, updated_since=None, where=None) -> Iterator[bytes]:
+    """按NDJSON格式输出"""
+    columns = [column.name for column in model.__table__.columns]
+    for rows in iter_rows(model, updated_since, where):
+        lines = [
+            json.dumps(
+                {name: serialize_value(value) for name, value in zip(columns, row)},
+                ensure_ascii=False
+            )
+            for row in rows
+        ]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_csv(model, updated_since=None, where=None) -> Iterator[bytes]:
+    """按CSV格式输出（带BOM，便于Excel直接打开中文内容）"""
+    columns = [column.name for column in model.__table__.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+
+    for rows in iter_rows(model, updated_since, where):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([serialize_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_response(model, format: str, updated_since: Optional[datetime] = None, where=None) -> StreamingResponse:
+    """
+    构建流式导出响应
+
+    Args:
+        model: ORM模型类
+        format: ndjson 或 csv
+        updated_since: 仅导出该时间之后更新的记录
+        where: 额外的过滤条件
+    """
+    iterator = iter_csv if format == "csv" else iter_ndjson
+    filename = f"{model.__tablename__}-{datetime.now():%Y%m%d%H%M%S}.{format}"
+
+    return StreamingResponse(
+        iterator(model, updated_since, where),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
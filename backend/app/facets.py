@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+列表接口的分面计数
+列表接口传入 facets=category,genre 时，和分页结果一起返回各字段取值的记录数（用于筛选标签）
+
+- 计数受当前筛选条件约束，但统计某个字段时不应用该字段自身的筛选（多选筛选语义），
+  这样选中一个分类后其他分类的数量仍然可见
+- 所有字段的计数用 UNION ALL 合并为一条分组查询，一次往返得到全部结果
+- 计数结果与页码无关，按 表 + 筛选条件 缓存在共享缓存中，表写入后失效（见 app.cache）
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import String, cast, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from app.cache import cached_json
+
+# 每个字段最多返回的取值数（按数量从多到少）
+FACET_VALUE_LIMIT = 50
+
+FACETS_PATTERN = r"^[a-z_]+(,[a-z_]+)*$"
+
+
+def parse_facets(facets: Optional[str], allowed: Sequence[str]) -> List[str]:
+    """解析 facets 参数，包含不支持的字段时抛出 ValueError"""
+    if not facets:
+        return []
+    names = list(dict.fromkeys(name for name in facets.split(",") if name))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"不支持的分面字段: {', '.join(unknown)}（可选: {', '.join(allowed)}）")
+    return names
+
+
+def _python_value(column, value):
+    """UNION ALL 中取值统一转为字符串，按列类型还原"""
+    if value is None:
+        return None
+    if column.type.python_type is bool:
+        return value in ("1", "true", "True")
+    if column.type.python_type is int:
+        return int(value)
+    return value
+
+
+def facet_counts(
+    db: Session,
+    model,
+    names: List[str],
+    filters: List[Tuple[Optional[str], object]],
+    cache_params: dict,
+) -> Dict[str, List[dict]]:
+    """
+    计算分面计数
+
+    Args:
+        db: 数据库会话
+        model: ORM模型类
+        names: 需要计数的字段
+        filters: (所属字段, 过滤条件)，所属字段为None的条件（关键词搜索等）对所有字段生效
+        cache_params: 构成缓存键的筛选参数（不含页码）
+
+    Returns:
+        dict: 字段 -> [{"value": 取值, "count": 数量}]
+    """
+    if not names:
+        return {}
+
+    table = model.__tablename__
+    params = json.dumps(cache_params, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha1(params.encode("utf-8")).hexdigest()
+    key = f"facets:{table}:{','.join(sorted(names))}:{digest}"
+
+    def compute():
+        selects = []
+        for name in names:
+            column = getattr(model, name)
+            where = [clause for owner, clause in filters if owner != name]
+            selects.append(
+                select(
+                    literal(name).label("facet"),
+                    cast(column, String(255)).label("value"),
+                    func.count().label("count"),
+                ).select_from(model).where(*where).group_by(column)
+            )
+        statement = selects[0] if len(selects) == 1 else union_all(*selects)
+
+        result = {name: [] for name in names}
+        for facet, value, count in db.execute(statement):
+            result[facet].append({"value": _python_value(getattr(model, facet), value), "count": count})
+        for name, values in result.items():
+            values.sort(key=lambda item: (-item["count"], str(item["value"])))
+            del values[FACET_VALUE_LIMIT:]
+        return result
+
+    return cached_json(key, (table,), compute)
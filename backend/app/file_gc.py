@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+上传文件清理与对账
+- 删除接口只标记记录并加入 files.purge 任务，物理文件由 worker 删除
+- reconcile 按文件名前缀分批对比上传目录和 file_records，
+  找出磁盘上的孤儿文件、指向缺失文件的记录以及待清理的已删除记录；
+  冷存储目录（见 app.tiering）同批检查，分层移动中断留下的另一层副本也视为孤儿
+- 指向缺失文件的记录修复时标记删除并从存储台账扣减；对账不重建台账（会覆盖上传中的预占用量），
+  台账偏差用 python -m app.storage_usage rebuild 纠正
+
+用法:
+    python -m app.file_gc            # 只报告
+    python -m app.file_gc --repair   # 修复
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, not_, or_, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal, engine, named_lock
+from app.jobs import enqueue, job_handler
+from app.models import FileRecord
+from app.storage_usage import adjust
+from app.tiering import COLD, COLD_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# 上传文件名为uuid十六进制，按首字符分批，每批只在内存中保留约1/16的目录项
+HEX_PREFIXES = "0123456789abcdef"
+OTHER_BUCKET = ""
+
+DB_BATCH_SIZE = 500
+# 报告中每类问题最多列出的条目数
+REPORT_SAMPLE_LIMIT = 100
+
+PURGE_JOB = "files.purge"
+
+
+def remove_physical_file(path: str) -> bool:
+    """删除物理文件，文件不存在时返回False"""
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def purge_file(file_id: int, raise_errors: bool = False):
+    """删除一条已标记删除的文件记录及其物理文件"""
+    db = SessionLocal()
+    try:
+        record = db.query(FileRecord).filter(
+            FileRecord.id == file_id,
+            FileRecord.deleted_at.isnot(None)
+        ).first()
+        if not record:
+            return
+
+        remove_physical_file(record.file_path)
+        db.delete(record)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        if raise_errors:
+            raise
+        logger.error(f"清理文件失败(id={file_id}): {e}")
+    finally:
+        db.close()
+
+
+@job_handler(PURGE_JOB, queue="files")
+def purge_job(payload: dict):
+    purge_file(payload["file_id"], raise_errors=True)
+
+
+def enqueue_purge(db: Session, file_id: int):
+    """加入清理任务（随标记删除的事务提交）"""
+    enqueue(db, PURGE_JOB, {"file_id": file_id})
+
+
+def bucket_matches(name: str, prefix: str) -> bool:
+    if prefix == OTHER_BUCKET:
+        return not name[:1] or name[0] not in HEX_PREFIXES
+    return name.startswith(prefix)
+
+
+def list_disk_bucket(upload_dir: str, prefix: str) -> List[Tuple[str, os.stat_result]]:
+    """列出上传目录中属于某个前缀分批的文件（已排序）"""
+    entries = []
+    if not os.path.isdir(upload_dir):
+        return entries
+    with os.scandir(upload_dir) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False) and bucket_matches(entry.name, prefix):
+                entries.append((entry.name, entry.stat(follow_symlinks=False)))
+    entries.sort(key=lambda item: item[0])
+    return entries
+
+
+def iter_db_bucket(db, prefix: str) -> Iterator[tuple]:
+    """按文件名顺序流式读取属于某个前缀分批的记录"""
+    if prefix == OTHER_BUCKET:
+        condition = not_(or_(*[FileRecord.filename.like(f"{p}%") for p in HEX_PREFIXES]))
+    else:
+        condition = FileRecord.filename.like(f"{prefix}%")
+
+    stmt = (
+        select(FileRecord.id, FileRecord.filename, FileRecord.file_path, FileRecord.storage_tier, FileRecord.deleted_at)
+        .where(condition)
+        .order_by(FileRecord.filename)
+    )
+    result = db.execute(stmt, execution_options={"stream_results": True, "yield_per": DB_BATCH_SIZE})
+    for row in result:
+        yield row
+
+
+def merge_bucket(disk: List[Tuple[str, os.stat_result]], rows: Iterator[tuple]):
+    """
+    归并两个按文件名排序的序列
+
+    Yields:
+        (文件名, stat或None, 记录或None)
+    """
+    disk_iter = iter(disk)
+    current_disk = next(disk_iter, None)
+    current_row = next(rows, None)
+
+    while current_disk is not None or current_row is not None:
+        if current_row is None or (current_disk is not None and current_disk[0] < current_row.filename):
+            yield current_disk[0], current_disk[1], None
+            current_disk = next(disk_iter, None)
+        elif current_disk is None or current_row.filename < current_disk[0]:
+            yield current_row.filename, None, current_row
+            current_row = next(rows, None)
+        else:
+            yield current_disk[0], current_disk[1], current_row
+            current_disk = next(disk_iter, None)
+            current_row = next(rows, None)
+
+
+class ReconcileReport:
+    """对账结果"""
+
+    def __init__(self):
+        self.counts = {"checked": 0, "orphan_files": 0, "missing_files": 0, "pending_deletes": 0, "repaired": 0}
+        self.samples = {"orphan_files": [], "missing_files": []}
+
+    def add(self, kind: str, item):
+        self.counts[kind] += 1
+        if kind in self.samples and len(self.samples[kind]) < REPORT_SAMPLE_LIMIT:
+            self.samples[kind].append(item)
+
+    def as_dict(self) -> dict:
+        return {"counts": dict(self.counts), "samples": self.samples}
+
+
+def reconcile(
+    repair: bool = False,
+    upload_dir: str = None,
+    grace_seconds: int = None,
+    cold_dir: str = None
+) -> ReconcileReport:
+    """
+    对比上传目录与文件记录
+
+    Args:
+        repair: 是否修复（删除孤儿文件、标记缺失文件的记录、清理已删除记录）
+        grace_seconds: 新于该时长的磁盘文件不视为孤儿（可能正在上传）
+    """
+    upload_dir = upload_dir or settings.upload_dir
+    cold_dir = cold_dir or settings.cold_storage_dir
+    grace_seconds = settings.file_gc_grace_seconds if grace_seconds is None else grace_seconds
+    cutoff = time.time() - grace_seconds
+    report = ReconcileReport()
+
+    # 读取和修复分别使用独立会话，避免流式游标未读完时执行写操作
+    read_db = SessionLocal()
+    write_db = SessionLocal()
+    try:
+        for prefix in list(HEX_PREFIXES) + [OTHER_BUCKET]:
+            disk = list_disk_bucket(upload_dir, prefix)
+            pending_ids = []
+            missing_ids = []
+            # 本批中位于冷存储的文件名
+            cold_names = set()
+
+            rows = iter_db_bucket(read_db, prefix)
+            if prefix == OTHER_BUCKET:
+                # 非uuid文件名的排序规则可能与数据库排序规则不一致，这一批（通常很少）在内存中排序
+                rows = iter(sorted(rows, key=lambda row: row.filename))
+
+            for name, st, row in merge_bucket(disk, rows):
+                report.counts["checked"] += 1
+                if row is not None and row.storage_tier == COLD:
+                    cold_names.add(row.filename)
+                # 记录已移到冷存储（且冷存储文件存在）后残留的热存储副本
+                stale_copy = (
+                    row is not None and st is not None and row.storage_tier == COLD
+                    and os.path.exists(row.file_path)
+                )
+                if row is None or stale_copy:
+                    if st.st_mtime < cutoff and not name.startswith("."):
+                        report.add("orphan_files", name)
+                        if repair and remove_physical_file(os.path.join(upload_dir, name)):
+                            report.counts["repaired"] += 1
+                if row is None:
+                    continue
+                if row.deleted_at is not None:
+                    report.add("pending_deletes", row.id)
+                    pending_ids.append(row.id)
+                elif st is None and not os.path.exists(row.file_path):
+                    report.add("missing_files", {"id": row.id, "filename": name})
+                    missing_ids.append(row.id)
+
+            # 冷存储中没有对应冷记录的文件（含升热后残留的副本和中断的临时文件）
+            for name, st in list_disk_bucket(cold_dir, prefix):
+                report.counts["checked"] += 1
+                stem = name[:-len(COLD_SUFFIX)] if name.endswith(COLD_SUFFIX) else None
+                if stem not in cold_names and st.st_mtime < cutoff and not name.startswith("."):
+                    report.add("orphan_files", os.path.join(cold_dir, name))
+                    if repair and remove_physical_file(os.path.join(cold_dir, name)):
+                        report.counts["repaired"] += 1
+
+            if repair and missing_ids:
+                # 与删除接口一样标记删除并从台账扣减（锁定记录，避免与同时进行的删除重复扣减）
+                missing = write_db.query(
+                    FileRecord.id, FileRecord.file_type, FileRecord.category, FileRecord.file_size
+                ).filter(
+                    FileRecord.id.in_(missing_ids),
+                    FileRecord.deleted_at.is_(None)
+                ).with_for_update().all()
+                if missing:
+                    write_db.query(FileRecord).filter(FileRecord.id.in_([row.id for row in missing])).update(
+                        {FileRecord.deleted_at: func.now()}, synchronize_session=False
+                    )
+                    for row in missing:
+                        adjust(write_db, row.file_type, row.category, -row.file_size, -1)
+                write_db.commit()
+                report.counts["repaired"] += len(missing)
+
+            if repair:
+                for file_id in pending_ids:
+                    purge_file(file_id)
+                report.counts["repaired"] += len(pending_ids)
+    finally:
+        read_db.close()
+        write_db.close()
+
+    return report
+
+
+def run_locked(repair: bool = True) -> Optional[dict]:
+    """在命名锁保护下执行对账，其他worker正在执行时直接跳过"""
+    with engine.connect() as connection:
+        with named_lock(connection, "xywh_file_gc", timeout=0) as acquired:
+            if not acquired:
+                return None
+            report = reconcile(repair=repair).as_dict()
+    logger.info(f"🧹 文件对账完成: {report['counts']}")
+    return report
+
+
+async def periodic_reconcile():
+    """周期性对账任务（在应用生命周期中启动）"""
+    interval = settings.file_gc_interval_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(run_locked, True)
+        except Exception as e:
+            logger.error(f"文件对账失败: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传文件对账与清理")
+    parser.add_argument("--repair", action="store_true", help="修复发现的问题")
+    parser.add_argument("--grace-seconds", type=int, help="孤儿文件的最小存在时长")
+    args = parser.parse_args()
+
+    report = reconcile(repair=args.repair, grace_seconds=args.grace_seconds)
+    for key, value in report.counts.items():
+        print(f"{key}: {value}")
+    for name in report.samples["orphan_files"]:
+        print(f"孤儿文件: {name}")
+    for item in report.samples["missing_files"]:
+        print(f"文件缺失: id={item['id']} {item['filename']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
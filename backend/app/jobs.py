@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+数据库任务队列
+任务写入 jobs 表，由独立的 worker 进程（python -m app.worker）领取执行：
+- 领取使用 SELECT ... FOR UPDATE SKIP LOCKED，多个worker互不阻塞（MySQL 8.0+）
+- 领取时设置可见性超时 locked_until，worker 执行期间定期续期；
+  worker 失联后任务超时重新入队
+- 失败按指数退避重试，超过最大次数后标记为 dead
+- 各队列的并发上限为所有worker合计，领取时在队列命名锁内计数
+
+run_at/locked_until 由 Python 写入和比较，不依赖数据库时区
+"""
+
+import json
+import logging
+import random
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import engine, named_lock
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+JOB_STATUSES = (QUEUED, RUNNING, DONE, DEAD)
+
+DEFAULT_QUEUE = "default"
+# 记录的错误信息最大长度
+MAX_ERROR_LENGTH = 4000
+
+
+@dataclass
+class JobHandler:
+    """已注册的任务处理函数"""
+    name: str
+    queue: str
+    func: Callable[[dict], None]
+
+
+@dataclass
+class ClaimedJob:
+    """worker 领取到的任务"""
+    id: int
+    name: str
+    payload: dict
+    attempt: int
+    max_attempts: int
+
+
+HANDLERS: Dict[str, JobHandler] = {}
+
+
+def job_handler(name: str, queue: str = DEFAULT_QUEUE):
+    """注册任务处理函数（处理函数接收payload字典，抛出异常表示需要重试）"""
+    def decorator(func):
+        HANDLERS[name] = JobHandler(name=name, queue=queue, func=func)
+        return func
+    return decorator
+
+
+def _now() -> datetime:
+    return datetime.now()
+
+
+def backoff_seconds(attempt: int) -> float:
+    """第 attempt 次失败后的重试间隔（指数退避，带±20%抖动）"""
+    delay = min(settings.job_backoff_max_seconds, settings.job_backoff_seconds * 2 ** (attempt - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def enqueue(
+    db: Session,
+    name: str,
+    payload: Optional[dict] = None,
+    queue: Optional[str] = None,
+    delay_seconds: float = 0,
+    max_attempts: Optional[int] = None
+) -> Job:
+    """
+    加入任务（不提交，随调用方事务一起提交，业务数据回滚时任务也不会留下）
+
+    Args:
+        queue: 默认使用处理函数注册时的队列
+    """
+    if queue is None:
+        queue = HANDLERS[name].queue if name in HANDLERS else DEFAULT_QUEUE
+    job = Job(
+        queue=queue,
+        name=name,
+        payload=json.dumps(payload or {}, ensure_ascii=False),
+        status=QUEUED,
+        attempts=0,
+        max_attempts=max_attempts or settings.job_max_attempts,
+        run_at=_now() + timedelta(seconds=delay_seconds),
+    )
+    db.add(job)
+    return job
+
+
+def enqueue_many(
+    db: Session,
+    name: str,
+    payloads: List[dict],
+    queue: Optional[str] = None,
+    max_attempts: Optional[int] = None
+) -> int:
+    """批量加入同名任务（一条 INSERT 语句，不提交），返回任务数"""
+    if not payloads:
+        return 0
+    if queue is None:
+        queue = HANDLERS[name].queue if name in HANDLERS else DEFAULT_QUEUE
+    run_at = _now()
+    db.execute(insert(Job), [
+        {
+            "queue": queue,
+            "name": name,
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": max_attempts or settings.job_max_attempts,
+            "run_at": run_at,
+        }
+        for payload in payloads
+    ])
+    return len(payloads)
+
+
+def claim(queue: str, worker_id: str, limit: int = 1) -> List[ClaimedJob]:
+    """
+    领取队列中到期的任务
+
+    有并发上限的队列在队列命名锁内统计执行中的任务数，保证所有worker合计不超过上限；
+    SKIP LOCKED 跳过其他事务已锁定的行
+    """
+    now = _now()
+    concurrency = settings.job_queue_concurrency.get(queue)
+
+    with engine.connect() as connection:
+        lock = named_lock(connection, f"xywh_jobs:{queue}", timeout=1) if concurrency else nullcontext(True)
+        with lock as acquired:
+            if not acquired:
+                return []
+
+            if concurrency:
+                running = connection.execute(
+                    select(func.count(Job.id)).where(
+                        Job.queue == queue,
+                        Job.status == RUNNING,
+                        Job.locked_until > now
+                    )
+                ).scalar()
+                limit = min(limit, concurrency - running)
+            if limit <= 0:
+                connection.rollback()
+                return []
+
+            rows = connection.execute(
+                select(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+                .where(Job.queue == queue, Job.status == QUEUED, Job.run_at <= now)
+                .order_by(Job.run_at, Job.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                connection.rollback()
+                return []
+
+            connection.execute(
+                update(Job)
+                .where(Job.id.in_([row.id for row in rows]))
+                .values(
+                    status=RUNNING,
+                    attempts=Job.attempts + 1,
+                    locked_by=worker_id,
+                    locked_until=now + timedelta(seconds=settings.job_visibility_timeout_seconds)
+                )
+            )
+            # 在释放命名锁之前提交，其他worker计数时能看到这些任务
+            connection.commit()
+
+    return [
+        ClaimedJob(
+            id=row.id,
+            name=row.name,
+            payload=json.loads(row.payload) if row.payload else {},
+            attempt=row.attempts + 1,
+            max_attempts=row.max_attempts,
+        )
+        for row in rows
+    ]
+
+
+def _owned(job: ClaimedJob, worker_id: str):
+    """仍由该worker持有的条件（超时被他人重新领取后，旧worker的结果不再写入）"""
+    return (
+        Job.id == job.id,
+        Job.status == RUNNING,
+        Job.locked_by == worker_id,
+        Job.attempts == job.attempt,
+    )
+
+
+def complete(job: ClaimedJob, worker_id: str) -> bool:
+    """标记任务完成"""
+    with engine.begin() as connection:
+        return connection.execute(
+            update(Job).where(*_owned(job, worker_id)).values(
+                status=DONE, locked_by=None, locked_until=None, last_error=None, finished_at=_now()
+            )
+        ).rowcount == 1
+
+
+def fail(job: ClaimedJob, worker_id: str, error: str) -> str:
+    """
+    记录任务失败：未超过最大次数时按退避间隔重新入队，否则标记为dead
+
+    Returns:
+        str: 任务的新状态
+    """
+    now = _now()
+    if job.attempt >= job.max_attempts:
+        values = {"status": DEAD, "finished_at": now}
+    else:
+        values = {"status": QUEUED, "run_at": now + timedelta(seconds=backoff_seconds(job.attempt))}
+
+    with engine.begin() as connection:
+        connection.execute(
+            update(Job).where(*_owned(job, worker_id)).values(
+                locked_by=None, locked_until=None, last_error=error[:MAX_ERROR_LENGTH], **values
+            )
+        )
+    return values["status"]
+
+
+def extend(job_ids: List[int], worker_id: str):
+    """为执行中的任务续期可见性超时"""
+    if not job_ids:
+        return
+    with engine.begin() as connection:
+        connection.execute(
+            update(Job)
+            .where(Job.id.in_(job_ids), Job.status == RUNNING, Job.locked_by == worker_id)
+            .values(locked_until=_now() + timedelta(seconds=settings.job_visibility_timeout_seconds))
+        )
+
+
+def requeue_expired() -> int:
+    """
+    处理超过可见性超时的任务（worker 崩溃或被杀）：
+    次数已用完的标记为dead，其余立即重新入队
+
+    Returns:
+        int: 处理的任务数
+    """
+    now = _now()
+    expired = (Job.status == RUNNING, Job.locked_until < now)
+    with engine.begin() as connection:
+        dead = connection.execute(
+            update(Job).where(*expired, Job.attempts >= Job.max_attempts).values(
+                status=DEAD, locked_by=None, locked_until=None,
+                last_error="执行超时(超过可见性超时未续期)", finished_at=now
+            )
+        ).rowcount
+        requeued = connection.execute(
+            update(Job).where(*expired).values(
+                status=QUEUED, locked_by=None, locked_until=None, run_at=now,
+                last_error="执行超时(超过可见性超时未续期)"
+            )
+        ).rowcount
+    if dead or requeued:
+        logger.warning(f"⏰ 超时任务: 重新入队 {requeued} 个, 放弃 {dead} 个")
+    return dead + requeued
+
+
+def cleanup_finished() -> int:
+    """删除超过保留时长的已完成任务"""
+    cutoff = _now() - timedelta(seconds=settings.job_retention_seconds)
+    with engine.begin() as connection:
+        return connection.execute(
+            delete(Job).where(Job.status == DONE, Job.finished_at < cutoff)
+        ).rowcount
+
+
+def retry(db: Session, job_id: int) -> Optional[Job]:
+    """把dead任务重新入队（重置执行次数），任务不存在或不是dead状态时返回None"""
+    job = db.query(Job).filter(Job.id == job_id, Job.status == DEAD).first()
+    if not job:
+        return None
+    job.status = QUEUED
+    job.attempts = 0
+    job.run_at = _now()
+    job.finished_at = None
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def queue_stats(db: Session) -> dict:
+    """按队列和状态统计任务数，以及各队列最早的待执行任务等待时长"""
+    now = _now()
+    queues = {}
+    for queue, status, count in db.query(Job.queue, Job.status, func.count(Job.id)).group_by(Job.queue, Job.status):
+        item = queues.setdefault(queue, {"queue": queue, **{s: 0 for s in JOB_STATUSES}})
+        item[status] = count
+
+    for queue, oldest in db.query(Job.queue, func.min(Job.run_at)).filter(
+        Job.status == QUEUED, Job.run_at <= now
+    ).group_by(Job.queue):
+        queues[queue]["oldest_wait_seconds"] = round((now - oldest).total_seconds(), 1)
+
+    for item in queues.values():
+        item.setdefault("oldest_wait_seconds", 0)
+        item["concurrency"] = settings.job_queue_concurrency.get(item["queue"])
+    return {"queues": sorted(queues.values(), key=lambda item: item["queue"])}
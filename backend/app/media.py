@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+媒体元数据提取
+上传后通过任务队列（media 队列）读取图片尺寸、EXIF拍摄时间以及音视频时长，
+写入 file_records 的索引列，列表筛选时不再需要读取文件
+
+用法:
+    python -m app.media backfill   # 为历史文件加入提取任务
+"""
+
+import argparse
+import json
+import logging
+import shutil
+import subprocess
+import sys
+import wave
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.jobs import enqueue, enqueue_many, job_handler
+from app.models import FileRecord
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = ("图片", "视频", "音频")
+
+# EXIF 标签
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+EXIF_ORIENTATION = 274
+# 方向值5-8表示图片需旋转90度显示，宽高互换
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+FFPROBE_TIMEOUT = 30
+
+EXTRACT_JOB = "media.extract"
+
+
+def orientation_of(width: int, height: int) -> str:
+    if width > height:
+        return "landscape"
+    if width < height:
+        return "portrait"
+    return "square"
+
+
+def parse_exif_datetime(value) -> Optional[datetime]:
+    """解析EXIF时间 'YYYY:MM:DD HH:MM:SS'"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def extract_image(path: str) -> dict:
+    """读取图片尺寸和拍摄时间（只解析文件头，不解码像素）"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        width, height = image.size
+        exif = image.getexif()
+
+    if exif.get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+        width, height = height, width
+
+    taken_at = parse_exif_datetime(exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL))
+    if taken_at is None:
+        taken_at = parse_exif_datetime(exif.get(EXIF_DATETIME))
+
+    return {
+        "width": width,
+        "height": height,
+        "orientation": orientation_of(width, height),
+        "taken_at": taken_at,
+    }
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """读取音视频时长（秒）：WAV使用标准库，其余格式依赖ffprobe"""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() / float(wav.getframerate())
+
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+
+    output = subprocess.run(
+        [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True, timeout=FFPROBE_TIMEOUT, check=True
+    ).stdout
+    info = json.loads(output)
+    duration = info.get("format", {}).get("duration")
+    return float(duration) if duration else None
+
+
+def extract_video_dimensions(path: str) -> dict:
+    """通过ffprobe读取视频画面尺寸"""
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return {}
+
+    output = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height",
+         "-print_format", "json", path],
+        capture_output=True, timeout=FFPROBE_TIMEOUT, check=True
+    ).stdout
+    streams = json.loads(output).get("streams") or []
+    if not streams or not streams[0].get("width"):
+        return {}
+    width, height = streams[0]["width"], streams[0]["height"]
+    return {"width": width, "height": height, "orientation": orientation_of(width, height)}
+
+
+def extract_metadata(path: str, file_type: str) -> dict:
+    """按文件类型提取元数据"""
+    if file_type == "图片":
+        return extract_image(path)
+
+    metadata = {"duration_seconds": probe_duration(path)}
+    if file_type == "视频":
+        metadata.update(extract_video_dimensions(path))
+    return metadata
+
+
+def process_file(file_id: int):
+    """提取单个文件的元数据并写回记录（文件无法解析时标记为failed，不再重试）"""
+    db = SessionLocal()
+    try:
+        record = db.query(FileRecord).filter(
+            FileRecord.id == file_id,
+            FileRecord.deleted_at.is_(None)
+        ).first()
+        if not record:
+            return
+
+        if record.file_type not in MEDIA_TYPES:
+            record.media_status = "skipped"
+        else:
+            try:
+                for field, value in extract_metadata(record.file_path, record.file_type).items():
+                    setattr(record, field, value)
+                record.media_status = "done"
+            except Exception as e:
+                logger.warning(f"提取媒体元数据失败(id={file_id}): {e}")
+                record.media_status = "failed"
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@job_handler(EXTRACT_JOB, queue="media")
+def extract_job(payload: dict):
+    process_file(payload["file_id"])
+
+
+def enqueue_extraction(db: Session, file_id: int):
+    """加入提取任务（随调用方事务提交）"""
+    enqueue(db, EXTRACT_JOB, {"file_id": file_id})
+
+
+def enqueue_extractions(db: Session, file_ids: List[int]):
+    """批量加入提取任务（随调用方事务提交）"""
+    enqueue_many(db, EXTRACT_JOB, [{"file_id": file_id} for file_id in file_ids])
+
+
+def backfill(batch_size: int = 200) -> int:
+    """为尚未提取的历史媒体文件加入提取任务"""
+    queued = 0
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            ids = [row.id for row in db.query(FileRecord.id).filter(
+                FileRecord.id > last_id,
+                FileRecord.deleted_at.is_(None),
+                FileRecord.file_type.in_(MEDIA_TYPES),
+                or_(FileRecord.media_status.is_(None), FileRecord.media_status == "pending")
+            ).order_by(FileRecord.id).limit(batch_size)]
+            if not ids:
+                return queued
+
+            for file_id in ids:
+                enqueue_extraction(db, file_id)
+            db.query(FileRecord).filter(FileRecord.id.in_(ids)).update(
+                {FileRecord.media_status: "pending"}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        queued += len(ids)
+        last_id = ids[-1]
+        logger.info(f"🖼️ 已加入 {queued} 个提取任务")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="媒体元数据提取")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    print(f"✅ 共加入 {backfill()} 个提取任务，由 python -m app.worker 执行")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,7 +3,7 @@
 数据库模型定义
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Float, Boolean, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -11,6 +11,10 @@ from app.database import Base
 class FoodRecord(Base):
     """美食记录模型"""
     __tablename__ = "food_records"
+    __table_args__ = (
+        # 时间线按创建时间倒序的索引游标
+        Index("ix_food_records_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(200), nullable=False, comment="美食名称")
@@ -31,6 +35,10 @@ class FoodRecord(Base):
 class MovieRecord(Base):
     """电影记录模型"""
     __tablename__ = "movie_records"
+    __table_args__ = (
+        # 时间线按创建时间倒序的索引游标
+        Index("ix_movie_records_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String(200), nullable=False, comment="电影标题")
@@ -50,9 +58,30 @@ class MovieRecord(Base):
         return f"<MovieRecord(id={self.id}, title='{self.title}', director='{self.director}')>"
 
 
+class MovieSimilar(Base):
+    """相似电影列表（由 app.similar 预先计算的 top-k 结果）"""
+    __tablename__ = "movie_similar"
+    __table_args__ = (
+        UniqueConstraint("movie_id", "sort_order", name="uq_movie_similar_movie_order"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    movie_id = Column(Integer, nullable=False, comment="电影ID")
+    similar_id = Column(Integer, nullable=False, index=True, comment="相似电影ID")
+    score = Column(Float, nullable=False, comment="相似度(0-1)")
+    sort_order = Column(Integer, nullable=False, comment="排名(从0开始)")
+
+    def __repr__(self):
+        return f"<MovieSimilar(movie_id={self.movie_id}, similar_id={self.similar_id}, score={self.score:.3f})>"
+
+
 class CalendarNote(Base):
     """日历备注模型"""
     __tablename__ = "calendar_notes"
+    __table_args__ = (
+        # 时间线按创建时间倒序的索引游标
+        Index("ix_calendar_notes_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     date = Column(String(10), nullable=False, unique=True, index=True, comment="日期(YYYY-MM-DD)")
@@ -70,9 +99,13 @@ class CalendarNote(Base):
 class FileRecord(Base):
     """文件记录模型"""
     __tablename__ = "file_records"
+    __table_args__ = (
+        # 时间线按创建时间倒序的索引游标
+        Index("ix_file_records_deleted_created_id", "deleted_at", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    filename = Column(String(255), nullable=False, comment="文件名")
+    filename = Column(String(255), nullable=False, index=True, comment="文件名")
     original_filename = Column(String(255), nullable=False, comment="原始文件名")
     file_path = Column(String(500), nullable=False, comment="文件路径")
     file_size = Column(Integer, nullable=False, comment="文件大小(字节)")
@@ -82,6 +115,17 @@ class FileRecord(Base):
     category = Column(String(100), nullable=True, comment="文件分类")
     is_public = Column(Boolean, default=False, comment="是否公开")
     download_count = Column(Integer, default=0, comment="下载次数")
+    width = Column(Integer, nullable=True, index=True, comment="图片/视频宽度(像素)")
+    height = Column(Integer, nullable=True, index=True, comment="图片/视频高度(像素)")
+    orientation = Column(String(10), nullable=True, index=True, comment="画面方向(landscape/portrait/square)")
+    taken_at = Column(DateTime(timezone=True), nullable=True, index=True, comment="拍摄时间(EXIF)")
+    duration_seconds = Column(Float, nullable=True, index=True, comment="音视频时长(秒)")
+    media_status = Column(String(20), nullable=True, comment="元数据提取状态(pending/done/failed/skipped)")
+    storage_tier = Column(String(10), nullable=False, default="hot", server_default="hot", index=True, comment="存储层(hot/cold)")
+    stored_size = Column(Integer, nullable=True, comment="冷存储中压缩后的大小(字节)")
+    tiered_at = Column(DateTime, nullable=True, comment="最近一次分层(降冷/升热/压缩收益不足)的时间")
+    tier_download_count = Column(Integer, nullable=True, comment="最近一次分层时的下载次数")
+    deleted_at = Column(DateTime(timezone=True), nullable=True, index=True, comment="删除时间(待清理)")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
 
@@ -89,6 +133,80 @@ class FileRecord(Base):
         return f"<FileRecord(id={self.id}, filename='{self.filename}', size={self.file_size})>"
 
 
+class StorageUsage(Base):
+    """存储用量台账模型（按文件类型和分类累计，上传/删除时维护）"""
+    __tablename__ = "storage_usage"
+    __table_args__ = (
+        UniqueConstraint("file_type", "category", name="uq_storage_usage_type_category"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_type = Column(String(100), nullable=False, default="", comment="文件类型")
+    category = Column(String(100), nullable=False, default="", comment="文件分类(空字符串表示未分类)")
+    total_bytes = Column(BigInteger, nullable=False, default=0, comment="占用字节数")
+    file_count = Column(Integer, nullable=False, default=0, comment="文件数量")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    def __repr__(self):
+        return f"<StorageUsage(file_type='{self.file_type}', category='{self.category}', bytes={self.total_bytes})>"
+
+
+class Job(Base):
+    """后台任务队列模型（worker 通过 SELECT ... FOR UPDATE SKIP LOCKED 领取）"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_claim", "queue", "status", "run_at"),
+        Index("ix_jobs_status_locked_until", "status", "locked_until"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    queue = Column(String(50), nullable=False, default="default", comment="队列名称")
+    name = Column(String(100), nullable=False, comment="任务处理函数名称")
+    payload = Column(Text, nullable=True, comment="任务参数(JSON)")
+    status = Column(String(20), nullable=False, default="queued", comment="状态(queued/running/done/dead)")
+    attempts = Column(Integer, nullable=False, default=0, comment="已执行次数")
+    max_attempts = Column(Integer, nullable=False, default=5, comment="最大执行次数")
+    run_at = Column(DateTime, nullable=False, comment="最早执行时间")
+    locked_by = Column(String(100), nullable=True, comment="执行中的worker")
+    locked_until = Column(DateTime, nullable=True, comment="可见性超时时间，超时后可被重新领取")
+    last_error = Column(Text, nullable=True, comment="最近一次错误")
+    finished_at = Column(DateTime, nullable=True, index=True, comment="完成时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, queue='{self.queue}', name='{self.name}', status='{self.status}')>"
+
+
+class ChangeLog(Base):
+    """数据变更日志（增量同步用，删除的记录在此保留墓碑，见 app.sync）"""
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_record", "table_name", "record_id"),
+    )
+    
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="变更序号")
+    table_name = Column(String(50), nullable=False, comment="表名")
+    record_id = Column(Integer, nullable=True, comment="记录ID(为空表示无法确定具体记录)")
+    op = Column(String(10), nullable=False, comment="操作(insert/update/delete/reset)")
+    created_at = Column(DateTime, nullable=False, index=True, comment="写入时间(应用服务器时钟)")
+
+    def __repr__(self):
+        return f"<ChangeLog(seq={self.seq}, table='{self.table_name}', record_id={self.record_id}, op='{self.op}')>"
+
+
+class SyncState(Base):
+    """增量同步状态（单行：早于 horizon_seq 的变更已被压缩，客户端需全量同步）"""
+    __tablename__ = "sync_state"
+    
+    id = Column(Integer, primary_key=True)
+    horizon_seq = Column(BigInteger, nullable=False, default=0, comment="压缩水位(变更序号)")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    def __repr__(self):
+        return f"<SyncState(horizon_seq={self.horizon_seq})>"
+
+
 class SystemLog(Base):
     """系统日志模型"""
     __tablename__ = "system_logs"
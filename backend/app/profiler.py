@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+采样分析器
+定位单个接口变慢时时间花在哪里（SQL、Pydantic from_orm 还是序列化），结果为折叠栈格式
+（每行 "帧;帧;帧 次数"），可直接用 flamegraph.pl 或 speedscope 查看
+
+- 按需分析：设置 PROFILE_TOKEN 后，带 X-Profile-Token 且请求头 X-Profile: 1（或查询参数 __profile=1）
+  的请求在执行期间由独立线程每 PROFILE_INTERVAL_MS 采样一次调用栈，结果写入 PROFILE_DIR/requests/，
+  文件名见响应头 X-Profile-Id；X-Profile: inline 时直接返回折叠栈文本，原响应状态码见 X-Profile-Status
+- 持续采样：PROFILE_CONTINUOUS_HZ 大于0时每个worker以低频率采样，按接口聚合写入
+  PROFILE_DIR/continuous-<日期>-<pid>.folded，每 PROFILE_FLUSH_SECONDS 写一次
+- 接口是 async def，同一worker的请求共用事件循环线程：采样时事件循环正在执行其他请求记为 (other-request)，
+  本请求挂起等待（线程池、数据库连接等）时记录其协程的等待链，末尾为 (await)
+- 被分析的请求不读写响应缓存、不参与请求合并
+"""
+
+import asyncio
+import functools
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.rate_limit import json_response
+
+logger = logging.getLogger(__name__)
+
+# 标记被分析请求的 scope 键（缓存与请求合并据此跳过）
+PROFILE_SCOPE_KEY = "xywh.profile"
+# 持续采样聚合的不同调用栈上限，超出后新调用栈只按接口计数
+MAX_STACKS = 50000
+
+_PROFILE_QUERY = re.compile(rb"(?:^|&)__profile=(1|inline)(?:&|$)")
+# 事件循环当前正在执行的任务（loop -> task），用于区分本请求与其他请求
+_current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+# 显示路径时去掉的前缀（site-packages、项目目录等），最长的优先
+_PATH_PREFIXES = sorted({os.path.abspath(path) for path in sys.path if path}, key=len, reverse=True)
+
+
+@functools.lru_cache(maxsize=8192)
+def frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def frame_stack(frame, root_code=None) -> List[str]:
+    """从栈顶帧向上读取调用栈（根在前），遇到任务的根协程即停止"""
+    stack = []
+    while frame is not None:
+        stack.append(frame_label(frame.f_code))
+        if frame.f_code is root_code:
+            break
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def await_stack(task: asyncio.Task) -> List[str]:
+    """挂起中的任务：沿协程的等待链读取调用栈"""
+    stack = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    stack.append("(await)")
+    return stack
+
+
+def sample_task(loop, thread_id: int, task: asyncio.Task) -> Optional[List[str]]:
+    """采样一个请求任务当前的调用栈"""
+    current = task if _current_tasks is None else _current_tasks.get(loop)
+    if current is None:
+        return await_stack(task)
+    if current is not task:
+        return ["(other-request)"]
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None
+    return frame_stack(frame, task.get_coro().cr_code)
+
+
+def folded(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def write_atomic(path: str, text: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', None) or '(unmatched)'}"
+
+
+class RequestProfile:
+    """一次按需分析：请求执行期间在独立线程中采样"""
+
+    def __init__(self, task: asyncio.Task):
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.task = task
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.started_at = time.perf_counter()
+        self.elapsed_ms = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.elapsed_ms = round((time.perf_counter() - self.started_at) * 1000, 2)
+
+    def _run(self):
+        interval = settings.profile_interval_ms / 1000
+        while not self._stop.wait(interval):
+            stack = sample_task(self.loop, self.thread_id, self.task)
+            if stack:
+                self.counts[";".join(stack)] += 1
+                self.samples += 1
+
+    def save(self, scope) -> str:
+        """写入 PROFILE_DIR/requests/，返回文件名"""
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:60] or "root"
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{scope['method'].lower()}-{slug}.folded"
+        write_atomic(os.path.join(settings.profile_dir, "requests", profile_id), folded(self.counts))
+        logger.info(
+            f"🔬 请求分析完成: {scope['method']} {scope['path']} "
+            f"{self.elapsed_ms}ms {self.samples}个样本 -> {profile_id}"
+        )
+        return profile_id
+
+
+class ContinuousProfiler:
+    """持续低频采样（每个worker一个采样线程），按接口聚合调用栈"""
+
+    def __init__(self):
+        self.requests: Dict[asyncio.Task, dict] = {}
+        self.counts: Counter = Counter()
+        self.day = time.strftime("%Y%m%d")
+        self.loop = None
+        self.thread_id = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, loop):
+        """在应用生命周期中启动（需在事件循环线程中调用）"""
+        self.loop = loop
+        self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="continuous-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"🔬 持续采样已启动: {settings.profile_continuous_hz}Hz")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def sample(self):
+        task = None if _current_tasks is None else _current_tasks.get(self.loop)
+        if task is None:
+            # 事件循环空闲
+            return
+        scope = self.requests.get(task)
+        if scope is None:
+            label = "(background)"
+            stack = frame_stack(sys._current_frames().get(self.thread_id), task.get_coro().cr_code)
+        else:
+            label = route_label(scope)
+            stack = sample_task(self.loop, self.thread_id, task)
+        if not stack:
+            return
+        key = ";".join([label] + stack)
+        if key not in self.counts and len(self.counts) >= MAX_STACKS:
+            key = f"{label};(truncated)"
+        self.counts[key] += 1
+
+    def flush(self):
+        if not self.counts:
+            return
+        path = os.path.join(settings.profile_dir, f"continuous-{self.day}-{os.getpid()}.folded")
+        try:
+            write_atomic(path, folded(self.counts))
+        except OSError as e:
+            logger.error(f"写入持续采样结果失败: {e}")
+        day = time.strftime("%Y%m%d")
+        if day != self.day:
+            self.day = day
+            self.counts.clear()
+
+    def _run(self):
+        interval = 1 / settings.profile_continuous_hz
+        last_flush = time.monotonic()
+        while not self._stop.wait(interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"采样失败: {e}")
+            if time.monotonic() - last_flush >= settings.profile_flush_seconds:
+                self.flush()
+                last_flush = time.monotonic()
+
+
+continuous = ContinuousProfiler()
+
+
+def profiling(scope) -> bool:
+    """该请求是否正在被按需分析"""
+    return bool(scope.get(PROFILE_SCOPE_KEY))
+
+
+def requested_mode(scope) -> Optional[str]:
+    """请求的分析模式：1 / inline；未开启按需分析或未请求时返回None"""
+    if not settings.profile_token:
+        return None
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile" and value in (b"1", b"inline"):
+            return value.decode()
+    match = _PROFILE_QUERY.search(scope.get("query_string", b""))
+    return match.group(1).decode() if match else None
+
+
+def authorized(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile-token":
+            return hmac.compare_digest(value, settings.profile_token.encode("utf-8"))
+    return False
+
+
+class ProfilerMiddleware:
+    """ASGI中间件：按需分析单个请求，持续采样时登记正在执行的请求"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = requested_mode(scope)
+        if mode is not None and not authorized(scope):
+            status, headers, body = json_response(403, "无效的分析口令", [])
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        task = asyncio.current_task()
+        if continuous.running:
+            continuous.requests[task] = scope
+        try:
+            if mode is None:
+                await self.app(scope, receive, send)
+            else:
+                await self._profile(mode, task, scope, receive, send)
+        finally:
+            continuous.requests.pop(task, None)
+
+    async def _profile(self, mode: str, task: asyncio.Task, scope, receive, send):
+        scope[PROFILE_SCOPE_KEY] = True
+        profile = RequestProfile(task)
+        state = {"status": 500, "profile_id": None}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if mode == "inline":
+                    return
+                # 普通响应在处理函数返回、序列化完成后才发送响应头，分析到此为止
+                profile.stop()
+                state["profile_id"] = profile.save(scope)
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-profile-id", state["profile_id"].encode()),
+                    (b"x-profile-samples", str(profile.samples).encode()),
+                    (b"x-profile-ms", str(profile.elapsed_ms).encode()),
+                ]}
+            elif message["type"] == "http.response.body" and mode == "inline":
+                return
+            await send(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profile.stop()
+            if mode != "inline" and state["profile_id"] is None:
+                profile.save(scope)
+
+        if mode == "inline":
+            body = folded(profile.counts).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-status", str(state["status"]).encode()),
+                    (b"x-profile-samples", str(profile.samples).encode()),
+                    (b"x-profile-ms", str(profile.elapsed_ms).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
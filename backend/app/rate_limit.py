@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+跨worker共享内存限流与过载保护
+
+- 按 客户端IP + 路由类别 的令牌桶限流，桶状态保存在 /dev/shm 下的共享文件中（mmap），
+  所有gunicorn worker共用同一份额度
+- 共享文件是固定大小的哈希表：按键哈希分组，每组 SLOTS_PER_GROUP 个槽位；
+  组内找不到空位时淘汰最久未使用的槽位。每组一把 fcntl 字节范围锁，不同组之间互不阻塞
+- 每个worker的在途请求数超过上限时直接返回503，避免排队拖垮数据库连接池
+  （长连接的事件流不计入在途请求，其连接数由 EVENTS_MAX_CONNECTIONS_PER_WORKER 限制）
+
+客户端IP取自 nginx 设置的 X-Real-IP（仅信任来自本机代理的请求头）
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import time
+from typing import Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"XYRL0001"
+HEADER = struct.Struct("<8sII")
+HEADER_SIZE = 64
+# 槽位：键哈希(0表示空)、剩余令牌、上次更新时间
+SLOT = struct.Struct("<Qdd")
+SLOTS_PER_GROUP = 8
+GROUP_SIZE = SLOT.size * SLOTS_PER_GROUP
+
+# 路由类别（按顺序匹配，未匹配的 /api 请求归入 default）
+ROUTE_CLASSES = [
+    ("upload", "POST", re.compile(r"^/api/files/upload")),
+    ("download", "GET", re.compile(r"^/api/files/download/")),
+    ("export", "GET", re.compile(r"^/api/[^/]+/export$")),
+    ("export", "GET", re.compile(r"^/api/files/archive$")),
+]
+# 不限流的路径
+EXEMPT_PATHS = ("/api/health",)
+# 长连接路径：建立连接时限流，但不计入在途请求
+STREAMING_PATHS = ("/api/events",)
+
+
+class SharedBuckets:
+    """共享内存中的令牌桶表"""
+
+    def __init__(self, path: Optional[str], groups: int):
+        self.path = path
+        self.groups = groups
+        self.size = HEADER_SIZE + groups * GROUP_SIZE
+        self.fd = None
+        self.map = None
+        self.pid = None
+
+    def _open(self):
+        """按进程打开映射（gunicorn preload 时在master中导入，fork后各worker重新打开）"""
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        if self.path:
+            try:
+                self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                self._init_file()
+                self.map = mmap.mmap(self.fd, self.size)
+                return
+            except OSError as e:
+                logger.warning(f"⚠️ 无法打开共享限流文件 {self.path}，改为进程内限流: {e}")
+                if self.fd is not None:
+                    os.close(self.fd)
+        self.fd = None
+        self.map = mmap.mmap(-1, self.size)
+
+    def _init_file(self):
+        """文件不存在或布局不一致时重新初始化（持有头部锁，避免多个worker同时初始化）"""
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            header = os.pread(self.fd, HEADER.size, 0)
+            expected = HEADER.pack(MAGIC, self.groups, SLOTS_PER_GROUP)
+            if header != expected or os.fstat(self.fd).st_size != self.size:
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, self.size)
+                os.pwrite(self.fd, expected, 0)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        从令牌桶中取出 cost 个令牌
+
+        Returns:
+            (是否允许, 需要等待的秒数)
+        """
+        self._open()
+        digest = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+        offset = HEADER_SIZE + (digest % self.groups) * GROUP_SIZE
+        now = time.time()
+
+        if self.fd is not None:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, GROUP_SIZE, offset)
+        try:
+            target = None
+            oldest = None
+            for index in range(SLOTS_PER_GROUP):
+                slot_offset = offset + index * SLOT.size
+                slot_key, tokens, last = SLOT.unpack_from(self.map, slot_offset)
+                if slot_key == digest:
+                    target = slot_offset
+                    tokens = min(burst, tokens + max(0.0, now - last) * rate)
+                    break
+                if slot_key == 0 and target is None:
+                    target = slot_offset
+                if oldest is None or last < oldest[1]:
+                    oldest = (slot_offset, last)
+            else:
+                # 新键：使用空槽位，没有空位时淘汰最久未使用的
+                target = target if target is not None else oldest[0]
+                tokens = burst
+
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            SLOT.pack_into(self.map, target, digest, tokens, now)
+        finally:
+            if self.fd is not None:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, GROUP_SIZE, offset)
+
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+buckets = SharedBuckets(settings.rate_limit_shm_path, settings.rate_limit_groups)
+
+
+def client_ip(scope) -> str:
+    """客户端IP：来自受信任代理（nginx）的请求使用 X-Real-IP"""
+    peer = scope.get("client")[0] if scope.get("client") else ""
+    if peer in settings.rate_limit_trusted_proxies:
+        for name, value in scope.get("headers", []):
+            if name == b"x-real-ip":
+                return value.decode("latin-1").strip()
+    return peer
+
+
+def route_class(scope) -> Optional[str]:
+    """请求所属的限流类别，None表示不限流"""
+    path = scope.get("path", "")
+    if not path.startswith("/api/") or path.startswith(EXEMPT_PATHS):
+        return None
+
+    method = scope.get("method", "GET")
+    for name, route_method, pattern in ROUTE_CLASSES:
+        if method == route_method and pattern.match(path):
+            return name
+    # 带关键词的列表查询是 LIKE 全表扫描，单独计算额度
+    if method == "GET" and re.search(rb"(^|&)search=[^&]", scope.get("query_string", b"")):
+        return "search"
+    return "default"
+
+
+def json_response(status: int, message: str, headers: list):
+    body = json.dumps({"success": False, "message": message, "detail": message}, ensure_ascii=False).encode("utf-8")
+    return status, [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + headers, body
+
+
+class RateLimitMiddleware:
+    """ASGI中间件：令牌桶限流（429）与每个worker的在途请求上限（503）"""
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        category = route_class(scope)
+        if category is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.max_in_flight_per_worker
+        if limit and self.in_flight >= limit:
+            await self._reject(send, 503, "服务器繁忙，请稍后再试", 1)
+            return
+
+        rule = settings.rate_limit_rules.get(category) or settings.rate_limit_rules.get("default")
+        if settings.rate_limit_enabled and rule:
+            rate, burst = rule
+            allowed, wait = buckets.take(f"{category}:{client_ip(scope)}", rate, burst)
+            if not allowed:
+                await self._reject(send, 429, "请求过于频繁，请稍后再试", wait)
+                return
+
+        if scope["path"].startswith(STREAMING_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    async def _reject(send, status: int, message: str, retry_after: float):
+        status, headers, body = json_response(
+            status, message, [(b"retry-after", str(max(1, math.ceil(retry_after))).encode())]
+        )
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
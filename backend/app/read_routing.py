@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+读写分离请求路由
+- GET/HEAD 请求标记为只读，会话中的查询发往只读副本（见 app.database.RoutingSession）
+- 写请求之后在响应中设置 Cookie，该客户端在 READ_YOUR_WRITES_SECONDS 内的读请求固定使用主库，
+  保证能读到自己刚写入的数据
+- 增量同步接口始终使用主库（同步令牌是主库上的变更序号，副本延迟会导致漏掉变更）
+"""
+
+import time
+from http.cookies import SimpleCookie
+
+from app.config import settings
+from app.database import read_route, replicas
+
+PIN_COOKIE = "xywh_primary_until"
+READ_METHODS = ("GET", "HEAD")
+# 始终使用主库的路径
+PRIMARY_ONLY_PATHS = ("/api/sync",)
+
+
+def pinned_to_primary(scope) -> bool:
+    """客户端是否处于写后读主库的窗口内"""
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            morsel = SimpleCookie(value.decode("latin-1")).get(PIN_COOKIE)
+            if morsel is not None:
+                try:
+                    return float(morsel.value) > time.time()
+                except ValueError:
+                    return False
+    return False
+
+
+class ReadRoutingMiddleware:
+    """ASGI中间件：为只读请求启用副本路由，写请求后固定客户端到主库"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or not replicas.engines
+            or not scope["path"].startswith("/api/") or scope["path"].startswith(PRIMARY_ONLY_PATHS)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] in READ_METHODS:
+            token = read_route.set(None if pinned_to_primary(scope) else {"beat_ms": None})
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                read_route.reset(token)
+            return
+
+        window = settings.read_your_writes_seconds
+        cookie = (
+            f"{PIN_COOKIE}={time.time() + window:.3f}; Max-Age={int(window) + 1}; Path=/; HttpOnly; SameSite=Lax"
+        ).encode("latin-1")
+
+        async def pin(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"set-cookie", cookie)]}
+            await send(message)
+
+        await self.app(scope, receive, pin)
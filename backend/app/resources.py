@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+声明式资源引擎
+美食、电影、日历备注和文件记录的列表/详情/新增/修改/删除/统计接口结构相同，
+各资源只声明筛选参数、搜索字段、排序键、分面和统计维度，由 register_routes 生成路由
+
+- 语句按“形状”（启用了哪些筛选、是否搜索、排序键）预先构建一次并缓存，筛选值、分页都是绑定参数：
+  同一形状的请求复用同一个语句对象，不再重复构建ORM查询、生成缓存键和编译SQL
+- 各资源特有的接口（文件上传、按日期读写日历备注、相似电影等）仍在各自的路由模块中手写
+- 新增/修改/删除后需要额外处理的（如电影相似度更新）通过 after_create/after_update/after_delete 钩子声明
+"""
+
+import functools
+import inspect
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import bindparam, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.entity_cache import get_entity
+from app.facets import FACETS_PATTERN, facet_counts, parse_facets
+from app.schemas import BaseResponse, PaginatedResponse
+
+# 统计接口“最近”的天数
+RECENT_DAYS = 30
+# 按形状缓存的列表语句数量上限
+STATEMENT_CACHE_SIZE = 512
+
+ALL_ROUTES = ("list", "get", "create", "update", "delete", "stats")
+
+
+@dataclass(frozen=True)
+class Filter:
+    """列表筛选参数：param 为查询参数名，op 为 eq（等于，可作为分面）/ ge（不小于）/ le（不大于）"""
+    param: str
+    column: str
+    op: str = "eq"
+    type: type = str
+    description: str = ""
+    pattern: Optional[str] = None
+    ge: Optional[float] = None
+
+    def condition(self, model, value):
+        column = getattr(model, self.column)
+        if self.op == "ge":
+            return column >= value
+        if self.op == "le":
+            return column <= value
+        return column == value
+
+    def is_set(self, value) -> bool:
+        """是否应用该筛选：未传或字符串为空时不筛选（?category= 表示不限分类）"""
+        return value is not None and not (self.type is str and value == "")
+
+    @property
+    def facet(self) -> Optional[str]:
+        """等值筛选属于同名分面字段（统计该字段时不应用自身的筛选）"""
+        return self.column if self.op == "eq" else None
+
+
+def created_month(model):
+    return func.date_format(model.created_at, '%Y-%m')
+
+
+@dataclass(frozen=True)
+class Stats:
+    """
+    统计接口声明
+
+    Attributes:
+        label: 提示信息中的名称（如“美食统计”）
+        dimension: 分类统计字段，结果为 categories
+        month: 月度统计的月份表达式
+        counts: 额外的计数 (结果字段, 条件)
+        extra: 补充结果的函数 (db, data) -> None
+    """
+    label: str
+    dimension: Optional[str] = None
+    month: Callable = created_month
+    counts: Tuple[Tuple[str, Callable], ...] = ()
+    extra: Optional[Callable[[Session, dict], None]] = None
+
+
+@dataclass(frozen=True, eq=False)
+class Resource:
+    """
+    资源声明
+
+    Attributes:
+        name: 路径前缀（/api/<name>）和统计接口函数名
+        noun: 接口函数名中的记录名（如 food_record，列表为 get_food_records）
+        label: 提示信息中的名称（如“美食记录”）
+        id_param: 详情等接口的路径参数名
+        where: 所有查询都附加的条件（如排除已软删除的记录）
+        sort_keys: 可选的排序键，"-" 前缀为倒序，第一个为默认排序
+    """
+    model: type
+    schema: type
+    name: str
+    noun: str
+    label: str
+    id_param: str
+    create_schema: Optional[type] = None
+    update_schema: Optional[type] = None
+    list_label: Optional[str] = None
+    where: Tuple = ()
+    filters: Tuple[Filter, ...] = ()
+    search_fields: Tuple[str, ...] = ()
+    sort_keys: Tuple[str, ...] = ("-created_at",)
+    facets: Tuple[str, ...] = ()
+    stats: Optional[Stats] = None
+    routes: Tuple[str, ...] = ALL_ROUTES
+    after_create: Optional[Callable[[Session, object], None]] = None
+    after_update: Optional[Callable[[Session, object, dict], None]] = None
+    after_delete: Optional[Callable[[Session, int], None]] = None
+
+
+def sort_clause(model, key: str):
+    column = getattr(model, key.lstrip("-"))
+    return column.desc() if key.startswith("-") else column.asc()
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def list_statements(resource: Resource, active: Tuple[str, ...], search: bool, sort: str):
+    """某一形状的 (计数语句, 分页语句)，筛选值、搜索词和分页为绑定参数"""
+    model = resource.model
+    where = list(resource.where)
+    for item in resource.filters:
+        if item.param in active:
+            where.append(item.condition(model, bindparam(item.param)))
+    if search:
+        term = bindparam("search")
+        where.append(or_(*(getattr(model, field).like(term) for field in resource.search_fields)))
+
+    count = select(func.count()).select_from(model).where(*where)
+    rows = select(model).where(*where).order_by(sort_clause(model, sort)).limit(
+        bindparam("limit")
+    ).offset(bindparam("offset"))
+    return count, rows
+
+
+@functools.lru_cache(maxsize=None)
+def stats_statements(resource: Resource) -> Dict[str, object]:
+    model = resource.model
+    spec = resource.stats
+    where = list(resource.where)
+    statements = {
+        "total_count": select(func.count()).select_from(model).where(*where),
+        "recent_count": select(func.count()).select_from(model).where(
+            *where, model.created_at >= bindparam("since")
+        ),
+    }
+    for field, condition in spec.counts:
+        statements[field] = select(func.count()).select_from(model).where(*where, condition(model))
+    if spec.dimension:
+        column = getattr(model, spec.dimension)
+        statements["categories"] = select(column, func.count(model.id)).where(
+            *where, column.isnot(None)
+        ).group_by(column)
+    month = spec.month(model).label("month")
+    statements["monthly_data"] = select(month, func.count(model.id)).where(
+        *where
+    ).group_by("month").order_by("month").limit(12)
+    return statements
+
+
+def list_page(
+    db: Session,
+    resource: Resource,
+    page: int,
+    page_size: int,
+    values: Dict[str, object],
+    search: Optional[str] = None,
+    sort: Optional[str] = None,
+    facet_names: Sequence[str] = (),
+) -> dict:
+    """执行列表查询，返回 PaginatedResponse 的各字段（不含提示信息）"""
+    active = tuple(item.param for item in resource.filters if item.is_set(values.get(item.param)))
+    count, rows = list_statements(resource, active, bool(search), sort or resource.sort_keys[0])
+
+    params = {param: values[param] for param in active}
+    if search:
+        params["search"] = f"%{search}%"
+    total = db.execute(count, params).scalar()
+    records = db.execute(rows, {**params, "limit": page_size, "offset": (page - 1) * page_size}).scalars().all()
+
+    facets = None
+    if facet_names:
+        model = resource.model
+        filters = [(None, clause) for clause in resource.where]
+        filters += [
+            (item.facet, item.condition(model, values[item.param]))
+            for item in resource.filters if item.param in active
+        ]
+        if search:
+            filters.append((None, or_(*(getattr(model, field).like(f"%{search}%") for field in resource.search_fields))))
+        facets = facet_counts(db, model, list(facet_names), filters, {**params, "search": search})
+
+    return {
+        "data": [resource.schema.from_orm(record) for record in records],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": (total + page_size - 1) // page_size,
+        "facets": facets,
+    }
+
+
+def stats_data(db: Session, resource: Resource) -> dict:
+    statements = stats_statements(resource)
+    since = datetime.now() - timedelta(days=RECENT_DAYS)
+    data = {}
+    for field, statement in statements.items():
+        if field == "categories":
+            data[field] = [{"name": name or "未分类", "count": count} for name, count in db.execute(statement)]
+        elif field == "monthly_data":
+            data[field] = [{"month": month, "count": count} for month, count in db.execute(statement)]
+        else:
+            data[field] = db.execute(statement, {"since": since} if field == "recent_count" else {}).scalar()
+    if resource.stats.extra is not None:
+        resource.stats.extra(db, data)
+    return data
+
+
+def _signature(parameters: List[inspect.Parameter]) -> inspect.Signature:
+    return inspect.Signature([
+        inspect.Parameter(param.name, inspect.Parameter.KEYWORD_ONLY, default=param.default, annotation=param.annotation)
+        for param in parameters
+    ])
+
+
+def _db_parameter() -> inspect.Parameter:
+    return inspect.Parameter("db", inspect.Parameter.KEYWORD_ONLY, default=Depends(get_db), annotation=Session)
+
+
+def _id_parameter(resource: Resource) -> inspect.Parameter:
+    return inspect.Parameter(resource.id_param, inspect.Parameter.KEYWORD_ONLY, annotation=int)
+
+
+def _endpoint(func, name: str, parameters: List[inspect.Parameter], doc: str):
+    func.__name__ = name
+    func.__doc__ = doc
+    func.__signature__ = _signature(parameters)
+    return func
+
+
+def list_endpoint(resource: Resource):
+    list_label = resource.list_label or resource.label
+    parameters = [
+        inspect.Parameter("page", inspect.Parameter.KEYWORD_ONLY, default=Query(1, ge=1, description="页码"), annotation=int),
+        inspect.Parameter("page_size", inspect.Parameter.KEYWORD_ONLY, default=Query(10, ge=1, le=100, description="每页数量"), annotation=int),
+    ]
+    for item in resource.filters:
+        parameters.append(inspect.Parameter(
+            item.param, inspect.Parameter.KEYWORD_ONLY,
+            default=Query(None, description=item.description, pattern=item.pattern, ge=item.ge),
+            annotation=Optional[item.type],
+        ))
+    if resource.search_fields:
+        parameters.append(inspect.Parameter(
+            "search", inspect.Parameter.KEYWORD_ONLY, default=Query(None, description="搜索关键词"), annotation=Optional[str]
+        ))
+    if len(resource.sort_keys) > 1:
+        pattern = "^(" + "|".join(key.replace("-", r"\-") for key in resource.sort_keys) + ")$"
+        parameters.append(inspect.Parameter(
+            "sort", inspect.Parameter.KEYWORD_ONLY,
+            default=Query(None, pattern=pattern, description=f"排序({'/'.join(resource.sort_keys)}，-为倒序)"),
+            annotation=Optional[str],
+        ))
+    if resource.facets:
+        parameters.append(inspect.Parameter(
+            "facets", inspect.Parameter.KEYWORD_ONLY,
+            default=Query(None, pattern=FACETS_PATTERN, description=f"返回分面计数的字段，逗号分隔({','.join(resource.facets)})"),
+            annotation=Optional[str],
+        ))
+    parameters.append(_db_parameter())
+
+    async def endpoint(**kwargs):
+        db = kwargs.pop("db")
+        try:
+            try:
+                facet_names = parse_facets(kwargs.pop("facets", None), resource.facets)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            page = list_page(
+                db, resource, kwargs.pop("page"), kwargs.pop("page_size"), kwargs,
+                search=kwargs.pop("search", None), sort=kwargs.pop("sort", None), facet_names=facet_names,
+            )
+            return PaginatedResponse(success=True, message=f"获取{list_label}成功", **page)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"获取{list_label}失败: {str(e)}")
+
+    return _endpoint(endpoint, f"get_{resource.noun}s", parameters, f"获取{list_label}")
+
+
+def get_endpoint(resource: Resource):
+    async def endpoint(**kwargs):
+        db = kwargs["db"]
+        try:
+            record = get_entity(db, resource.model, kwargs[resource.id_param])
+            if not record:
+                raise HTTPException(status_code=404, detail=f"{resource.label}不存在")
+            return BaseResponse(success=True, message=f"获取{resource.label}成功", data=resource.schema.from_orm(record))
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"获取{resource.label}失败: {str(e)}")
+
+    return _endpoint(endpoint, f"get_{resource.noun}", [_id_parameter(resource), _db_parameter()], f"获取单个{resource.label}")
+
+
+def create_endpoint(resource: Resource):
+    parameters = [
+        inspect.Parameter("data", inspect.Parameter.KEYWORD_ONLY, annotation=resource.create_schema),
+        _db_parameter(),
+    ]
+
+    async def endpoint(data, db: Session):
+        try:
+            record = resource.model(**data.dict())
+            db.add(record)
+            if resource.after_create is not None:
+                db.flush()
+                resource.after_create(db, record)
+            db.commit()
+            db.refresh(record)
+            return BaseResponse(success=True, message=f"{resource.label}创建成功", data=resource.schema.from_orm(record))
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"创建{resource.label}失败: {str(e)}")
+
+    return _endpoint(endpoint, f"create_{resource.noun}", parameters, f"创建{resource.label}")
+
+
+def _load_for_write(db: Session, resource: Resource, record_id: int):
+    """写操作在会话中查询（实体缓存返回的是游离实例）"""
+    record = db.query(resource.model).filter(resource.model.id == record_id, *resource.where).first()
+    if not record:
+        raise HTTPException(status_code=404, detail=f"{resource.label}不存在")
+    return record
+
+
+def update_endpoint(resource: Resource):
+    parameters = [
+        _id_parameter(resource),
+        inspect.Parameter("data", inspect.Parameter.KEYWORD_ONLY, annotation=resource.update_schema),
+        _db_parameter(),
+    ]
+
+    async def endpoint(**kwargs):
+        db = kwargs["db"]
+        try:
+            record = _load_for_write(db, resource, kwargs[resource.id_param])
+
+            # 更新字段
+            update_data = kwargs["data"].dict(exclude_unset=True)
+            for field, value in update_data.items():
+                setattr(record, field, value)
+            if resource.after_update is not None:
+                resource.after_update(db, record, update_data)
+
+            db.commit()
+            db.refresh(record)
+            return BaseResponse(success=True, message=f"{resource.label}更新成功", data=resource.schema.from_orm(record))
+        except HTTPException:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"更新{resource.label}失败: {str(e)}")
+
+    return _endpoint(endpoint, f"update_{resource.noun}", parameters, f"更新{resource.label}")
+
+
+def delete_endpoint(resource: Resource):
+    async def endpoint(**kwargs):
+        db = kwargs["db"]
+        try:
+            record_id = kwargs[resource.id_param]
+            db.delete(_load_for_write(db, resource, record_id))
+            if resource.after_delete is not None:
+                resource.after_delete(db, record_id)
+            db.commit()
+            return BaseResponse(success=True, message=f"{resource.label}删除成功")
+        except HTTPException:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"删除{resource.label}失败: {str(e)}")
+
+    return _endpoint(endpoint, f"delete_{resource.noun}", [_id_parameter(resource), _db_parameter()], f"删除{resource.label}")
+
+
+def stats_endpoint(resource: Resource):
+    label = resource.stats.label
+
+    async def endpoint(db: Session):
+        try:
+            return BaseResponse(success=True, message=f"获取{label}成功", data=stats_data(db, resource))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"获取{label}失败: {str(e)}")
+
+    return _endpoint(endpoint, f"get_{resource.name}_stats", [_db_parameter()], f"获取{label}")
+
+
+def register_routes(router: APIRouter, resource: Resource):
+    """
+    注册资源的通用路由（在模块末尾调用，手写的 /<name>/export 等路由需先于 /<name>/{id} 注册）
+    """
+    base = f"/{resource.name}"
+    item = f"{base}/{{{resource.id_param}}}"
+    routes = {
+        "list": (router.get, base, list_endpoint),
+        "create": (router.post, f"{base}/", create_endpoint),
+        "stats": (router.get, f"{base}/stats/summary", stats_endpoint),
+        "get": (router.get, item, get_endpoint),
+        "update": (router.put, item, update_endpoint),
+        "delete": (router.delete, item, delete_endpoint),
+    }
+    for name in ALL_ROUTES:
+        if name in resource.routes:
+            method, path, factory = routes[name]
+            response_model = PaginatedResponse if name == "list" else BaseResponse
+            method(path, response_model=response_model)(factory(resource))
@@ -1,79 +1,55 @@
 # -*- coding: utf-8 -*-
 """
 日历备注API路由
+列表和统计接口由资源引擎生成（见 app.resources），按日期读写的接口在此手写
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, and_
-from typing import List, Optional, Dict
-from datetime import datetime, timedelta
+from sqlalchemy import func, and_
+from typing import Optional
+from datetime import datetime
 import calendar
 
 from app.database import get_db
+from app.entity_cache import get_entity_by
+from app.export import export_response, EXPORT_FORMAT_PATTERN
 from app.models import CalendarNote as CalendarNoteModel
-from app.schemas import (
-    CalendarNote, CalendarNoteCreate, CalendarNoteUpdate,
-    BaseResponse, PaginatedResponse
-)
+from app.resources import Filter, Resource, Stats, register_routes
+from app.schemas import CalendarNote, BaseResponse
 
 router = APIRouter()
 
+CALENDAR = Resource(
+    model=CalendarNoteModel,
+    schema=CalendarNote,
+    name="calendar",
+    noun="calendar_note",
+    label="日历备注",
+    id_param="note_id",
+    filters=(
+        Filter("start_date", "date", op="ge", description="开始日期(YYYY-MM-DD)"),
+        Filter("end_date", "date", op="le", description="结束日期(YYYY-MM-DD)"),
+        Filter("is_special", "is_special", type=bool, description="特殊日期筛选"),
+    ),
+    search_fields=("content", "mood"),
+    sort_keys=("-date", "date"),
+    stats=Stats(
+        "日历统计",
+        month=lambda model: func.substr(model.date, 1, 7),
+        counts=(("special_count", lambda model: model.is_special == True),),
+    ),
+    routes=("list", "stats"),
+)
+
 
-@router.get("/calendar", response_model=PaginatedResponse)
-async def get_calendar_notes(
-    page: int = Query(1, ge=1, description="页码"),
-    page_size: int = Query(10, ge=1, le=100, description="每页数量"),
-    start_date: Optional[str] = Query(None, description="开始日期(YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="结束日期(YYYY-MM-DD)"),
-    is_special: Optional[bool] = Query(None, description="特殊日期筛选"),
-    search: Optional[str] = Query(None, description="搜索关键词"),
-    db: Session = Depends(get_db)
+@router.get("/calendar/export")
+async def export_calendar_notes(
+    format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN, description="导出格式(ndjson/csv)"),
+    updated_since: Optional[datetime] = Query(None, description="仅导出该时间之后更新的记录")
 ):
-    """获取日历备注列表"""
-    try:
-        # 构建查询
-        query = db.query(CalendarNoteModel)
-        
-        # 日期范围筛选
-        if start_date:
-            query = query.filter(CalendarNoteModel.date >= start_date)
-        if end_date:
-            query = query.filter(CalendarNoteModel.date <= end_date)
-        
-        # 特殊日期筛选
-        if is_special is not None:
-            query = query.filter(CalendarNoteModel.is_special == is_special)
-        
-        # 关键词搜索
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (CalendarNoteModel.content.like(search_term)) |
-                (CalendarNoteModel.mood.like(search_term))
-            )
-        
-        # 总数统计
-        total = query.count()
-        
-        # 分页查询
-        offset = (page - 1) * page_size
-        notes = query.order_by(desc(CalendarNoteModel.date)).offset(offset).limit(page_size).all()
-        
-        # 计算总页数
-        total_pages = (total + page_size - 1) // page_size
-        
-        return PaginatedResponse(
-            success=True,
-            message="获取日历备注成功",
-            data=[CalendarNote.from_orm(note) for note in notes],
-            total=total,
-            page=page,
-            page_size=page_size,
-            total_pages=total_pages
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取日历备注失败: {str(e)}")
+    """流式导出全部日历备注"""
+    return export_response(CalendarNoteModel, format, updated_since)
 
 
 @router.get("/calendar/{date}", response_model=BaseResponse)
@@ -89,7 +65,7 @@ async def get_note_by_date(
         except ValueError:
             raise HTTPException(status_code=400, detail="日期格式错误，应为YYYY-MM-DD")
         
-        note = db.query(CalendarNoteModel).filter(CalendarNoteModel.date == date).first()
+        note = get_entity_by(db, CalendarNoteModel, "date", date)
         
         return BaseResponse(
             success=True,
@@ -243,44 +219,4 @@ async def get_month_notes(
         raise HTTPException(status_code=500, detail=f"获取月份备注失败: {str(e)}")
 
 
-@router.get("/calendar/stats/summary", response_model=BaseResponse)
-async def get_calendar_stats(db: Session = Depends(get_db)):
-    """获取日历备注统计"""
-    try:
-        # 总数统计
-        total_count = db.query(CalendarNoteModel).count()
-        
-        # 特殊日期统计
-        special_count = db.query(CalendarNoteModel).filter(
-            CalendarNoteModel.is_special == True
-        ).count()
-        
-        # 最近30天统计
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_count = db.query(CalendarNoteModel).filter(
-            CalendarNoteModel.created_at >= thirty_days_ago
-        ).count()
-        
-        # 月度统计
-        monthly_stats = db.query(
-            func.substr(CalendarNoteModel.date, 1, 7).label('month'),
-            func.count(CalendarNoteModel.id).label('count')
-        ).group_by('month').order_by('month').limit(12).all()
-        
-        monthly_data = [
-            {"month": month[0], "count": month[1]} 
-            for month in monthly_stats
-        ]
-        
-        return BaseResponse(
-            success=True,
-            message="获取日历统计成功",
-            data={
-                "total_count": total_count,
-                "special_count": special_count,
-                "recent_count": recent_count,
-                "monthly_data": monthly_data
-            }
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取日历统计失败: {str(e)}")
\ No newline at end of file
+register_routes(router, CALENDAR)
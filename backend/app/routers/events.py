@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+数据变更推送API路由
+"""
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+
+from app.config import settings
+from app.events import broker, event_stream, replay
+from app.timeline import SOURCES
+
+router = APIRouter()
+
+TYPES_PATTERN = f"^({'|'.join(SOURCES)})(,({'|'.join(SOURCES)}))*$"
+
+
+@router.get("/events")
+async def change_events(
+    types: Optional[str] = Query(None, pattern=TYPES_PATTERN, description="订阅的记录类型，逗号分隔(food,movie,calendar,file)，默认全部"),
+    last_event_id: Optional[int] = Header(None, ge=0, description="断线重连时浏览器自动携带的最后事件ID"),
+):
+    """
+    订阅数据变更（Server-Sent Events）
+    
+    change 事件: {"entity": 类型, "id": 记录ID, "op": insert/update/delete, "version": 变更序号}
+    reset 事件: 错过的变更无法补发，需重新拉取列表
+    """
+    try:
+        if len(broker.subscribers) >= settings.events_max_connections_per_worker:
+            raise HTTPException(status_code=503, detail="推送连接数已达上限，请稍后重试")
+        
+        selected = set(types.split(",")) if types else None
+        # 先订阅再补发，补发期间产生的变更不会遗漏（按序号去重）
+        subscriber = broker.subscribe(selected)
+        try:
+            replayed = await run_in_threadpool(replay, last_event_id, selected) if last_event_id is not None else []
+        except Exception:
+            broker.unsubscribe(subscriber)
+            raise
+        
+        return StreamingResponse(
+            event_stream(subscriber, replayed),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                # 关闭nginx对该响应的缓冲
+                "X-Accel-Buffering": "no",
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"订阅数据变更失败: {str(e)}")
@@ -1,30 +1,84 @@
 # -*- coding: utf-8 -*-
 """
 文件管理API路由
+列表/详情/统计接口由资源引擎生成（见 app.resources），上传、修改、删除和下载在此手写
 """
 
 import os
 import uuid
 import shutil
+import asyncio
 from datetime import datetime
-from typing import List, Optional
+from urllib.parse import quote
+from typing import Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy import func, insert
+from starlette.concurrency import run_in_threadpool
 
+from app.archive import archive_response
+from app.changes import record_ids
+from app.counters import record_download
 from app.database import get_db
+from app.entity_cache import get_entity
+from app.export import export_response, EXPORT_FORMAT_PATTERN
 from app.models import FileRecord as FileRecordModel
+from app.resources import Filter, Resource, Stats, register_routes
 from app.schemas import (
     FileRecord, FileRecordUpdate,
-    BaseResponse, PaginatedResponse, StatsResponse
+    BaseResponse
 )
 from app.config import settings
+from app.file_gc import enqueue_purge
+from app.media import MEDIA_TYPES, enqueue_extraction, enqueue_extractions
+from app.storage_usage import QuotaExceededError, reserve, release, adjust, get_usage
+from app.tiering import HOT, iter_stored_file, locate_stored_file
 
 router = APIRouter()
 
 
+def usage_stats(db: Session, data: dict):
+    """文件类型统计和总存储大小（读取存储台账）"""
+    usage = get_usage(db)
+    data["categories"] = [item for item in usage["by_type"] if item["count"] > 0]
+    data["total_size"] = usage["total_size"]
+    data["total_size_mb"] = round(usage["total_size"] / 1024 / 1024, 2)
+
+
+FILES = Resource(
+    model=FileRecordModel,
+    schema=FileRecord,
+    name="files",
+    noun="file_record",
+    label="文件记录",
+    list_label="文件列表",
+    id_param="file_id",
+    # 已删除待清理的记录不出现在列表和统计中
+    where=(FileRecordModel.deleted_at.is_(None),),
+    filters=(
+        Filter("file_type", "file_type", description="文件类型筛选"),
+        Filter("category", "category", description="分类筛选"),
+        # 媒体元数据筛选（使用上传后提取的索引列）
+        Filter("orientation", "orientation", pattern=r"^(landscape|portrait|square)$", description="画面方向筛选"),
+        Filter("min_width", "width", op="ge", type=int, ge=0, description="最小宽度(像素)"),
+        Filter("max_width", "width", op="le", type=int, ge=0, description="最大宽度(像素)"),
+        Filter("min_height", "height", op="ge", type=int, ge=0, description="最小高度(像素)"),
+        Filter("max_height", "height", op="le", type=int, ge=0, description="最大高度(像素)"),
+        Filter("taken_from", "taken_at", op="ge", type=datetime, description="拍摄时间起"),
+        Filter("taken_to", "taken_at", op="le", type=datetime, description="拍摄时间止"),
+        Filter("min_duration", "duration_seconds", op="ge", type=float, ge=0, description="最短时长(秒)"),
+        Filter("max_duration", "duration_seconds", op="le", type=float, ge=0, description="最长时长(秒)"),
+    ),
+    search_fields=("original_filename", "description"),
+    sort_keys=("-created_at", "created_at", "-file_size", "-download_count", "-taken_at"),
+    facets=("file_type", "category", "orientation"),
+    stats=Stats("文件统计", extra=usage_stats),
+    routes=("list", "get", "stats"),
+)
+
+
 def get_file_type(filename: str) -> str:
     """根据文件扩展名获取文件类型"""
     ext = os.path.splitext(filename)[1].lower()
@@ -56,57 +110,21 @@ def generate_unique_filename(original_filename: str) -> str:
     return unique_name
 
 
-@router.get("/files", response_model=PaginatedResponse)
-async def get_file_records(
-    page: int = Query(1, ge=1, description="页码"),
-    page_size: int = Query(10, ge=1, le=100, description="每页数量"),
-    file_type: Optional[str] = Query(None, description="文件类型筛选"),
-    category: Optional[str] = Query(None, description="分类筛选"),
-    search: Optional[str] = Query(None, description="搜索关键词"),
-    db: Session = Depends(get_db)
-):
-    """获取文件记录列表"""
-    try:
-        # 构建查询
-        query = db.query(FileRecordModel)
-        
-        # 文件类型筛选
-        if file_type:
-            query = query.filter(FileRecordModel.file_type == file_type)
-        
-        # 分类筛选
-        if category:
-            query = query.filter(FileRecordModel.category == category)
-        
-        # 关键词搜索
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (FileRecordModel.original_filename.like(search_term)) |
-                (FileRecordModel.description.like(search_term))
-            )
-        
-        # 总数统计
-        total = query.count()
-        
-        # 分页查询
-        offset = (page - 1) * page_size
-        files = query.order_by(desc(FileRecordModel.created_at)).offset(offset).limit(page_size).all()
-        
-        # 计算总页数
-        total_pages = (total + page_size - 1) // page_size
-        
-        return PaginatedResponse(
-            success=True,
-            message="获取文件列表成功",
-            data=[FileRecord.from_orm(file) for file in files],
-            total=total,
-            page=page,
-            page_size=page_size,
-            total_pages=total_pages
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取文件列表失败: {str(e)}")
+def upload_size(file: UploadFile) -> int:
+    """上传内容已缓存在临时文件中，写入前即可得到准确大小"""
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+
+def save_upload(file: UploadFile, file_path: str) -> int:
+    """将上传内容写入磁盘，返回实际大小"""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    return os.path.getsize(file_path)
 
 
 @router.post("/files/upload", response_model=BaseResponse)
@@ -117,14 +135,26 @@ async def upload_file(
     db: Session = Depends(get_db)
 ):
     """上传文件"""
+    committed = False
+    reserved_size = None
     try:
+        declared_size = upload_size(file)
+        
         # 检查文件大小
-        if file.size and file.size > settings.max_file_size:
+        if declared_size > settings.max_file_size:
             raise HTTPException(
                 status_code=413, 
                 detail=f"文件大小超过限制({settings.max_file_size / 1024 / 1024:.1f}MB)"
             )
         
+        # 检查配额并预占存储用量（在写入任何字节之前）
+        file_type = get_file_type(file.filename)
+        try:
+            reserve(db, file_type, custom_category, declared_size)
+        except QuotaExceededError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        reserved_size = declared_size
+        
         # 生成唯一文件名
         unique_filename = generate_unique_filename(file.filename)
         file_path = os.path.join(settings.upload_dir, unique_filename)
@@ -132,13 +162,10 @@ async def upload_file(
         # 确保上传目录存在
         os.makedirs(settings.upload_dir, exist_ok=True)
         
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # 获取文件信息
-        file_size = os.path.getsize(file_path)
-        file_type = get_file_type(file.filename)
+        # 保存文件，实际大小与预占不同时修正台账
+        file_size = save_upload(file, file_path)
+        if file_size != reserved_size:
+            adjust(db, file_type, custom_category, file_size - reserved_size, 0)
         
         # 创建文件记录
         file_record = FileRecordModel(
@@ -150,11 +177,19 @@ async def upload_file(
             mime_type=file.content_type,
             description=description,
             category=custom_category,
-            is_public=False  # 默认私有
+            is_public=False,  # 默认私有
+            media_status="pending" if file_type in MEDIA_TYPES else "skipped"
         )
         
         db.add(file_record)
+        
+        # 由worker提取图片尺寸、拍摄时间和音视频时长（任务与记录一起提交）
+        if file_type in MEDIA_TYPES:
+            db.flush()
+            enqueue_extraction(db, file_record.id)
+        
         db.commit()
+        committed = True
         db.refresh(file_record)
         
         return BaseResponse(
@@ -165,33 +200,196 @@ async def upload_file(
     except HTTPException:
         raise
     except Exception as e:
-        # 如果数据库操作失败，删除已上传的文件
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
         db.rollback()
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+    finally:
+        # 记录未能写入数据库时（包括请求被取消），删除已写入的文件
+        if not committed and 'file_path' in locals() and os.path.exists(file_path):
+            os.remove(file_path)
+        if not committed and reserved_size is not None:
+            release(db, file_type, custom_category, reserved_size)
 
 
-@router.get("/files/{file_id}", response_model=BaseResponse)
-async def get_file_record(
-    file_id: int,
+@router.post("/files/upload/batch", response_model=BaseResponse)
+async def upload_files(
+    files: List[UploadFile] = File(...),
+    description: Optional[str] = Form(None),
+    custom_category: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
-    """获取文件记录详情"""
+    """
+    批量上传文件
+    按文件类型一次预占用量，并发写入磁盘，一条 INSERT 语句写入全部记录并一次提交；
+    返回每个文件的结果，单个文件失败（超出大小/配额、写入失败）不影响其他文件
+    """
+    if len(files) > settings.upload_batch_max_files:
+        raise HTTPException(status_code=400, detail=f"单次最多上传 {settings.upload_batch_max_files} 个文件")
+
+    failed = []
+    # 文件类型 -> [预占字节数, 预占文件数]，提交前的剩余部分在 finally 中释放
+    reserved: Dict[str, List[int]] = {}
+    written: List[str] = []
+    committed = False
     try:
-        file_record = db.query(FileRecordModel).filter(FileRecordModel.id == file_id).first()
-        if not file_record:
-            raise HTTPException(status_code=404, detail="文件记录不存在")
-        
+        # 检查文件大小并按文件类型分组
+        groups: Dict[str, list] = {}
+        for index, file in enumerate(files):
+            declared_size = upload_size(file)
+            if declared_size > settings.max_file_size:
+                failed.append({
+                    "index": index,
+                    "filename": file.filename,
+                    "error": f"文件大小超过限制({settings.max_file_size / 1024 / 1024:.1f}MB)"
+                })
+                continue
+            groups.setdefault(get_file_type(file.filename), []).append((index, file, declared_size))
+
+        # 检查配额并预占存储用量（每种文件类型一次），超出配额的类型整体失败
+        accepted = []
+        for file_type, items in groups.items():
+            total = sum(declared_size for _, _, declared_size in items)
+            try:
+                reserve(db, file_type, custom_category, total, len(items))
+            except QuotaExceededError as e:
+                failed.extend({"index": index, "filename": file.filename, "error": str(e)} for index, file, _ in items)
+                continue
+            reserved[file_type] = [total, len(items)]
+            accepted.extend((index, file, declared_size, file_type) for index, file, declared_size in items)
+        accepted.sort(key=lambda item: item[0])
+
+        # 并发写入磁盘（在线程池中执行，并发数受限）
+        os.makedirs(settings.upload_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(settings.upload_batch_concurrency)
+
+        async def write(item):
+            index, file, declared_size, file_type = item
+            unique_filename = generate_unique_filename(file.filename)
+            file_path = os.path.join(settings.upload_dir, unique_filename)
+            async with semaphore:
+                written.append(file_path)
+                try:
+                    file_size = await run_in_threadpool(save_upload, file, file_path)
+                except Exception as e:
+                    failed.append({"index": index, "filename": file.filename, "error": f"文件写入失败: {str(e)}"})
+                    return None
+            return {
+                "filename": unique_filename,
+                "original_filename": file.filename,
+                "file_path": file_path,
+                "file_size": file_size,
+                "file_type": file_type,
+                "mime_type": file.content_type,
+                "description": description,
+                "category": custom_category,
+                "is_public": False,  # 默认私有
+                "media_status": "pending" if file_type in MEDIA_TYPES else "skipped",
+            }
+
+        rows = [row for row in await asyncio.gather(*(write(item) for item in accepted)) if row is not None]
+
+        # 实际写入的大小和数量与预占不同时修正台账（随记录一起提交）
+        for file_type, (reserved_size, reserved_count) in reserved.items():
+            sizes = [row["file_size"] for row in rows if row["file_type"] == file_type]
+            if sum(sizes) != reserved_size or len(sizes) != reserved_count:
+                adjust(db, file_type, custom_category, sum(sizes) - reserved_size, len(sizes) - reserved_count)
+
+        uploaded = []
+        if rows:
+            # 一条语句写入全部记录，再按唯一文件名一次读回（MySQL不支持 INSERT ... RETURNING）
+            db.execute(insert(FileRecordModel), rows)
+            order = {row["filename"]: position for position, row in enumerate(rows)}
+            records = sorted(
+                db.query(FileRecordModel).filter(FileRecordModel.filename.in_(list(order))).all(),
+                key=lambda record: order[record.filename]
+            )
+            record_ids(db, FileRecordModel.__tablename__, [record.id for record in records])
+            enqueue_extractions(db, [record.id for record in records if record.file_type in MEDIA_TYPES])
+            uploaded = [FileRecord.from_orm(record) for record in records]
+
+        db.commit()
+        committed = True
+        failed.sort(key=lambda item: item["index"])
+
         return BaseResponse(
-            success=True,
-            message="获取文件记录成功",
-            data=FileRecord.from_orm(file_record)
+            success=bool(uploaded),
+            message=f"批量上传完成：成功 {len(uploaded)} 个，失败 {len(failed)} 个",
+            data={"uploaded": uploaded, "failed": failed}
         )
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取文件记录失败: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"批量上传失败: {str(e)}")
+    finally:
+        # 记录未能写入数据库时（包括请求被取消），删除已写入的文件并释放预占
+        if not committed:
+            for file_path in written:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            for file_type, (reserved_size, reserved_count) in reserved.items():
+                release(db, file_type, custom_category, reserved_size, reserved_count)
+
+
+@router.get("/files/export")
+async def export_file_records(
+    format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN, description="导出格式(ndjson/csv)"),
+    updated_since: Optional[datetime] = Query(None, description="仅导出该时间之后更新的记录")
+):
+    """流式导出全部文件记录"""
+    return export_response(FileRecordModel, format, updated_since, FileRecordModel.deleted_at.is_(None))
+
+
+@router.get("/files/archive")
+async def download_archive(
+    ids: Optional[str] = Query(None, pattern=r"^\d+(,\d+)*$", description="文件ID列表，逗号分隔"),
+    category: Optional[str] = Query(None, description="按分类打包"),
+    file_type: Optional[str] = Query(None, description="按文件类型打包"),
+    db: Session = Depends(get_db)
+):
+    """将多个文件打包为ZIP流式下载（指定ID列表，或按分类/文件类型筛选）"""
+    try:
+        if not ids and not category and not file_type:
+            raise HTTPException(status_code=400, detail="请指定文件ID列表或筛选条件")
+
+        query = db.query(FileRecordModel).filter(FileRecordModel.deleted_at.is_(None))
+        if ids:
+            file_ids = list(dict.fromkeys(int(file_id) for file_id in ids.split(",")))
+            if len(file_ids) > settings.archive_max_files:
+                raise HTTPException(status_code=400, detail=f"单次最多打包 {settings.archive_max_files} 个文件")
+            query = query.filter(FileRecordModel.id.in_(file_ids))
+        if category:
+            query = query.filter(FileRecordModel.category == category)
+        if file_type:
+            query = query.filter(FileRecordModel.file_type == file_type)
+
+        records = query.order_by(FileRecordModel.created_at).limit(settings.archive_max_files + 1).all()
+        if not records:
+            raise HTTPException(status_code=404, detail="没有可打包的文件")
+        if len(records) > settings.archive_max_files:
+            raise HTTPException(status_code=400, detail=f"单次最多打包 {settings.archive_max_files} 个文件")
+        if ids:
+            # 按请求中的顺序打包
+            order = {file_id: index for index, file_id in enumerate(file_ids)}
+            records.sort(key=lambda record: order[record.id])
+
+        return archive_response(records)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"打包下载失败: {str(e)}")
+
+
+@router.get("/files/usage", response_model=BaseResponse)
+async def get_storage_usage(db: Session = Depends(get_db)):
+    """获取存储用量（读取台账）"""
+    try:
+        return BaseResponse(
+            success=True,
+            message="获取存储用量成功",
+            data=get_usage(db)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取存储用量失败: {str(e)}")
 
 
 @router.put("/files/{file_id}", response_model=BaseResponse)
@@ -202,15 +400,24 @@ async def update_file_info(
 ):
     """更新文件信息"""
     try:
-        file_record = db.query(FileRecordModel).filter(FileRecordModel.id == file_id).first()
+        file_record = db.query(FileRecordModel).filter(
+            FileRecordModel.id == file_id,
+            FileRecordModel.deleted_at.is_(None)
+        ).first()
         if not file_record:
             raise HTTPException(status_code=404, detail="文件记录不存在")
         
         # 更新字段
         update_data = file_data.dict(exclude_unset=True)
+        old_category = file_record.category
         for field, value in update_data.items():
             setattr(file_record, field, value)
         
+        # 分类变化时在台账中转移用量
+        if file_record.category != old_category:
+            adjust(db, file_record.file_type, old_category, -file_record.file_size, -1)
+            adjust(db, file_record.file_type, file_record.category, file_record.file_size, 1)
+        
         db.commit()
         db.refresh(file_record)
         
@@ -231,18 +438,20 @@ async def delete_file(
     file_id: int,
     db: Session = Depends(get_db)
 ):
-    """删除文件"""
+    """删除文件（标记删除，物理文件由worker清理）"""
     try:
-        file_record = db.query(FileRecordModel).filter(FileRecordModel.id == file_id).first()
+        file_record = db.query(FileRecordModel).filter(
+            FileRecordModel.id == file_id,
+            FileRecordModel.deleted_at.is_(None)
+        ).first()
         if not file_record:
             raise HTTPException(status_code=404, detail="文件记录不存在")
         
-        # 删除物理文件
-        if os.path.exists(file_record.file_path):
-            os.remove(file_record.file_path)
-        
-        # 删除数据库记录
-        db.delete(file_record)
+        # 标记删除，记录立即从列表中消失
+        file_record.deleted_at = func.now()
+        adjust(db, file_record.file_type, file_record.category, -file_record.file_size, -1)
+        # 清理任务与标记删除在同一事务中提交，worker 删除物理文件和记录
+        enqueue_purge(db, file_id)
         db.commit()
         
         return BaseResponse(
@@ -263,21 +472,35 @@ async def download_file(
 ):
     """下载文件"""
     try:
-        file_record = db.query(FileRecordModel).filter(FileRecordModel.id == file_id).first()
+        file_record = get_entity(db, FileRecordModel, file_id)
         if not file_record:
             raise HTTPException(status_code=404, detail="文件不存在")
         
-        if not os.path.exists(file_record.file_path):
+        stored = locate_stored_file(file_record)
+        if stored is None:
             raise HTTPException(status_code=404, detail="文件已被删除")
         
-        # 更新下载次数
-        file_record.download_count += 1
-        db.commit()
+        # 更新下载次数（批量写入，见 app.counters）
+        record_download(file_id)
+        
+        path, tier = stored
+        if tier == HOT:
+            return FileResponse(
+                path=path,
+                filename=file_record.original_filename,
+                media_type=file_record.mime_type
+            )
         
-        return FileResponse(
-            path=file_record.file_path,
-            filename=file_record.original_filename,
-            media_type=file_record.mime_type
+        # 冷存储的文件边解压边发送（见 app.tiering）
+        filename = quote(file_record.original_filename)
+        if filename != file_record.original_filename:
+            content_disposition = f"attachment; filename*=utf-8''{filename}"
+        else:
+            content_disposition = f'attachment; filename="{filename}"'
+        return StreamingResponse(
+            iter_stored_file(file_record),
+            media_type=file_record.mime_type or "application/octet-stream",
+            headers={"Content-Disposition": content_disposition, "Content-Length": str(file_record.file_size)}
         )
     except HTTPException:
         raise
@@ -285,67 +508,4 @@ async def download_file(
         raise HTTPException(status_code=500, detail=f"下载文件失败: {str(e)}")
 
 
-@router.get("/files/stats/summary", response_model=BaseResponse)
-async def get_file_stats(db: Session = Depends(get_db)):
-    """获取文件统计"""
-    try:
-        # 总数统计
-        total_count = db.query(FileRecordModel).count()
-        
-        # 最近30天统计
-        from datetime import timedelta
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_count = db.query(FileRecordModel).filter(
-            FileRecordModel.created_at >= thirty_days_ago
-        ).count()
-        
-        # 文件类型统计
-        type_stats = db.query(
-            FileRecordModel.file_type,
-            func.count(FileRecordModel.id).label('count'),
-            func.sum(FileRecordModel.file_size).label('total_size')
-        ).filter(
-            FileRecordModel.file_type.isnot(None)
-        ).group_by(FileRecordModel.file_type).all()
-        
-        categories = [
-            {
-                "name": stat[0] or "未知类型", 
-                "count": stat[1],
-                "size": stat[2] or 0
-            } 
-            for stat in type_stats
-        ]
-        
-        # 总存储大小
-        total_size = db.query(func.sum(FileRecordModel.file_size)).scalar() or 0
-        
-        # 月度统计
-        monthly_stats = db.query(
-            func.date_format(FileRecordModel.created_at, '%Y-%m').label('month'),
-            func.count(FileRecordModel.id).label('count')
-        ).group_by('month').order_by('month').limit(12).all()
-        
-        monthly_data = [
-            {"month": month[0], "count": month[1]} 
-            for month in monthly_stats
-        ]
-        
-        stats = StatsResponse(
-            total_count=total_count,
-            recent_count=recent_count,
-            categories=categories,
-            monthly_data=monthly_data
-        )
-        
-        return BaseResponse(
-            success=True,
-            message="获取文件统计成功",
-            data={
-                **stats.dict(),
-                "total_size": total_size,
-                "total_size_mb": round(total_size / 1024 / 1024, 2)
-            }
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取文件统计失败: {str(e)}")
\ No newline at end of file
+register_routes(router, FILES)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务状态API路由
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import desc
+from typing import Optional
+
+from app.database import get_db
+from app.jobs import JOB_STATUSES, queue_stats, retry
+from app.models import Job as JobModel
+from app.schemas import BaseResponse, JobRecord, PaginatedResponse
+
+router = APIRouter()
+
+
+@router.get("/jobs", response_model=PaginatedResponse)
+async def get_jobs(
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(20, ge=1, le=100, description="每页数量"),
+    queue: Optional[str] = Query(None, description="队列筛选"),
+    status: Optional[str] = Query(None, pattern=f"^({'|'.join(JOB_STATUSES)})$", description="状态筛选"),
+    name: Optional[str] = Query(None, description="任务名称筛选"),
+    db: Session = Depends(get_db)
+):
+    """获取任务列表"""
+    try:
+        query = db.query(JobModel)
+        
+        if queue:
+            query = query.filter(JobModel.queue == queue)
+        if status:
+            query = query.filter(JobModel.status == status)
+        if name:
+            query = query.filter(JobModel.name == name)
+        
+        total = query.count()
+        offset = (page - 1) * page_size
+        jobs = query.order_by(desc(JobModel.id)).offset(offset).limit(page_size).all()
+        
+        return PaginatedResponse(
+            success=True,
+            message="获取任务列表成功",
+            data=[JobRecord.from_orm(job) for job in jobs],
+            total=total,
+            page=page,
+            page_size=page_size,
+            total_pages=(total + page_size - 1) // page_size
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取任务列表失败: {str(e)}")
+
+
+@router.get("/jobs/stats", response_model=BaseResponse)
+async def get_job_stats(db: Session = Depends(get_db)):
+    """获取各队列任务统计"""
+    try:
+        return BaseResponse(
+            success=True,
+            message="获取任务统计成功",
+            data=queue_stats(db)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取任务统计失败: {str(e)}")
+
+
+@router.get("/jobs/{job_id}", response_model=BaseResponse)
+async def get_job(
+    job_id: int,
+    db: Session = Depends(get_db)
+):
+    """获取单个任务状态"""
+    try:
+        job = db.query(JobModel).filter(JobModel.id == job_id).first()
+        if not job:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        
+        return BaseResponse(
+            success=True,
+            message="获取任务成功",
+            data=JobRecord.from_orm(job)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取任务失败: {str(e)}")
+
+
+@router.post("/jobs/{job_id}/retry", response_model=BaseResponse)
+async def retry_job(
+    job_id: int,
+    db: Session = Depends(get_db)
+):
+    """重新执行已放弃(dead)的任务"""
+    try:
+        job = retry(db, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="任务不存在或未处于dead状态")
+        
+        return BaseResponse(
+            success=True,
+            message="任务已重新入队",
+            data=JobRecord.from_orm(job)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"重新执行任务失败: {str(e)}")
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+增量同步API路由
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.schemas import BaseResponse
+from app.sync import changes_since
+
+router = APIRouter()
+
+
+@router.get("/sync", response_model=BaseResponse)
+async def sync_changes(
+    since: Optional[str] = Query(None, pattern=r"^\d{1,19}$", description="上次同步返回的令牌，为空表示首次同步"),
+    limit: int = Query(500, ge=1, le=1000, description="单次最多处理的变更数"),
+    db: Session = Depends(get_db)
+):
+    """
+    增量同步：返回令牌之后新增、修改和删除的记录
+    
+    reset 为 true 时需全量拉取各列表（先保存返回的令牌），has_more 为 true 时继续用新令牌请求
+    """
+    try:
+        result = changes_since(db, int(since) if since is not None else None, limit)
+        return BaseResponse(
+            success=True,
+            message="同步成功",
+            data=result
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"同步失败: {str(e)}")
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+时间线API路由
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.schemas import BaseResponse
+from app.timeline import SOURCES, CursorError, timeline_page
+
+router = APIRouter()
+
+TYPES_PATTERN = f"^({'|'.join(SOURCES)})(,({'|'.join(SOURCES)}))*$"
+
+
+@router.get("/timeline", response_model=BaseResponse)
+async def get_timeline(
+    limit: int = Query(20, ge=1, le=100, description="每页数量"),
+    types: Optional[str] = Query(None, pattern=TYPES_PATTERN, description="记录类型，逗号分隔(food,movie,calendar,file)，默认全部"),
+    cursor: Optional[str] = Query(None, description="翻页游标（上一页返回的next_cursor）"),
+    db: Session = Depends(get_db)
+):
+    """获取最近动态（各类记录按创建时间倒序合并）"""
+    try:
+        selected = list(dict.fromkeys(types.split(","))) if types else list(SOURCES)
+        try:
+            page = timeline_page(db, selected, limit, cursor)
+        except CursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return BaseResponse(
+            success=True,
+            message="获取时间线成功",
+            data=page
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取时间线失败: {str(e)}")
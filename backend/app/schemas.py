@@ -4,7 +4,7 @@ Pydantic模式定义 - 用于API请求和响应的数据验证
 """
 
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 from datetime import datetime
 
 
@@ -16,12 +16,19 @@ class BaseResponse(BaseModel):
     data: Optional[Any] = None
 
 
+class FacetCount(BaseModel):
+    """分面计数"""
+    value: Any = None
+    count: int = 0
+
+
 class PaginatedResponse(BaseResponse):
     """分页响应模式"""
     total: int = 0
     page: int = 1
     page_size: int = 10
     total_pages: int = 0
+    facets: Optional[Dict[str, List[FacetCount]]] = None
 
 
 # 美食记录相关模式
@@ -108,6 +115,11 @@ class MovieRecord(MovieRecordBase):
         from_attributes = True
 
 
+class SimilarMovie(MovieRecord):
+    """相似电影响应模式"""
+    score: float = Field(..., description="相似度(0-1)")
+
+
 # 日历备注相关模式
 class CalendarNoteBase(BaseModel):
     """日历备注基础模式"""
@@ -170,6 +182,34 @@ class FileRecord(FileRecordBase):
     file_type: Optional[str]
     mime_type: Optional[str]
     download_count: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: Optional[str] = None
+    taken_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+    storage_tier: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# 后台任务相关模式
+class JobRecord(BaseModel):
+    """后台任务响应模式"""
+    id: int
+    queue: str
+    name: str
+    payload: Optional[str] = None
+    status: str
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    locked_by: Optional[str] = None
+    locked_until: Optional[datetime] = None
+    last_error: Optional[str] = None
+    finished_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
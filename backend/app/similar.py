@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+相似电影索引
+把电影的类型、导演、评分、时长和观后感词项编码为定长特征向量（NumPy矩阵），
+用矩阵乘法批量计算余弦相似度，预先算出每部电影的 top-k 写入 movie_similar 表，
+接口只需按电影ID读取 k 行
+
+- 特征分块：类型/导演/观后感词项使用特征哈希，评分和时长使用平滑的分桶编码；
+  每块单独归一化后按权重拼接，点积即为各块余弦相似度的加权和
+- 观后感词项取英文单词和中文二元组，权重为 log(1+tf)，不使用IDF，
+  单部电影变化不会影响其他电影的向量，因此可以增量更新
+- 电影新增/修改/删除后加入 movies.similar 任务，worker 增量更新索引：
+  只重算变化的电影、top-k 中包含变化电影的电影，其余电影仅与变化的电影比较后合并
+
+用法:
+    python -m app.similar build   # 全量重建
+"""
+
+import argparse
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.jobs import enqueue, job_handler
+from app.models import MovieRecord, MovieSimilar
+
+logger = logging.getLogger(__name__)
+
+# 特征分块：(名称, 维度, 权重)
+GENRE_DIM = 32
+DIRECTOR_DIM = 32
+TERM_DIM = 192
+RATING_BUCKETS = 11
+DURATION_BUCKETS = 8
+BLOCKS = [
+    ("genre", GENRE_DIM, 0.35),
+    ("director", DIRECTOR_DIM, 0.2),
+    ("terms", TERM_DIM, 0.3),
+    ("rating", RATING_BUCKETS, 0.1),
+    ("duration", DURATION_BUCKETS, 0.05),
+]
+FEATURE_DIM = sum(dim for _, dim, _ in BLOCKS)
+
+# 时长分桶边界（分钟）
+DURATION_EDGES = [80, 95, 105, 115, 125, 140, 160]
+# 一次矩阵乘法处理的电影数（控制临时矩阵大小：CHUNK x N 个float32）
+SCORE_CHUNK = 256
+
+SIMILAR_JOB = "movies.similar"
+# 影响相似度的字段，修改其他字段时不需要更新索引
+FEATURE_FIELDS = ("genre", "director", "rating", "duration", "review")
+
+LATIN_WORD_RE = re.compile(r"[a-z0-9]{2,}")
+CJK_RUN_RE = re.compile(r"[一-鿿]+")
+GENRE_SPLIT_RE = re.compile(r"[/,，、|\s]+")
+
+
+def terms_of(text: Optional[str]) -> Dict[str, int]:
+    """观后感词项：英文单词和中文二元组（单字的中文片段保留单字）"""
+    counts: Dict[str, int] = {}
+    if not text:
+        return counts
+    text = text.lower()
+    tokens = LATIN_WORD_RE.findall(text)
+    for run in CJK_RUN_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    return counts
+
+
+def hash_into(vector: np.ndarray, offset: int, dim: int, token: str, weight: float):
+    """特征哈希：crc32 决定位置，最高位决定符号（减少冲突带来的偏差）"""
+    h = zlib.crc32(token.encode("utf-8"))
+    vector[offset + (h % dim)] += weight if h & 0x80000000 else -weight
+
+
+def bucket_into(vector: np.ndarray, offset: int, buckets: int, position: float):
+    """平滑分桶：相邻桶按距离分配权重，相近的数值得到相近的向量"""
+    for index in range(buckets):
+        vector[offset + index] = math.exp(-((index - position) ** 2) / 2)
+
+
+def movie_vector(genre, director, rating, duration, review) -> np.ndarray:
+    """单部电影的特征向量（每块L2归一化后乘以 sqrt(权重)）"""
+    vector = np.zeros(FEATURE_DIM, dtype=np.float32)
+    offset = 0
+    for name, dim, weight in BLOCKS:
+        block = vector[offset:offset + dim]
+        if name == "genre" and genre:
+            for token in GENRE_SPLIT_RE.split(genre.strip().lower()):
+                if token:
+                    hash_into(vector, offset, dim, token, 1.0)
+        elif name == "director" and director:
+            hash_into(vector, offset, dim, director.strip().lower(), 1.0)
+        elif name == "terms" and review:
+            for token, count in terms_of(review).items():
+                hash_into(vector, offset, dim, token, math.log1p(count))
+        elif name == "rating" and rating is not None:
+            bucket_into(vector, offset, dim, max(0.0, min(10.0, float(rating))))
+        elif name == "duration" and duration:
+            position = float(np.searchsorted(DURATION_EDGES, duration))
+            bucket_into(vector, offset, dim, position)
+
+        norm = np.linalg.norm(block)
+        if norm > 0:
+            block *= math.sqrt(weight) / norm
+        offset += dim
+    return vector
+
+
+def feature_matrix(rows: Iterable[tuple]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Args:
+        rows: (id, genre, director, rating, duration, review)
+
+    Returns:
+        (ID数组, 特征矩阵)
+    """
+    ids = []
+    vectors = []
+    for row in rows:
+        ids.append(row[0])
+        vectors.append(movie_vector(*row[1:]))
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, FEATURE_DIM), dtype=np.float32)
+    return np.asarray(ids, dtype=np.int64), np.vstack(vectors)
+
+
+def top_k(features: np.ndarray, query_positions: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算指定电影的 top-k（排除自身）
+
+    Returns:
+        (位置矩阵 len(query) x k，不足k个时为-1；相似度矩阵)
+    """
+    n = features.shape[0]
+    count = len(query_positions)
+    positions = np.full((count, k), -1, dtype=np.int64)
+    scores = np.full((count, k), -np.inf, dtype=np.float32)
+    width = min(k, n - 1)
+    if width <= 0:
+        return positions, scores
+
+    for start in range(0, count, SCORE_CHUNK):
+        chunk = query_positions[start:start + SCORE_CHUNK]
+        sims = features[chunk] @ features.T
+        sims[np.arange(len(chunk)), chunk] = -np.inf
+        part = np.argpartition(sims, -width, axis=1)[:, -width:]
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        positions[start:start + len(chunk), :width] = np.take_along_axis(part, order, axis=1)
+        scores[start:start + len(chunk), :width] = np.take_along_axis(part_scores, order, axis=1)
+    return positions, scores
+
+
+class SimilarIndex:
+    """相似电影索引：特征矩阵和每部电影的 top-k（以电影ID保存，删除电影后位置变化不影响）"""
+
+    def __init__(self, ids: np.ndarray, features: np.ndarray, topk_ids: np.ndarray, topk_scores: np.ndarray):
+        self.ids = ids
+        self.features = features
+        self.topk_ids = topk_ids
+        self.topk_scores = topk_scores
+        self._positions: Optional[Dict[int, int]] = None
+
+    @property
+    def k(self) -> int:
+        return self.topk_ids.shape[1]
+
+    @classmethod
+    def build(cls, ids: np.ndarray, features: np.ndarray, k: int) -> "SimilarIndex":
+        positions, scores = top_k(features, np.arange(len(ids)), k)
+        return cls(ids, features, _positions_to_ids(ids, positions), scores)
+
+    def position_map(self) -> Dict[int, int]:
+        if self._positions is None:
+            self._positions = {int(movie_id): position for position, movie_id in enumerate(self.ids)}
+        return self._positions
+
+    def update(self, changed_ids: np.ndarray, changed_features: np.ndarray, deleted_ids: Iterable[int]) -> Set[int]:
+        """
+        增量更新索引
+
+        Returns:
+            set: top-k 列表发生变化的电影ID
+        """
+        touched = set(int(i) for i in changed_ids) | set(int(i) for i in deleted_ids)
+        if not touched:
+            return set()
+
+        # 删除被删除或修改的旧行，修改后的电影追加到末尾
+        self._positions = None
+        keep = ~np.isin(self.ids, list(touched))
+        self.ids = np.concatenate([self.ids[keep], changed_ids])
+        self.features = np.vstack([self.features[keep], changed_features])
+        empty = np.full((len(changed_ids), self.k), -1, dtype=np.int64)
+        self.topk_ids = np.vstack([self.topk_ids[keep], empty])
+        self.topk_scores = np.vstack([self.topk_scores[keep], np.full(empty.shape, -np.inf, dtype=np.float32)])
+
+        n_old = int(keep.sum())
+        changed_positions = np.arange(n_old, len(self.ids))
+        # top-k 中包含变化电影的，该电影的相似度可能下降或已删除，需要完整重算
+        stale = np.flatnonzero(np.isin(self.topk_ids[:n_old], list(touched)).any(axis=1))
+        recompute = np.concatenate([stale, changed_positions])
+        if len(recompute):
+            positions, scores = top_k(self.features, recompute, self.k)
+            self.topk_ids[recompute] = _positions_to_ids(self.ids, positions)
+            self.topk_scores[recompute] = scores
+        updated = set(int(i) for i in self.ids[recompute])
+
+        # 其余电影只需与变化的电影比较，分数超过当前第k名的合并进列表
+        if len(changed_positions):
+            others = np.setdiff1d(np.arange(n_old), stale)
+            sims = self.features[others] @ self.features[changed_positions].T
+            kth = self.topk_scores[others, -1]
+            for row in np.flatnonzero(sims.max(axis=1) > kth):
+                position = others[row]
+                candidate_ids = np.concatenate([self.topk_ids[position], self.ids[changed_positions]])
+                candidate_scores = np.concatenate([self.topk_scores[position], sims[row]])
+                order = np.argsort(-candidate_scores, kind="stable")[:self.k]
+                self.topk_ids[position] = candidate_ids[order]
+                self.topk_scores[position] = candidate_scores[order]
+                updated.add(int(self.ids[position]))
+
+        return updated | set(int(i) for i in deleted_ids)
+
+    def similar(self, movie_id: int) -> List[Tuple[int, float]]:
+        position = self.position_map().get(movie_id)
+        if position is None:
+            return []
+        return [
+            (int(similar_id), float(score))
+            for similar_id, score in zip(self.topk_ids[position], self.topk_scores[position])
+            if similar_id >= 0
+        ]
+
+    def save(self, path: str):
+        """原子写入索引文件"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, ids=self.ids, features=self.features, topk_ids=self.topk_ids, topk_scores=self.topk_scores)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SimilarIndex"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if data["features"].shape[1:] != (FEATURE_DIM,):
+                return None
+            return cls(data["ids"], data["features"], data["topk_ids"], data["topk_scores"])
+
+
+def _positions_to_ids(ids: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    return np.where(positions >= 0, ids[np.maximum(positions, 0)], -1)
+
+
+def load_movies(db: Session, movie_ids: Optional[List[int]] = None):
+    stmt = select(
+        MovieRecord.id, MovieRecord.genre, MovieRecord.director,
+        MovieRecord.rating, MovieRecord.duration, MovieRecord.review
+    ).order_by(MovieRecord.id)
+    if movie_ids is not None:
+        stmt = stmt.where(MovieRecord.id.in_(movie_ids))
+    return db.execute(stmt).all()
+
+
+def write_lists(db: Session, index: SimilarIndex, movie_ids: Iterable[int], batch_size: int = 1000):
+    """把指定电影的 top-k 写入 movie_similar（替换原有行，不提交）"""
+    movie_ids = sorted(set(movie_ids))
+    positions = index.position_map()
+    for start in range(0, len(movie_ids), batch_size):
+        batch = movie_ids[start:start + batch_size]
+        db.query(MovieSimilar).filter(MovieSimilar.movie_id.in_(batch)).delete(synchronize_session=False)
+        rows = [
+            {"movie_id": movie_id, "similar_id": similar_id, "score": round(max(score, 0.0), 6), "sort_order": order}
+            for movie_id in batch if movie_id in positions
+            for order, (similar_id, score) in enumerate(index.similar(movie_id))
+        ]
+        if rows:
+            db.execute(insert(MovieSimilar), rows)
+
+
+_index: Optional[SimilarIndex] = None
+_index_mtime: Optional[float] = None
+_index_lock = threading.Lock()
+
+
+def rebuild(db: Session) -> SimilarIndex:
+    """全量重建索引并重写 movie_similar"""
+    global _index, _index_mtime
+    started = time.perf_counter()
+    ids, features = feature_matrix(load_movies(db))
+    index = SimilarIndex.build(ids, features, settings.similar_top_k)
+    db.query(MovieSimilar).delete(synchronize_session=False)
+    write_lists(db, index, index.ids.tolist())
+    db.commit()
+    index.save(settings.similar_index_path)
+    _index, _index_mtime = index, os.path.getmtime(settings.similar_index_path)
+    logger.info(f"🎬 相似电影索引重建完成: {len(ids)} 部电影, {time.perf_counter() - started:.2f}s")
+    return index
+
+
+def current_index(db: Session) -> SimilarIndex:
+    """读取索引（其他worker更新了索引文件时重新加载，文件不存在或k值变化时全量重建）"""
+    global _index, _index_mtime
+    path = settings.similar_index_path
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    if _index is None or mtime != _index_mtime:
+        _index = SimilarIndex.load(path)
+        _index_mtime = mtime
+    if _index is None or _index.k != settings.similar_top_k:
+        return rebuild(db)
+    return _index
+
+
+def update_movies(movie_ids: List[int]):
+    """增量更新指定电影（已删除的电影从索引中移除）"""
+    db = SessionLocal()
+    try:
+        with _index_lock:
+            index = current_index(db)
+            rows = load_movies(db, movie_ids)
+            changed_ids, changed_features = feature_matrix(rows)
+            deleted = set(movie_ids) - set(changed_ids.tolist())
+
+            updated = index.update(changed_ids, changed_features, deleted)
+            write_lists(db, index, updated)
+            db.commit()
+            index.save(settings.similar_index_path)
+            global _index_mtime
+            _index_mtime = os.path.getmtime(settings.similar_index_path)
+        logger.info(f"🎬 相似电影索引已更新: 变化 {len(movie_ids)} 部, 重写列表 {len(updated)} 个")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@job_handler(SIMILAR_JOB, queue="similar")
+def similar_job(payload: dict):
+    update_movies([payload["movie_id"]])
+
+
+def enqueue_similar_update(db: Session, movie_id: int):
+    """加入相似电影更新任务（随电影记录的事务提交）"""
+    enqueue(db, SIMILAR_JOB, {"movie_id": movie_id})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相似电影索引")
+    parser.add_argument("command", choices=["build"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        index = rebuild(db)
+    finally:
+        db.close()
+    print(f"✅ 索引完成: {len(index.ids)} 部电影 -> {settings.similar_index_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
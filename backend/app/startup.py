@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+worker启动耗时记录
+记录从fork到生命周期就绪、再到首个请求完成的各阶段毫秒数，以及各阶段的详细信息（如预热结果）
+"""
+
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# 未经gunicorn fork时（如uvicorn直接启动），以模块导入时间为起点
+_fork_time = time.time()
+_phases = {}
+_details = {}
+_first_request_done = False
+
+
+def mark_fork():
+    """在gunicorn post_fork钩子中调用，记录fork时间"""
+    global _fork_time, _first_request_done
+    _fork_time = time.time()
+    _phases.clear()
+    _details.clear()
+    _first_request_done = False
+
+
+def mark(phase: str):
+    """记录某个阶段相对fork的耗时"""
+    _phases[phase] = round((time.time() - _fork_time) * 1000, 2)
+
+
+def detail(name: str, value):
+    """记录某个阶段的详细信息"""
+    _details[name] = value
+
+
+def report() -> dict:
+    """返回启动耗时报告"""
+    return {"pid": os.getpid(), "phases_ms": dict(_phases), **_details}
+
+
+class FirstRequestTimer:
+    """ASGI中间件：记录worker处理完首个HTTP请求的时间"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if _first_request_done or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._finish()
+
+    @staticmethod
+    def _finish():
+        global _first_request_done
+        if _first_request_done:
+            return
+        _first_request_done = True
+        mark("first_request")
+        logger.info(f"⏱️ worker启动耗时(ms): {_phases}")
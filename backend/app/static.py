@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+前端静态资源服务
+配合 build_static.py 的构建产物使用：优先返回预压缩文件，
+带内容哈希的资源使用长期缓存
+"""
+
+import mimetypes
+import os
+import re
+import stat
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+# 带内容哈希的文件名, 例如 main.1a2b3c4d5e.js
+HASHED_ASSET_RE = re.compile(r"\.[0-9a-f]{10}\.[A-Za-z0-9]+$")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# 按优先级排列的预压缩格式
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+
+
+def accepted_encodings(scope: Scope) -> set:
+    """解析请求头中的 Accept-Encoding"""
+    value = Headers(scope=scope).get("accept-encoding", "")
+    return {item.split(";", 1)[0].strip().lower() for item in value.split(",") if item.strip()}
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """支持 .br/.gz 预压缩文件和不可变缓存的静态文件服务"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] in ("GET", "HEAD"):
+            encodings = accepted_encodings(scope)
+            for encoding, suffix in PRECOMPRESSED:
+                if encoding not in encodings:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(
+                    self.lookup_path, path + suffix
+                )
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.file_response(full_path, stat_result, scope)
+                    response.headers["content-encoding"] = encoding
+                    response.headers["content-type"] = self.media_type(path)
+                    self.set_cache_headers(path, response)
+                    return response
+
+        response = await super().get_response(path, scope)
+        self.set_cache_headers(path, response)
+        return response
+
+    @staticmethod
+    def media_type(path: str) -> str:
+        """按原始文件名推断Content-Type"""
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        return media_type
+
+    @staticmethod
+    def set_cache_headers(path: str, response: Response):
+        """设置缓存策略：指纹资源永久缓存，其余资源每次验证"""
+        response.headers["vary"] = "Accept-Encoding"
+        if HASHED_ASSET_RE.search(os.path.basename(path)):
+            response.headers["cache-control"] = IMMUTABLE_CACHE
+        else:
+            response.headers["cache-control"] = REVALIDATE_CACHE
+
+
+def index_response(static_dir: str) -> FileResponse:
+    """返回构建产物中的 index.html（不缓存）"""
+    return FileResponse(
+        os.path.join(static_dir, "index.html"),
+        media_type="text/html; charset=utf-8",
+        headers={"Cache-Control": REVALIDATE_CACHE}
+    )
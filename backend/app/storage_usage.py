@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+存储用量台账与配额
+上传前预占用量并检查配额，删除时扣减；统计接口直接读取台账，不再扫描 file_records
+
+- 新的台账行用 INSERT ... ON DUPLICATE KEY UPDATE（SQLite为 ON CONFLICT）写入，并发插入同一行时累加而不是报错
+- 重建会覆盖上传中已预占的用量，只在初始化、恢复备份或手动纠正偏差时执行，不随对账周期执行
+
+用法:
+    python -m app.storage_usage rebuild   # 按 file_records 重建台账（在没有上传进行时执行）
+"""
+
+import argparse
+import logging
+import sys
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal, engine, named_lock
+from app.models import FileRecord, StorageUsage
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceededError(Exception):
+    """超出存储配额"""
+
+
+def ledger_key(file_type: Optional[str], category: Optional[str]) -> Tuple[str, str]:
+    """台账键，未分类用空字符串表示"""
+    return file_type or "", category or ""
+
+
+def _upsert(db: Session, key: Tuple[str, str], size: int, count: int):
+    """插入台账行，行已存在（包括被并发插入）时累加"""
+    values = {"file_type": key[0], "category": key[1], "total_bytes": size, "file_count": count}
+    increments = {
+        "total_bytes": StorageUsage.total_bytes + size,
+        "file_count": StorageUsage.file_count + count,
+    }
+    if db.get_bind().dialect.name == "mysql":
+        stmt = mysql_insert(StorageUsage).values(**values).on_duplicate_key_update(**increments)
+    else:
+        stmt = sqlite_insert(StorageUsage).values(**values).on_conflict_do_update(
+            index_elements=["file_type", "category"], set_=increments
+        )
+    db.execute(stmt)
+
+
+def _lock_ledger(db: Session) -> Dict[Tuple[str, str], StorageUsage]:
+    """锁定整个台账（行数为 文件类型数 x 分类数，很小）"""
+    rows = db.query(StorageUsage).with_for_update().all()
+    return {(row.file_type, row.category): row for row in rows}
+
+
+def check_quota(rows: Dict[Tuple[str, str], StorageUsage], file_type: str, category: str, size: int):
+    """检查加入 size 字节后是否超出总配额、分类配额或类型配额"""
+    total = sum(row.total_bytes for row in rows.values()) + size
+    if settings.storage_quota_bytes and total > settings.storage_quota_bytes:
+        raise QuotaExceededError(f"存储空间不足(总配额 {settings.storage_quota_bytes / 1024 / 1024:.1f}MB)")
+
+    category_quota = settings.storage_category_quotas.get(category)
+    if category_quota is not None:
+        used = sum(row.total_bytes for key, row in rows.items() if key[1] == category) + size
+        if used > category_quota:
+            raise QuotaExceededError(f"分类「{category or '未分类'}」存储空间不足(配额 {category_quota / 1024 / 1024:.1f}MB)")
+
+    type_quota = settings.storage_type_quotas.get(file_type)
+    if type_quota is not None:
+        used = sum(row.total_bytes for key, row in rows.items() if key[0] == file_type) + size
+        if used > type_quota:
+            raise QuotaExceededError(f"{file_type}文件存储空间不足(配额 {type_quota / 1024 / 1024:.1f}MB)")
+
+
+def reserve(db: Session, file_type: Optional[str], category: Optional[str], size: int, count: int = 1):
+    """
+    写入文件前预占用量（检查配额后立即提交，不在写文件期间持有锁）
+
+    Raises:
+        QuotaExceededError: 超出配额
+    """
+    key = ledger_key(file_type, category)
+    try:
+        # 先单独提交该键的空行：台账中没有这一行时，并发的首次上传锁不到任何行，会同时插入同一行
+        if db.query(StorageUsage.id).filter(
+            StorageUsage.file_type == key[0],
+            StorageUsage.category == key[1]
+        ).first() is None:
+            _upsert(db, key, 0, 0)
+            db.commit()
+
+        rows = _lock_ledger(db)
+        check_quota(rows, key[0], key[1], size)
+
+        row = rows[key]
+        row.total_bytes += size
+        row.file_count += count
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def adjust(db: Session, file_type: Optional[str], category: Optional[str], size: int, count: int):
+    """
+    调整台账（不提交，随调用方事务一起提交）
+    用于删除文件、上传失败时释放预占用量
+    """
+    file_type, category = ledger_key(file_type, category)
+    updated = db.query(StorageUsage).filter(
+        StorageUsage.file_type == file_type,
+        StorageUsage.category == category
+    ).update({
+        StorageUsage.total_bytes: StorageUsage.total_bytes + size,
+        StorageUsage.file_count: StorageUsage.file_count + count,
+    }, synchronize_session=False)
+    if not updated and size > 0:
+        _upsert(db, (file_type, category), size, count)
+
+
+def release(db: Session, file_type: Optional[str], category: Optional[str], size: int, count: int = 1):
+    """释放预占的用量并提交"""
+    try:
+        adjust(db, file_type, category, -size, -count)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"释放存储用量失败: {e}")
+
+
+def get_usage(db: Session) -> dict:
+    """读取台账汇总"""
+    rows = db.query(StorageUsage).all()
+
+    by_type = {}
+    by_category = {}
+    for row in rows:
+        item = by_type.setdefault(row.file_type, {"name": row.file_type or "未知类型", "count": 0, "size": 0})
+        item["count"] += row.file_count
+        item["size"] += row.total_bytes
+        item = by_category.setdefault(row.category, {"name": row.category or "未分类", "count": 0, "size": 0})
+        item["count"] += row.file_count
+        item["size"] += row.total_bytes
+
+    total_size = sum(row.total_bytes for row in rows)
+    return {
+        "total_size": total_size,
+        "total_size_mb": round(total_size / 1024 / 1024, 2),
+        "file_count": sum(row.file_count for row in rows),
+        "by_type": sorted(by_type.values(), key=lambda item: -item["size"]),
+        "by_category": sorted(by_category.values(), key=lambda item: -item["size"]),
+        "quotas": {
+            "total": settings.storage_quota_bytes or None,
+            "categories": settings.storage_category_quotas,
+            "types": settings.storage_type_quotas,
+        },
+    }
+
+
+def rebuild_ledger(db: Session = None, only_if_empty: bool = False) -> bool:
+    """
+    按 file_records 重建台账（用于初始化、恢复备份和纠正偏差）
+
+    先锁定台账再统计，统计期间提交的上传和删除会等待重建完成；
+    但已预占、尚未写入记录的上传用量会被覆盖，应在没有上传进行时执行
+
+    Args:
+        only_if_empty: 锁定后台账已有行（已有上传预占）时不重建
+
+    Returns:
+        bool: 是否重建
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        rows = _lock_ledger(db)
+        if only_if_empty and rows:
+            db.rollback()
+            return False
+        stats = db.query(
+            FileRecord.file_type,
+            FileRecord.category,
+            func.count(FileRecord.id),
+            func.coalesce(func.sum(FileRecord.file_size), 0)
+        ).filter(
+            FileRecord.deleted_at.is_(None)
+        ).group_by(FileRecord.file_type, FileRecord.category).all()
+
+        totals = {}
+        for file_type, category, count, size in stats:
+            key = ledger_key(file_type, category)
+            old_count, old_size = totals.get(key, (0, 0))
+            totals[key] = (old_count + count, old_size + int(size))
+
+        for key, row in rows.items():
+            if key not in totals:
+                db.delete(row)
+        for key, (count, size) in totals.items():
+            row = rows.get(key)
+            if row is None:
+                _upsert(db, key, size, count)
+            else:
+                row.total_bytes = size
+                row.file_count = count
+        db.commit()
+        logger.info(f"📊 存储台账已重建: {len(totals)} 项")
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+
+def seed_ledger() -> bool:
+    """
+    台账为空而存在未删除的文件记录时（台账表刚创建）按记录重建，启动时调用，与表结构检查无关
+
+    在建表使用的 xywh_schema 命名锁内执行；重建前锁定台账后再确认仍为空，
+    其他worker已开始预占上传用量时不会覆盖
+
+    Returns:
+        bool: 是否重建
+    """
+    db = SessionLocal()
+    try:
+        if db.query(StorageUsage.id).first() is not None:
+            return False
+        if db.query(FileRecord.id).filter(FileRecord.deleted_at.is_(None)).first() is None:
+            return False
+        db.rollback()
+        with engine.connect() as connection:
+            with named_lock(connection, "xywh_schema"):
+                return rebuild_ledger(db, only_if_empty=True)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存储用量台账")
+    parser.add_argument("command", choices=["rebuild", "show"])
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild_ledger()
+    db = SessionLocal()
+    try:
+        usage = get_usage(db)
+    finally:
+        db.close()
+    print(f"总占用: {usage['total_size_mb']}MB, 文件数: {usage['file_count']}")
+    for item in usage["by_type"]:
+        print(f"  {item['name']}: {item['count']} 个, {item['size'] / 1024 / 1024:.2f}MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
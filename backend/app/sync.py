@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+增量同步
+美食、电影、日历备注和文件记录的新增/修改/删除在同一事务中写入 change_log（删除即墓碑），
+客户端携带上次的同步令牌（变更序号）只下载此后变化的记录
+
+- 令牌只越过写入已超过 SYNC_SETTLE_SECONDS 的变更：自增序号的分配顺序与事务提交顺序不一定一致，
+  较早分配序号的事务可能更晚提交，等待窗口内的变更会在下次同步时重复返回（客户端按ID覆盖即可）
+- 返回的是记录的当前状态：同一记录的多次变更只返回一次，已不存在或已软删除的记录返回在 deleted 中
+- 压缩：同一记录只保留最新一条变更；超过保留天数的变更被删除并抬高水位，
+  令牌早于水位的客户端收到 reset，需要重新全量拉取
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import event, func, insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.changes import track_record_ids
+from app.config import settings
+from app.database import SessionLocal, engine, named_lock
+from app.models import ChangeLog, SyncState
+from app.timeline import SOURCES
+
+logger = logging.getLogger(__name__)
+
+RESET = "reset"
+# 表名 -> 同步接口中的类型名（与时间线相同的数据源）
+TRACKED_TABLES = {source.model.__tablename__: name for name, source in SOURCES.items()}
+# 压缩时每批处理的记录数
+COMPACT_BATCH_SIZE = 500
+
+track_record_ids(TRACKED_TABLES)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_change_log(session: Session):
+    """提交前把本事务中被跟踪表的变更写入 change_log（与业务数据同一事务）"""
+    session.flush()
+    pending = session.info.get("pending_changes")
+    if not pending:
+        return
+    now = datetime.now()
+    rows = [
+        {"table_name": change.table, "record_id": change.record_id, "op": change.op, "created_at": now}
+        for change in dict.fromkeys(pending)
+        if change.table in TRACKED_TABLES
+    ]
+    if rows:
+        # 经连接执行Core语句，不再被 app.changes 捕获为 change_log 表的变更（否则每次提交都多一次无用的缓存失效）
+        session.connection().execute(insert(ChangeLog.__table__), rows)
+
+
+def horizon(db: Session) -> int:
+    return db.query(SyncState.horizon_seq).filter(SyncState.id == 1).scalar() or 0
+
+
+def raise_horizon(db: Session, seq: int):
+    """抬高压缩水位（不提交）"""
+    state = db.query(SyncState).filter(SyncState.id == 1).with_for_update().first()
+    if state is None:
+        db.add(SyncState(id=1, horizon_seq=seq))
+    elif state.horizon_seq < seq:
+        state.horizon_seq = seq
+
+
+def settled_seq(db: Session) -> int:
+    """所有不大于该序号的变更都已超过等待窗口"""
+    cutoff = datetime.now() - timedelta(seconds=settings.sync_settle_seconds)
+    unsettled = db.query(func.min(ChangeLog.seq)).filter(ChangeLog.created_at > cutoff).scalar()
+    if unsettled is not None:
+        return unsettled - 1
+    return db.query(func.max(ChangeLog.seq)).scalar() or 0
+
+
+def changes_since(db: Session, since: Optional[int], limit: int) -> dict:
+    """
+    读取令牌之后的变更
+
+    Returns:
+        dict: token（下次同步使用）、reset（需要全量同步）、has_more、changes（类型 -> upserted/deleted）
+    """
+    floor = horizon(db)
+    latest = max(db.query(func.max(ChangeLog.seq)).scalar() or 0, floor)
+    if since is None or since < floor or since > latest:
+        # 客户端应在全量拉取之前保存该令牌，拉取期间的变更会在下次同步时返回
+        return {"token": str(max(settled_seq(db), floor)), "reset": True, "has_more": False, "changes": {}}
+
+    entries = db.query(ChangeLog).filter(
+        ChangeLog.seq > since
+    ).order_by(ChangeLog.seq).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # 令牌推进到第一个仍在等待窗口内的变更之前
+    cutoff = datetime.now() - timedelta(seconds=settings.sync_settle_seconds)
+    token = since
+    for entry in entries:
+        if entry.created_at > cutoff:
+            break
+        token = entry.seq
+
+    reset = False
+    touched: Dict[str, set] = {}
+    for entry in entries:
+        if entry.op == RESET or entry.record_id is None:
+            # 批量写入无法确定具体记录
+            reset = True
+        elif entry.table_name in TRACKED_TABLES:
+            touched.setdefault(TRACKED_TABLES[entry.table_name], set()).add(entry.record_id)
+    if reset:
+        return {"token": str(max(settled_seq(db), floor)), "reset": True, "has_more": False, "changes": {}}
+
+    changes = {}
+    for name, ids in touched.items():
+        source = SOURCES[name]
+        records = db.query(source.model).filter(source.model.id.in_(ids), *source.where).all()
+        found = {record.id for record in records}
+        changes[name] = {
+            "upserted": [source.schema.from_orm(record) for record in records],
+            "deleted": sorted(ids - found),
+        }
+
+    return {"token": str(token), "reset": False, "has_more": has_more, "changes": changes}
+
+
+def mark_reset():
+    """数据被整体替换（如备份恢复）后要求所有客户端全量同步"""
+    db = SessionLocal()
+    try:
+        db.connection().execute(insert(ChangeLog.__table__), [{"table_name": "*", "record_id": None, "op": RESET, "created_at": datetime.now()}])
+        raise_horizon(db, db.query(func.max(ChangeLog.seq)).scalar())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def compact(retention_days: Optional[int] = None) -> dict:
+    """
+    压缩变更日志：删除被同一记录更新的变更覆盖的旧行，删除超过保留期的变更并抬高水位
+
+    Returns:
+        dict: superseded（删除的被覆盖行数）、expired（删除的过期行数）、horizon
+    """
+    retention_days = settings.sync_retention_days if retention_days is None else retention_days
+    report = {"superseded": 0, "expired": 0, "horizon": 0}
+    db = SessionLocal()
+    try:
+        while True:
+            groups = db.query(
+                ChangeLog.table_name, ChangeLog.record_id, func.max(ChangeLog.seq)
+            ).filter(
+                ChangeLog.record_id.isnot(None)
+            ).group_by(
+                ChangeLog.table_name, ChangeLog.record_id
+            ).having(func.count() > 1).limit(COMPACT_BATCH_SIZE).all()
+            if not groups:
+                break
+            for table_name, record_id, latest in groups:
+                report["superseded"] += db.query(ChangeLog).filter(
+                    ChangeLog.table_name == table_name,
+                    ChangeLog.record_id == record_id,
+                    ChangeLog.seq < latest,
+                ).delete(synchronize_session=False)
+            db.commit()
+
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        expired = db.query(func.max(ChangeLog.seq)).filter(ChangeLog.created_at < cutoff).scalar()
+        if expired is not None:
+            raise_horizon(db, expired)
+            report["expired"] = db.query(ChangeLog).filter(
+                ChangeLog.seq <= expired
+            ).delete(synchronize_session=False)
+            db.commit()
+        report["horizon"] = horizon(db)
+        return report
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def compact_locked() -> Optional[dict]:
+    """在命名锁保护下压缩，其他worker正在执行时直接跳过"""
+    with engine.connect() as connection:
+        with named_lock(connection, "xywh_sync_compact", timeout=0) as acquired:
+            if not acquired:
+                return None
+            report = compact()
+    logger.info(f"🗜️ 变更日志压缩完成: {report}")
+    return report
+
+
+async def periodic_compact():
+    """周期性压缩变更日志（在应用生命周期中启动）"""
+    interval = settings.sync_compact_interval_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(compact_locked)
+        except Exception as e:
+            logger.error(f"变更日志压缩失败: {e}")
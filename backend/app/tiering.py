@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+冷热分层存储
+长期无人下载的可压缩文件（文档、文本、文本类归档）压缩为zstd后移到冷存储目录（可挂载在其他磁盘），
+file_path 改为指向冷存储中的 .zst 文件；下载和打包时边解压边发送。
+冷文件重新被下载 TIERING_PROMOTE_DOWNLOADS 次后解压回上传目录
+
+- 应用周期性挑选候选文件并加入 files.demote / files.promote 任务，由worker执行压缩和移动
+- 移动顺序：写临时文件 -> 改名 -> 条件更新记录（仍指向原路径才更新）-> 删除原文件；
+  任一步中断只会留下多余的副本，由 file_gc 对账时清理
+- 读取时原路径不存在（迁移刚完成、缓存中的旧记录）会尝试另一层的路径
+- 存储台账和配额按原始大小计算，不受压缩影响
+
+用法:
+    python -m app.tiering run       # 立即执行一次降冷和升热（不经过任务队列）
+    python -m app.tiering status    # 查看各层文件数和大小
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import zstandard
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, or_, select
+
+from app.config import settings
+from app.database import SessionLocal, engine, named_lock
+from app.jobs import enqueue_many, job_handler
+from app.models import FileRecord
+
+logger = logging.getLogger(__name__)
+
+HOT = "hot"
+COLD = "cold"
+COLD_SUFFIX = ".zst"
+
+# 压缩收益明显的扩展名（图片、音视频和 docx/xlsx/pdf 等本身已压缩，不参与分层）
+COMPRESSIBLE_EXTENSIONS = (
+    ".txt", ".csv", ".tsv", ".json", ".xml", ".html", ".htm", ".md", ".log", ".sql", ".rtf",
+    ".doc", ".xls", ".ppt", ".svg", ".bmp", ".wav", ".tar",
+)
+# 压缩后大于原大小该比例时不值得移动
+MAX_COMPRESSED_RATIO = 0.9
+CHUNK_SIZE = 256 * 1024
+
+DEMOTE_JOB = "files.demote"
+PROMOTE_JOB = "files.promote"
+
+
+def hot_path(filename: str) -> str:
+    return os.path.join(settings.upload_dir, filename)
+
+
+def cold_path(filename: str) -> str:
+    return os.path.join(settings.cold_storage_dir, filename + COLD_SUFFIX)
+
+
+def stored_locations(record) -> List[Tuple[str, str]]:
+    """记录的文件可能所在的位置 [(路径, 层)]，记录指向的位置在前"""
+    tier = record.storage_tier or HOT
+    if tier == COLD:
+        return [(record.file_path, COLD), (hot_path(record.filename), HOT)]
+    return [(record.file_path, HOT), (cold_path(record.filename), COLD)]
+
+
+def locate_stored_file(record) -> Optional[Tuple[str, str]]:
+    """返回文件当前所在的(路径, 层)，都不存在时返回None"""
+    for path, tier in stored_locations(record):
+        if os.path.exists(path):
+            return path, tier
+    return None
+
+
+def open_stored_file(record) -> BinaryIO:
+    """
+    打开记录对应的文件，冷存储的文件返回解压流（读出的是原始内容）
+
+    Args:
+        record: 带有 file_path、filename、storage_tier 属性的对象
+
+    Raises:
+        FileNotFoundError: 两层都不存在
+    """
+    for path, tier in stored_locations(record):
+        try:
+            raw = open(path, "rb")
+        except FileNotFoundError:
+            continue
+        if tier == COLD:
+            return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return raw
+    raise FileNotFoundError(record.file_path)
+
+
+def iter_stored_file(record) -> Iterator[bytes]:
+    """逐块读取记录对应文件的原始内容（同步生成器，供 StreamingResponse 使用）"""
+    with open_stored_file(record) as source:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def is_compressible(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def _move(file_id: int, to_tier: str) -> bool:
+    """
+    在两层之间移动一个文件（先写新副本并更新记录，再删除旧副本）
+
+    Returns:
+        bool: 是否移动
+    """
+    from_tier = HOT if to_tier == COLD else COLD
+    db = SessionLocal()
+    try:
+        record = db.query(FileRecord).filter(
+            FileRecord.id == file_id,
+            FileRecord.deleted_at.is_(None),
+            FileRecord.storage_tier == from_tier
+        ).first()
+        if not record:
+            return False
+
+        source = record.file_path
+        dest = cold_path(record.filename) if to_tier == COLD else hot_path(record.filename)
+        tmp = dest + ".part"
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        try:
+            with open(source, "rb") as fin, open(tmp, "wb") as fout:
+                if to_tier == COLD:
+                    compressor = zstandard.ZstdCompressor(level=settings.tiering_zstd_level)
+                    compressor.copy_stream(fin, fout, size=os.fstat(fin.fileno()).st_size)
+                else:
+                    zstandard.ZstdDecompressor().copy_stream(fin, fout)
+            stored_size = os.path.getsize(tmp)
+
+            changes = {
+                FileRecord.tiered_at: datetime.now(),
+                FileRecord.tier_download_count: FileRecord.download_count,
+                # 移动存储位置不算修改记录，保持更新时间不变（导出和同步按更新时间增量读取）
+                FileRecord.updated_at: FileRecord.updated_at,
+            }
+            if to_tier == COLD and stored_size > record.file_size * MAX_COMPRESSED_RATIO:
+                # 压缩收益不足：留在热存储，下个冷却周期前不再尝试
+                os.remove(tmp)
+                moved = False
+                updated = 0
+                db.query(FileRecord).filter(FileRecord.id == file_id).update(changes, synchronize_session=False)
+            else:
+                os.replace(tmp, dest)
+                moved = True
+                changes.update({
+                    FileRecord.file_path: dest,
+                    FileRecord.storage_tier: to_tier,
+                    FileRecord.stored_size: stored_size if to_tier == COLD else None,
+                })
+                # 记录在此期间被删除或已被移动时不更新
+                updated = db.query(FileRecord).filter(
+                    FileRecord.id == file_id,
+                    FileRecord.file_path == source,
+                    FileRecord.deleted_at.is_(None)
+                ).update(changes, synchronize_session=False)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        if not moved:
+            logger.info(f"🧊 文件 {file_id} 压缩收益不足({stored_size}/{record.file_size})，保留在热存储")
+            return False
+        if not updated:
+            os.remove(dest)
+            return False
+        os.remove(source)
+        logger.info(f"{'🧊 降冷' if to_tier == COLD else '🔥 升热'} 文件 {file_id}: {record.file_size} -> {stored_size} 字节")
+        return True
+    finally:
+        db.close()
+
+
+def demote(file_id: int) -> bool:
+    """把热存储中的文件压缩移到冷存储"""
+    return _move(file_id, COLD)
+
+
+def promote(file_id: int) -> bool:
+    """把冷存储中的文件解压移回上传目录"""
+    return _move(file_id, HOT)
+
+
+@job_handler(DEMOTE_JOB, queue="files")
+def demote_job(payload: dict):
+    demote(payload["file_id"])
+
+
+@job_handler(PROMOTE_JOB, queue="files")
+def promote_job(payload: dict):
+    promote(payload["file_id"])
+
+
+def downloads_since_tiering():
+    return FileRecord.download_count - func.coalesce(FileRecord.tier_download_count, 0)
+
+
+def demote_candidates(db, limit: int) -> List[int]:
+    """创建和上次分层都早于冷却期、期间下载次数不超过阈值的可压缩文件"""
+    cutoff = datetime.now() - timedelta(days=settings.tiering_cold_after_days)
+    stmt = (
+        select(FileRecord.id)
+        .where(
+            FileRecord.storage_tier == HOT,
+            FileRecord.deleted_at.is_(None),
+            FileRecord.created_at < cutoff,
+            or_(FileRecord.tiered_at.is_(None), FileRecord.tiered_at < cutoff),
+            FileRecord.file_size >= settings.tiering_min_size_bytes,
+            downloads_since_tiering() <= settings.tiering_cold_max_downloads,
+            or_(*[func.lower(FileRecord.filename).like(f"%{ext}") for ext in COMPRESSIBLE_EXTENSIONS]),
+        )
+        .order_by(FileRecord.id)
+        .limit(limit)
+    )
+    return list(db.scalars(stmt))
+
+
+def promote_candidates(db, limit: int) -> List[int]:
+    """降冷后又被下载达到阈值的文件"""
+    stmt = (
+        select(FileRecord.id)
+        .where(
+            FileRecord.storage_tier == COLD,
+            FileRecord.deleted_at.is_(None),
+            downloads_since_tiering() >= settings.tiering_promote_downloads,
+        )
+        .order_by(FileRecord.id)
+        .limit(limit)
+    )
+    return list(db.scalars(stmt))
+
+
+def schedule(limit: int = None) -> Optional[dict]:
+    """在命名锁保护下挑选候选文件并加入任务，其他进程正在执行时直接跳过"""
+    limit = limit or settings.tiering_batch_size
+    with engine.connect() as connection:
+        with named_lock(connection, "xywh_tiering", timeout=0) as acquired:
+            if not acquired:
+                return None
+            db = SessionLocal()
+            try:
+                promoted = promote_candidates(db, limit)
+                demoted = demote_candidates(db, limit)
+                enqueue_many(db, PROMOTE_JOB, [{"file_id": file_id} for file_id in promoted])
+                enqueue_many(db, DEMOTE_JOB, [{"file_id": file_id} for file_id in demoted])
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+    result = {"promote": len(promoted), "demote": len(demoted)}
+    if promoted or demoted:
+        logger.info(f"🗄️ 分层任务已加入: {result}")
+    return result
+
+
+async def periodic_tiering():
+    """周期性挑选分层候选（在应用生命周期中启动）"""
+    interval = settings.tiering_interval_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(schedule)
+        except Exception as e:
+            logger.error(f"分层调度失败: {e}")
+
+
+def tier_status() -> dict:
+    """各层的文件数、原始大小和占用大小"""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(
+                FileRecord.storage_tier,
+                func.count(FileRecord.id),
+                func.coalesce(func.sum(FileRecord.file_size), 0),
+                func.coalesce(func.sum(func.coalesce(FileRecord.stored_size, FileRecord.file_size)), 0),
+            )
+            .where(FileRecord.deleted_at.is_(None))
+            .group_by(FileRecord.storage_tier)
+        ).all()
+    finally:
+        db.close()
+    return {
+        tier or HOT: {"count": count, "size": int(size), "stored_size": int(stored)}
+        for tier, count, size, stored in rows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷热分层存储")
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--limit", type=int, help="每种操作最多处理的文件数")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        limit = args.limit or settings.tiering_batch_size
+        db = SessionLocal()
+        try:
+            promoted = promote_candidates(db, limit)
+            demoted = demote_candidates(db, limit)
+        finally:
+            db.close()
+        print(f"升热: {sum(promote(file_id) for file_id in promoted)}/{len(promoted)}")
+        print(f"降冷: {sum(demote(file_id) for file_id in demoted)}/{len(demoted)}")
+    else:
+        for tier, info in tier_status().items():
+            print(f"{tier}: {info['count']} 个, 原始 {info['size'] / 1024 / 1024:.1f}MB, 占用 {info['stored_size'] / 1024 / 1024:.1f}MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+跨表时间线
+把美食、电影、日历备注和文件记录按创建时间倒序合并为一个列表（最近动态）
+
+- 每张表按 (created_at, id) 倒序的索引游标分批读取，heapq 多路归并，
+  取满一页即停止，不会读取页面用不到的行
+- 每张表第一批只读 页大小/表数 + 1 行，之后按需加倍，数据集中在某一张表时也只多读少量行
+- 翻页游标记录每张表最后返回的 (created_at, id)，各表从自己的位置继续读取，
+  翻页期间有新记录插入也不会重复或遗漏
+"""
+
+import base64
+import heapq
+import itertools
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.models import CalendarNote, FileRecord, FoodRecord, MovieRecord
+from app import schemas
+
+
+@dataclass(frozen=True)
+class TimelineSource:
+    """时间线数据源"""
+    model: type
+    schema: type
+    title: Callable[[object], str]
+    where: Tuple = ()
+
+
+SOURCES: Dict[str, TimelineSource] = {
+    "food": TimelineSource(FoodRecord, schemas.FoodRecord, lambda record: record.name),
+    "movie": TimelineSource(MovieRecord, schemas.MovieRecord, lambda record: record.title),
+    "calendar": TimelineSource(CalendarNote, schemas.CalendarNote, lambda record: record.date),
+    "file": TimelineSource(
+        FileRecord, schemas.FileRecord, lambda record: record.original_filename,
+        (FileRecord.deleted_at.is_(None),)
+    ),
+}
+
+# 单批最多读取的行数
+MAX_BATCH_SIZE = 200
+
+
+class CursorError(ValueError):
+    """翻页游标无效"""
+
+
+def encode_cursor(positions: Dict[str, Tuple[datetime, int]]) -> str:
+    payload = {name: [created_at.isoformat(), record_id] for name, (created_at, record_id) in positions.items()}
+    raw = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Dict[str, Tuple[datetime, int]]:
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, dict):
+            raise ValueError("游标内容不是对象")
+        return {
+            name: (datetime.fromisoformat(created_at), int(record_id))
+            for name, (created_at, record_id) in payload.items()
+            if name in SOURCES
+        }
+    except (ValueError, TypeError) as e:
+        raise CursorError(f"无效的翻页游标: {e}")
+
+
+def iter_source(
+    db: Session,
+    name: str,
+    after: Optional[Tuple[datetime, int]],
+    first_batch: int,
+    stats: Dict[str, int],
+) -> Iterator[Tuple[Tuple[datetime, int, str], object]]:
+    """按 (created_at, id) 倒序分批读取一张表，产出 (排序键, 记录)"""
+    source = SOURCES[name]
+    model = source.model
+    batch_size = first_batch
+    while True:
+        query = db.query(model).filter(model.created_at.isnot(None), *source.where)
+        if after is not None:
+            created_at, record_id = after
+            query = query.filter(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < record_id),
+            ))
+        rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(batch_size).all()
+        stats[name] = stats.get(name, 0) + len(rows)
+        for row in rows:
+            yield (row.created_at, row.id, name), row
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1].created_at, rows[-1].id)
+        batch_size = min(batch_size * 2, MAX_BATCH_SIZE)
+
+
+def timeline_page(db: Session, types: Sequence[str], limit: int, cursor: Optional[str] = None) -> dict:
+    """
+    读取一页时间线
+
+    Returns:
+        dict: items（按创建时间倒序）、next_cursor（没有更多时为None）、rows_read（各表读取的行数）
+    """
+    positions = decode_cursor(cursor)
+    first_batch = limit // len(types) + 1
+    stats: Dict[str, int] = {}
+    streams = [iter_source(db, name, positions.get(name), first_batch, stats) for name in types]
+    merged = heapq.merge(*streams, key=lambda item: item[0], reverse=True)
+
+    # 多取一条用于判断是否还有下一页
+    entries = list(itertools.islice(merged, limit + 1))
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    items: List[dict] = []
+    for (created_at, record_id, name), record in entries:
+        source = SOURCES[name]
+        positions[name] = (created_at, record_id)
+        items.append({
+            "type": name,
+            "id": record_id,
+            "title": source.title(record),
+            "created_at": created_at,
+            "record": source.schema.from_orm(record),
+        })
+
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(positions) if has_more else None,
+        "rows_read": stats,
+    }
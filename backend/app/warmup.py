@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+worker预热
+在生命周期就绪之前（worker开始接受请求之前）执行，避免fork或 max_requests 重启后的首批请求承担首次开销：
+- 主库和各只读副本的连接池预先打开 WARMUP_POOL_CONNECTIONS 个连接
+- 每个无路径参数、无必填参数的GET接口在进程内请求一次（加上 WARMUP_PATHS 中的路径），
+  完成路由匹配、参数校验、SQL编译和响应模型序列化的首次开销
+- 预热请求直接交给路由，不经过中间件：不计入限流、不读写响应缓存，也不算作首个请求
+
+各步骤耗时写入启动报告（/api/health/startup 的 warmup 字段）；
+预热失败或超时只记录日志，不影响worker启动
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import List
+
+from fastapi.routing import APIRoute
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app import startup
+from app.cache import UNCACHED_PATTERNS, client as cache_client
+from app.config import settings
+from app.database import engine, replicas
+from app.rate_limit import STREAMING_PATHS
+
+logger = logging.getLogger(__name__)
+
+
+def warm_pool(pool_engine, count: int) -> int:
+    """同时持有 count 个连接再归还，使连接池中保留这些已建立的连接"""
+    size = getattr(pool_engine.pool, "size", None)
+    if callable(size):
+        count = min(count, size())
+    connections = []
+    try:
+        for _ in range(count):
+            connection = pool_engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def warm_pools() -> dict:
+    """预热主库和只读副本的连接池"""
+    opened = {"primary": warm_pool(engine, settings.warmup_pool_connections)}
+    for index, replica in enumerate(replicas.engines):
+        try:
+            opened[f"replica{index}"] = warm_pool(replica, settings.warmup_pool_connections)
+        except Exception as e:
+            # 副本不可用时由读写分离自动回退主库，这里只记录
+            logger.warning(f"⚠️ 预热只读副本{index}连接失败: {e}")
+    return opened
+
+
+def warmup_paths(app) -> List[str]:
+    """需要预热的接口路径：无路径参数和必填参数的GET接口，排除流式接口"""
+    paths = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or "GET" not in route.methods:
+            continue
+        if "{" in route.path or not route.path.startswith("/api/"):
+            continue
+        if route.path in STREAMING_PATHS or any(pattern in route.path for pattern in UNCACHED_PATTERNS):
+            continue
+        if any(param.required for param in route.dependant.query_params):
+            continue
+        paths.append(route.path)
+    return paths + [path for path in settings.warmup_paths if path not in paths]
+
+
+async def request(app, path: str) -> int:
+    """在进程内直接交给路由执行一次GET请求，返回状态码"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"warmup")],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+        "app": app,
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    # 依赖项（如 get_db）的清理栈平时由FastAPI最外层中间件提供
+    async with AsyncExitStack() as stack:
+        scope["fastapi_astack"] = stack
+        await app.router(scope, receive, send)
+    return status
+
+
+async def warm_routes(app) -> dict:
+    """逐个请求预热接口，返回 {路径: {status, ms}}"""
+    results = {}
+    for path in warmup_paths(app):
+        started = time.perf_counter()
+        try:
+            status = await request(app, path)
+        except Exception as e:
+            status = getattr(e, "status_code", 500)
+            logger.warning(f"⚠️ 预热接口 {path} 失败: {e!r}")
+        results[path] = {"status": status, "ms": round((time.perf_counter() - started) * 1000, 2)}
+    return results
+
+
+async def _run(app, report: dict):
+    started = time.perf_counter()
+    report["pools"] = await run_in_threadpool(warm_pools)
+    report["pools_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    if settings.cache_enabled:
+        started = time.perf_counter()
+        # 建立到共享缓存守护进程的连接
+        await run_in_threadpool(cache_client.stats)
+        report["cache_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    started = time.perf_counter()
+    report["routes"] = await warm_routes(app)
+    report["routes_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+
+async def run(app) -> dict:
+    """执行预热并写入启动报告"""
+    report = {}
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(_run(app, report), timeout=settings.warmup_timeout_seconds)
+    except asyncio.TimeoutError:
+        report["timed_out"] = True
+        logger.warning(f"⚠️ worker预热超过 {settings.warmup_timeout_seconds}s，未完成的部分跳过")
+    except Exception as e:
+        report["error"] = str(e)
+        logger.warning(f"⚠️ worker预热失败: {e}")
+    report["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    startup.detail("warmup", report)
+    startup.mark("warmup")
+    logger.info(
+        f"🔥 worker预热完成 {report['total_ms']}ms: 连接 {report.get('pools', {})}, "
+        f"接口 {len(report.get('routes', {}))} 个"
+    )
+    return report
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务worker（与gunicorn并行运行的独立进程）
+
+每个队列按并发上限启动执行线程，另有一个维护线程负责：
+续期执行中任务的可见性超时、重新入队超时任务、清理过期的已完成任务
+
+用法:
+    python -m app.worker                        # 处理所有已配置的队列
+    python -m app.worker --queues media,files   # 只处理指定队列
+    python -m app.worker --once                 # 处理完当前到期任务后退出
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List
+
+from app import cache  # noqa: F401  任务写入数据后同样失效共享缓存
+from app import entity_cache  # noqa: F401  以及被修改记录的实体缓存
+from app import jobs
+from app import sync  # noqa: F401  任务写入的数据同样记录到变更日志
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 注册任务处理函数的模块
+HANDLER_MODULES = ("app.media", "app.file_gc", "app.similar", "app.tiering")
+
+CLEANUP_INTERVAL_SECONDS = 3600
+
+
+def load_handlers():
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+class Worker:
+    """任务worker进程"""
+
+    def __init__(self, queues: List[str], once: bool = False):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.queues = queues
+        self.once = once
+        self.stop_event = threading.Event()
+        self.in_flight: Dict[int, jobs.ClaimedJob] = {}
+        self.lock = threading.Lock()
+        self.stats = {"done": 0, "retried": 0, "dead": 0}
+
+    def stop(self, *_):
+        logger.info("🛑 收到退出信号，等待执行中的任务完成...")
+        self.stop_event.set()
+
+    def execute(self, job: jobs.ClaimedJob):
+        """执行单个任务并记录结果"""
+        handler = jobs.HANDLERS.get(job.name)
+        with self.lock:
+            self.in_flight[job.id] = job
+        started = time.monotonic()
+        try:
+            if handler is None:
+                raise LookupError(f"未注册的任务: {job.name}")
+            handler.func(job.payload)
+        except Exception as e:
+            status = jobs.fail(job, self.worker_id, f"{e}\n{traceback.format_exc()}")
+            with self.lock:
+                self.stats["dead" if status == jobs.DEAD else "retried"] += 1
+            logger.warning(f"❌ 任务失败 {job.name}(id={job.id}, 第{job.attempt}次): {e} -> {status}")
+        else:
+            if jobs.complete(job, self.worker_id):
+                with self.lock:
+                    self.stats["done"] += 1
+                logger.info(f"✅ 任务完成 {job.name}(id={job.id}) {time.monotonic() - started:.2f}s")
+            else:
+                logger.warning(f"任务 {job.name}(id={job.id}) 已超时被重新领取，结果未写入")
+        finally:
+            with self.lock:
+                self.in_flight.pop(job.id, None)
+
+    def run_queue(self, queue: str):
+        """执行线程：领取并执行任务，队列为空时等待轮询间隔"""
+        while not self.stop_event.is_set():
+            try:
+                claimed = jobs.claim(queue, self.worker_id, limit=1)
+            except Exception as e:
+                logger.error(f"领取任务失败({queue}): {e}")
+                claimed = []
+
+            if not claimed:
+                if self.once:
+                    return
+                self.stop_event.wait(settings.job_poll_interval_seconds)
+                continue
+
+            for job in claimed:
+                self.execute(job)
+
+    def maintain(self):
+        """维护线程：续期、处理超时任务、清理已完成任务"""
+        interval = max(1.0, settings.job_visibility_timeout_seconds / 3)
+        last_cleanup = 0.0
+        while not self.stop_event.wait(interval):
+            try:
+                with self.lock:
+                    job_ids = list(self.in_flight)
+                jobs.extend(job_ids, self.worker_id)
+                jobs.requeue_expired()
+
+                if time.monotonic() - last_cleanup > CLEANUP_INTERVAL_SECONDS:
+                    removed = jobs.cleanup_finished()
+                    if removed:
+                        logger.info(f"🧹 清理已完成任务 {removed} 个")
+                    last_cleanup = time.monotonic()
+            except Exception as e:
+                logger.error(f"任务维护失败: {e}")
+
+    def run(self):
+        if not self.once:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+            jobs.requeue_expired()
+
+        threads = []
+        for queue in self.queues:
+            # 每个队列的线程数等于并发上限，所有worker合计的上限由领取时计数保证
+            for index in range(settings.job_queue_concurrency.get(queue) or 1):
+                thread = threading.Thread(target=self.run_queue, args=(queue,), name=f"job-{queue}-{index}")
+                thread.start()
+                threads.append(thread)
+
+        maintainer = threading.Thread(target=self.maintain, name="job-maintain", daemon=True)
+        maintainer.start()
+
+        logger.info(f"👷 worker {self.worker_id} 已启动，队列: {', '.join(self.queues)}")
+        for thread in threads:
+            thread.join()
+        self.stop_event.set()
+        logger.info(f"👋 worker 退出: {self.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后台任务worker")
+    parser.add_argument("--queues", help="逗号分隔的队列名称（默认全部已配置队列）")
+    parser.add_argument("--once", action="store_true", help="处理完当前到期任务后退出")
+    args = parser.parse_args()
+
+    load_handlers()
+    queues = args.queues.split(",") if args.queues else sorted(
+        set(settings.job_queue_concurrency) | {handler.queue for handler in jobs.HANDLERS.values()}
+    )
+    Worker(queues, once=args.once).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量上传基准测试
+比较上传同一组文件的两种方式的吞吐量和SQL语句数：
+- 逐个上传：每个文件一次 POST /api/files/upload（每次预占、提交、刷新）
+- 批量上传：每 --batch-size 个文件一次 POST /api/files/upload/batch
+
+通过 TestClient 走完整的中间件和路由（不含网络传输）
+
+用法:
+    python benchmarks/batch_upload.py [--files 200] [--size-kb 200] [--batch-size 200]
+    默认使用临时SQLite库和临时上传目录，可通过 --database-url 指向MySQL测试库（不要指向生产库）
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_files(count: int, size_kb: int):
+    """生成测试图片（随机内容，走媒体提取任务的路径）"""
+    return [(f"photo{index}.jpg", os.urandom(size_kb * 1024)) for index in range(count)]
+
+
+def run(label: str, func, total_bytes: int, statements: list):
+    statements.clear()
+    started = time.perf_counter()
+    uploaded = func()
+    elapsed = time.perf_counter() - started
+    print(
+        f"  {label}: {elapsed:.2f}s, {uploaded / elapsed:.0f} 文件/s, "
+        f"{total_bytes / 1024 / 1024 / elapsed:.1f}MB/s, SQL {len(statements)} 条"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量上传基准测试")
+    parser.add_argument("--files", type=int, default=200, help="文件数")
+    parser.add_argument("--size-kb", type=int, default=200, help="单个文件大小(KB)")
+    parser.add_argument("--batch-size", type=int, default=200, help="批量上传每个请求的文件数")
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'xywh_bench_upload.db')}")
+    args = parser.parse_args()
+
+    upload_dir = tempfile.mkdtemp(prefix="xywh_bench_uploads_")
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["UPLOAD_DIR"] = upload_dir
+    os.environ["CACHE_ENABLED"] = "false"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["UPLOAD_BATCH_MAX_FILES"] = str(max(args.batch_size, 1))
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import main as backend
+    from app.database import engine
+
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    files = make_files(args.files, args.size_kb)
+    total_bytes = sum(len(data) for _, data in files)
+
+    def one_by_one():
+        for name, data in files:
+            response = client.post("/api/files/upload", files={"file": (name, data, "image/jpeg")})
+            assert response.status_code == 200, response.text
+        return len(files)
+
+    def batched():
+        uploaded = 0
+        for start in range(0, len(files), args.batch_size):
+            parts = [("files", (name, data, "image/jpeg")) for name, data in files[start:start + args.batch_size]]
+            response = client.post("/api/files/upload/batch", files=parts)
+            assert response.status_code == 200, response.text
+            result = response.json()["data"]
+            assert not result["failed"], result["failed"]
+            uploaded += len(result["uploaded"])
+        return uploaded
+
+    try:
+        with TestClient(backend.app) as client:
+            print(f"📤 {args.files} 个文件 x {args.size_kb}KB，批量每次 {args.batch_size} 个")
+            before = run("逐个上传", one_by_one, total_bytes, statements)
+            after = run("批量上传", batched, total_bytes, statements)
+            print(f"  吞吐量提升 {before / after:.1f} 倍")
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式导出内存基准测试
+向测试库写入N条美食记录，完整导出一遍，检查进程RSS峰值是否在预算内
+
+用法:
+    python benchmarks/export_memory.py [--rows 1000000] [--rss-budget-mb 64] [--format ndjson|csv]
+    默认使用临时SQLite库，可通过 --database-url 指向MySQL测试库（不要指向生产库）
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SEED_BATCH = 10000
+
+
+def current_rss_mb() -> float:
+    """读取当前进程RSS(MB)"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def seed(rows: int):
+    """写入测试数据（已有足够数据时跳过）"""
+    from sqlalchemy import func, insert, select
+    from app.database import SessionLocal, create_tables
+    from app.models import FoodRecord
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        existing = db.execute(select(func.count()).select_from(FoodRecord)).scalar()
+        for start in range(existing, rows, SEED_BATCH):
+            batch = [
+                {
+                    "name": f"测试美食{i}",
+                    "location": f"地点{i % 500}",
+                    "rating": (i % 10) + 0.5,
+                    "description": "这是一段用于导出测试的描述文字" * 3,
+                    "category": f"分类{i % 20}",
+                    "price": float(i % 300),
+                }
+                for i in range(start, min(start + SEED_BATCH, rows))
+            ]
+            db.execute(insert(FoodRecord), batch)
+            db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式导出内存基准测试")
+    parser.add_argument("--rows", type=int, default=1000000, help="导出行数")
+    parser.add_argument("--rss-budget-mb", type=float, default=64.0, help="导出期间允许的RSS增量(MB)")
+    parser.add_argument("--format", default="ndjson", choices=["ndjson", "csv"])
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'xywh_bench_export.db')}")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+
+    print(f"📥 准备测试数据: {args.rows} 行")
+    seed(args.rows)
+
+    from app.export import iter_csv, iter_ndjson
+    from app.models import FoodRecord
+
+    iterator = iter_csv if args.format == "csv" else iter_ndjson
+    baseline = current_rss_mb()
+    peak = baseline
+    total_bytes = 0
+    chunks = 0
+
+    start = time.time()
+    for chunk in iterator(FoodRecord):
+        total_bytes += len(chunk)
+        chunks += 1
+        if chunks % 50 == 0:
+            peak = max(peak, current_rss_mb())
+    elapsed = time.time() - start
+    peak = max(peak, current_rss_mb())
+
+    growth = peak - baseline
+    print("=" * 50)
+    print(f"格式: {args.format}  输出: {total_bytes / 1024 / 1024:.1f}MB  耗时: {elapsed:.1f}s")
+    print(f"RSS 基线: {baseline:.1f}MB  峰值: {peak:.1f}MB  增量: {growth:.1f}MB  预算: {args.rss_budget_mb}MB")
+
+    if growth > args.rss_budget_mb:
+        print("❌ 超出内存预算")
+        return 1
+    print("✅ 内存占用在预算内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似电影索引基准测试
+生成N部合成电影，分别计时：特征编码、全量 top-k 计算、单部电影增量更新、
+写入 movie_similar 表以及按电影ID查询相似列表的延迟
+
+用法:
+    python benchmarks/similar_movies.py [--movies 50000] [--k 10] [--lookups 1000]
+    默认使用临时SQLite库，可通过 --database-url 指向MySQL测试库（不要指向生产库）
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+GENRES = ["剧情", "喜剧", "动作", "爱情", "科幻", "动画", "悬疑", "惊悚", "恐怖", "纪录片", "犯罪", "奇幻"]
+WORDS = "画面 配乐 剧情 节奏 演技 结局 反转 感人 温暖 压抑 烧脑 特效 台词 镜头 人物 成长 家庭 友情 青春 回忆".split()
+
+
+def synthetic_movies(count: int, seed: int):
+    """(id, genre, director, rating, duration, review)"""
+    rng = random.Random(seed)
+    for movie_id in range(1, count + 1):
+        yield (
+            movie_id,
+            "/".join(rng.sample(GENRES, rng.randint(1, 3))),
+            f"导演{rng.randint(1, count // 20 + 1)}",
+            round(rng.uniform(3, 10), 1),
+            rng.randint(70, 180),
+            "，".join(rng.choices(WORDS, k=rng.randint(5, 30))),
+        )
+
+
+def timed(label: str, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    print(f"  {label}: {time.perf_counter() - started:.3f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相似电影索引基准测试")
+    parser.add_argument("--movies", type=int, default=50000, help="电影数量")
+    parser.add_argument("--k", type=int, default=10, help="每部电影保存的相似电影数")
+    parser.add_argument("--lookups", type=int, default=1000, help="查询次数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'xywh_bench_similar.db')}")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+
+    import numpy as np
+    from app.models import MovieSimilar
+    from app.database import SessionLocal, create_tables
+    from app.similar import SimilarIndex, feature_matrix, movie_vector, write_lists
+
+    print(f"🎬 {args.movies} 部电影, k={args.k}")
+    rows = list(synthetic_movies(args.movies, args.seed))
+    ids, features = timed("特征编码", feature_matrix, rows)
+    index = timed("全量 top-k", SimilarIndex.build, ids, features, args.k)
+
+    # 修改一部电影（换成另一部电影的特征），只重算受影响的列表
+    changed = rows[len(rows) // 2]
+    donor = rows[0]
+    vector = movie_vector(*donor[1:])[np.newaxis, :]
+    updated = timed("单部电影增量更新", index.update, np.array([changed[0]]), vector, [])
+    print(f"  增量更新重写列表: {len(updated)} 个")
+    print(f"  修改后最相似: {index.similar(changed[0])[0][0]} (特征来源 {donor[0]})")
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        db.query(MovieSimilar).delete(synchronize_session=False)
+
+        def write_all():
+            write_lists(db, index, ids.tolist())
+            db.commit()
+
+        timed("写入 movie_similar", write_all)
+
+        rng = random.Random(args.seed)
+        latencies = []
+        for _ in range(args.lookups):
+            movie_id = rng.randint(1, args.movies)
+            started = time.perf_counter()
+            db.query(MovieSimilar.similar_id, MovieSimilar.score).filter(
+                MovieSimilar.movie_id == movie_id
+            ).order_by(MovieSimilar.sort_order).all()
+            latencies.append(time.perf_counter() - started)
+    finally:
+        db.close()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"  查询延迟: p50 {p50:.3f}ms, p99 {p99:.3f}ms ({args.lookups} 次)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+worker启动耗时基准测试
+反复启动单worker服务，统计从fork到首个请求返回的毫秒数，
+以及就绪后首次请求业务接口（--probe-paths）的耗时，用于比较开启/关闭预热（--warmup）的差异
+
+用法:
+    python benchmarks/startup_time.py [--runs 5] [--schema-check fingerprint|always|off] [--warmup on|off]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_first_response(url: str, deadline: float) -> bool:
+    """轮询直到服务返回200"""
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if resp.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.005)
+    return False
+
+
+def timed_get(url: str) -> float:
+    """请求一次并返回毫秒数"""
+    start = time.time()
+    with urllib.request.urlopen(url, timeout=10) as resp:
+        resp.read()
+    return (time.time() - start) * 1000
+
+
+def run_once(port: int, schema_check: str, timeout: float, warmup: str = "on", probe_paths=()):
+    """启动一次服务并返回(客户端测得毫秒数, 服务端启动报告, 各业务接口首次请求毫秒数)"""
+    env = dict(os.environ, SCHEMA_CHECK=schema_check, WARMUP_ENABLED="true" if warmup == "on" else "false")
+    cmd = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"
+    ]
+
+    start = time.time()
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    try:
+        if not wait_first_response(f"http://127.0.0.1:{port}/api/health", start + timeout):
+            raise RuntimeError("服务启动超时")
+        elapsed_ms = (time.time() - start) * 1000
+        probes = {path: timed_get(f"http://127.0.0.1:{port}{path}") for path in probe_paths}
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health/startup", timeout=5) as resp:
+            report = json.loads(resp.read())
+        return elapsed_ms, report, probes
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="worker启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="启动次数")
+    parser.add_argument("--port", type=int, default=8765, help="测试端口")
+    parser.add_argument("--schema-check", default="fingerprint", choices=["fingerprint", "always", "off"])
+    parser.add_argument("--timeout", type=float, default=60.0, help="单次启动超时(秒)")
+    parser.add_argument("--warmup", default="on", choices=["on", "off"], help="是否开启worker预热")
+    parser.add_argument("--probe-paths", default="/api/food,/api/timeline,/api/files/stats/summary",
+                        help="就绪后首次请求的业务接口（逗号分隔）")
+    args = parser.parse_args()
+
+    probe_paths = [path for path in args.probe_paths.split(",") if path]
+    totals = []
+    warmups = []
+    probe_totals = {path: [] for path in probe_paths}
+    for i in range(args.runs):
+        elapsed_ms, report, probes = run_once(args.port, args.schema_check, args.timeout, args.warmup, probe_paths)
+        totals.append(elapsed_ms)
+        if "warmup" in report:
+            warmups.append(report["warmup"]["total_ms"])
+        for path, ms in probes.items():
+            probe_totals[path].append(ms)
+        print(f"第{i + 1}次: 启动到首个请求 {elapsed_ms:.1f}ms, 服务端阶段(ms): {report['phases_ms']}")
+
+    print("=" * 50)
+    print(f"模式: {args.schema_check}, 预热: {args.warmup}, 次数: {args.runs}")
+    print(f"最小: {min(totals):.1f}ms  中位数: {statistics.median(totals):.1f}ms  最大: {max(totals):.1f}ms")
+    if warmups:
+        print(f"预热耗时中位数: {statistics.median(warmups):.1f}ms")
+    for path, values in probe_totals.items():
+        print(f"首次请求 {path}: 中位数 {statistics.median(values):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
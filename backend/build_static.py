@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前端静态资源构建脚本
+为 index.html 引用的脚本、样式和图片生成带内容哈希的文件名，
+改写 index.html 中的引用，并生成 .gz / .br 预压缩文件
+
+用法:
+    python build_static.py [--src 前端目录] [--out 输出目录]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+# 参与指纹化的资源扩展名
+HASHED_EXTS = {
+    ".js", ".css", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".svg",
+    ".webp", ".woff", ".woff2", ".ttf", ".mp3"
+}
+
+# 需要生成预压缩版本的扩展名
+COMPRESSIBLE_EXTS = {".js", ".css", ".html", ".json", ".svg", ".xml", ".txt", ".ico"}
+
+# 需要整体复制到输出目录的前端目录
+ASSET_DIRS = ["scripts", "styles", "logo"]
+
+HASH_LENGTH = 10
+
+# index.html 中的 href/src 引用
+HTML_REF_RE = re.compile(r'(?P<attr>\b(?:href|src))=(?P<quote>["\'])(?P<url>[^"\']+)(?P=quote)')
+# CSS 中的 url() 引用
+CSS_URL_RE = re.compile(r'url\(\s*(?P<quote>["\']?)(?P<url>[^"\')]+)(?P=quote)\s*\)')
+
+
+def is_local_ref(url: str) -> bool:
+    """判断引用是否指向本地文件"""
+    return not re.match(r"^(?:[a-z]+:|//|#)", url, re.IGNORECASE)
+
+
+def content_hash(data: bytes) -> str:
+    """计算内容哈希"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(rel_path: str, digest: str) -> str:
+    """生成带哈希的文件名, 例如 scripts/main.js -> scripts/main.1a2b3c4d5e.js"""
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}.{digest}{ext}"
+
+
+def write_compressed(path: str, data: bytes, brotli_module=None):
+    """写出 .gz / .br 预压缩文件（仅在压缩后更小时保留）"""
+    gz_data = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz_data) < len(data):
+        with open(path + ".gz", "wb") as f:
+            f.write(gz_data)
+
+    if brotli_module is not None:
+        br_data = brotli_module.compress(data, quality=11)
+        if len(br_data) < len(data):
+            with open(path + ".br", "wb") as f:
+                f.write(br_data)
+
+
+class AssetBuilder:
+    """静态资源构建器"""
+
+    def __init__(self, src_dir: str, out_dir: str):
+        self.src_dir = os.path.abspath(src_dir)
+        self.out_dir = os.path.abspath(out_dir)
+        self.manifest = {}
+        self.missing = set()
+
+        try:
+            import brotli
+            self.brotli = brotli
+        except ImportError:
+            self.brotli = None
+
+    def emit(self, rel_path: str, data: bytes):
+        """写出文件及其预压缩版本"""
+        target = os.path.join(self.out_dir, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+
+        if os.path.splitext(rel_path)[1].lower() in COMPRESSIBLE_EXTS:
+            write_compressed(target, data, self.brotli)
+
+    def resolve(self, url: str, base_rel_dir: str):
+        """把引用地址解析为相对于前端根目录的路径"""
+        path = url.split("?", 1)[0].split("#", 1)[0]
+        if path.startswith("/"):
+            rel = path.lstrip("/")
+        else:
+            rel = os.path.normpath(os.path.join(base_rel_dir, path))
+        rel = rel.replace(os.sep, "/")
+        if rel.startswith("../"):
+            return None
+        return rel
+
+    def fingerprint(self, rel_path: str):
+        """为单个资源生成哈希文件，返回哈希后的相对路径"""
+        if rel_path in self.manifest:
+            return self.manifest[rel_path]
+
+        src = os.path.join(self.src_dir, rel_path)
+        if not os.path.isfile(src):
+            self.missing.add(rel_path)
+            return None
+
+        with open(src, "rb") as f:
+            data = f.read()
+
+        if rel_path.endswith(".css"):
+            data = self.rewrite_css(data, os.path.dirname(rel_path))
+
+        target = hashed_name(rel_path, content_hash(data))
+        self.emit(target, data)
+        self.manifest[rel_path] = target
+        return target
+
+    def rewrite_ref(self, url: str, base_rel_dir: str) -> str:
+        """改写单个引用为哈希后的地址"""
+        if not is_local_ref(url):
+            return url
+
+        rel = self.resolve(url, base_rel_dir)
+        if rel is None or os.path.splitext(rel)[1].lower() not in HASHED_EXTS:
+            return url
+
+        target = self.fingerprint(rel)
+        if target is None:
+            return url
+
+        suffix = url[len(url.split("?", 1)[0].split("#", 1)[0]):]
+        new_url = os.path.relpath(target, base_rel_dir or ".").replace(os.sep, "/")
+        if url.startswith("./") and not new_url.startswith("."):
+            new_url = "./" + new_url
+        return new_url + suffix
+
+    def rewrite_css(self, data: bytes, base_rel_dir: str) -> bytes:
+        """改写CSS中的 url() 引用"""
+        text = data.decode("utf-8")
+
+        def replace(match):
+            url = match.group("url")
+            if url.startswith("data:"):
+                return match.group(0)
+            quote = match.group("quote")
+            return f"url({quote}{self.rewrite_ref(url, base_rel_dir)}{quote})"
+
+        return CSS_URL_RE.sub(replace, text).encode("utf-8")
+
+    def rewrite_html(self, html: str) -> str:
+        """改写HTML中的 href/src 引用"""
+
+        def replace(match):
+            url = self.rewrite_ref(match.group("url"), "")
+            quote = match.group("quote")
+            return f"{match.group('attr')}={quote}{url}{quote}"
+
+        return HTML_REF_RE.sub(replace, html)
+
+    def copy_originals(self):
+        """复制未哈希的原始资源（供 manifest.json 等按固定文件名引用）"""
+        for dirname in ASSET_DIRS:
+            src_root = os.path.join(self.src_dir, dirname)
+            if not os.path.isdir(src_root):
+                continue
+            for root, _, filenames in os.walk(src_root):
+                for filename in filenames:
+                    src = os.path.join(root, filename)
+                    rel = os.path.relpath(src, self.src_dir).replace(os.sep, "/")
+                    with open(src, "rb") as f:
+                        self.emit(rel, f.read())
+
+    def build(self):
+        """执行构建"""
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.makedirs(self.out_dir)
+
+        self.copy_originals()
+
+        with open(os.path.join(self.src_dir, "index.html"), "r", encoding="utf-8") as f:
+            html = f.read()
+        self.emit("index.html", self.rewrite_html(html).encode("utf-8"))
+
+        with open(os.path.join(self.out_dir, "asset-manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+        return self.manifest
+
+
+def main():
+    default_src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="构建带指纹和预压缩的前端静态资源")
+    parser.add_argument("--src", default=default_src, help="前端源码目录(包含index.html)")
+    parser.add_argument("--out", default=os.path.join(default_src, "dist"), help="输出目录")
+    args = parser.parse_args()
+
+    builder = AssetBuilder(args.src, args.out)
+    manifest = builder.build()
+
+    print(f"✅ 已生成 {len(manifest)} 个指纹资源 -> {builder.out_dir}")
+    if builder.brotli is None:
+        print("⚠️ 未安装brotli，仅生成 .gz 预压缩文件 (pip install brotli)")
+    for rel in sorted(builder.missing):
+        print(f"⚠️ 引用的文件不存在，保持原引用: {rel}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,7 @@ NGINX_CONF_DIR="/www/server/nginx/conf/conf.d"
 SITE_CONF="${NGINX_CONF_DIR}/xiaoyuweihan.conf"
 PYTHON_BIN="/usr/local/bin/python3.10"
 SERVICE_NAME="xiaoyuweihan-backend"
+WORKER_SERVICE_NAME="xiaoyuweihan-worker"
 SYSTEMD_DIR="/etc/systemd/system"
 
 # 颜色定义
@@ -212,10 +213,12 @@ setup_systemd_service() {
     
     # 复制systemd服务文件
     cp "${BACKEND_DIR}/xiaoyuweihan-backend.service" "${SYSTEMD_DIR}/${SERVICE_NAME}.service"
+    cp "${BACKEND_DIR}/xiaoyuweihan-worker.service" "${SYSTEMD_DIR}/${WORKER_SERVICE_NAME}.service"
     
     # 重载systemd并启用服务
     systemctl daemon-reload
     systemctl enable "$SERVICE_NAME"
+    systemctl enable "$WORKER_SERVICE_NAME"
     
     log_success "系统服务配置完成"
 }
@@ -250,12 +253,14 @@ start_services() {
     # 停止可能运行的旧服务
     log_info "停止旧服务..."
     systemctl stop "$SERVICE_NAME" 2>/dev/null || true
+    systemctl stop "$WORKER_SERVICE_NAME" 2>/dev/null || true
     pkill -f "gunicorn.*main:app" 2>/dev/null || true
     sleep 2
     
     # 启动新服务
     log_info "启动后端服务..."
     systemctl start "$SERVICE_NAME"
+    systemctl start "$WORKER_SERVICE_NAME"
     
     # 等待服务启动
     sleep 3
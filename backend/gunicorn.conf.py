@@ -5,6 +5,8 @@ Gunicorn配置文件 - 小雨微寒后端服务
 
 import multiprocessing
 import os
+import subprocess
+import sys
 
 # 服务器配置
 bind = "127.0.0.1:8000"
@@ -45,12 +47,31 @@ limit_request_field_size = 8190
 # keyfile = "/path/to/keyfile"
 # certfile = "/path/to/certfile"
 
+def start_cache_server(server):
+    """启动（或重启已退出的）共享缓存守护进程"""
+    from app.config import settings
+    if not settings.cache_enabled:
+        return
+    process = getattr(server, "cache_process", None)
+    if process is not None and process.poll() is None:
+        return
+    server.cache_process = subprocess.Popen([sys.executable, "-m", "app.cache_server"], cwd=chdir)
+    server.log.info("Cache server started (pid: %s)", server.cache_process.pid)
+
+def on_starting(server):
+    """master启动时的钩子"""
+    start_cache_server(server)
+
 def pre_fork(server, worker):
     """工作进程fork前的钩子"""
+    # worker重启时顺带检查缓存守护进程是否存活
+    start_cache_server(server)
     server.log.info("Worker spawned (pid: %s)", worker.pid)
 
 def post_fork(server, worker):
     """工作进程fork后的钩子"""
+    from app import startup
+    startup.mark_fork()
     server.log.info("Worker spawned (pid: %s)", worker.pid)
 
 def worker_exit(server, worker):
@@ -63,4 +84,8 @@ def when_ready(server):
 
 def on_exit(server):
     """服务器退出时的钩子"""
+    process = getattr(server, "cache_process", None)
+    if process is not None and process.poll() is None:
+        process.terminate()
+        process.wait(timeout=10)
     server.log.info("小雨微寒后端服务已停止")
\ No newline at end of file
@@ -9,13 +9,25 @@ Author: XYWH
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-import uvicorn
 import os
+import asyncio
 from contextlib import asynccontextmanager
 
-from app.database import engine, create_tables
-from app.routers import food, movie, calendar, files
+from app import startup, warmup
+from app.cache import ResponseCacheMiddleware, client as cache_client
+from app.coalesce import SingleFlightMiddleware, single_flight
+from app.profiler import ProfilerMiddleware, continuous as continuous_profiler
+from app.rate_limit import RateLimitMiddleware
+from app.read_routing import ReadRoutingMiddleware
+from app.config import settings
+from app.counters import flush as flush_download_counts, periodic_flush as periodic_flush_download_counts
+from app.database import create_tables, ensure_schema
+from app.file_gc import periodic_reconcile
+from app.storage_usage import seed_ledger
+from app.routers import food, movie, calendar, files, jobs, timeline, sync, events
+from app.events import broker as event_broker
+from app.sync import periodic_compact
+from app.tiering import periodic_tiering
 
 
 @asynccontextmanager
@@ -23,11 +35,42 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时创建数据库表
     print("🚀 正在启动小雨微寒后端服务...")
-    create_tables()
+    startup.mark("lifespan_start")
+    if settings.schema_check == "always":
+        create_tables()
+    elif settings.schema_check == "fingerprint":
+        ensure_schema()
+    # 存储台账为空（如首次创建台账表）时按现有记录初始化
+    seed_ledger()
+    startup.mark("schema_ready")
     print("✅ 数据库表初始化完成")
+    background_tasks = []
+    if settings.file_gc_interval_seconds > 0:
+        background_tasks.append(asyncio.create_task(periodic_reconcile()))
+    if settings.download_count_flush_seconds > 0:
+        background_tasks.append(asyncio.create_task(periodic_flush_download_counts()))
+    if settings.tiering_interval_seconds > 0:
+        background_tasks.append(asyncio.create_task(periodic_tiering()))
+    if settings.sync_compact_interval_seconds > 0:
+        background_tasks.append(asyncio.create_task(periodic_compact()))
+    background_tasks.append(asyncio.create_task(event_broker.run()))
+    if settings.profile_continuous_hz > 0:
+        continuous_profiler.start(asyncio.get_running_loop())
+    # 预热完成后才结束生命周期启动，此前worker不接受请求
+    if settings.warmup_enabled:
+        await warmup.run(app)
+    startup.mark("ready")
     yield
     # 关闭时清理资源
     print("🛑 正在关闭后端服务...")
+    event_broker.close()
+    continuous_profiler.stop()
+    for task in background_tasks:
+        task.cancel()
+    try:
+        flush_download_counts()
+    except Exception as e:
+        print(f"⚠️ 写入下载次数失败: {e}")
 
 
 # 创建FastAPI应用
@@ -40,6 +83,21 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 共享响应缓存（位于限流之内，命中的请求同样计入限流额度）
+app.add_middleware(ResponseCacheMiddleware)
+
+# 合并同一worker上并发的相同GET请求（位于缓存之外，等待中的请求不再访问缓存）
+app.add_middleware(SingleFlightMiddleware)
+
+# 采样分析（位于缓存与请求合并之外，被分析的请求总是实际执行）
+app.add_middleware(ProfilerMiddleware)
+
+# 读写分离：只读请求读副本，写请求后固定该客户端读主库
+app.add_middleware(ReadRoutingMiddleware)
+
+# 限流与过载保护（先注册，位于CORS之内，429/503响应同样带有CORS头）
+app.add_middleware(RateLimitMiddleware)
+
 # 配置CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -57,16 +115,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 记录worker首个请求耗时
+app.add_middleware(startup.FirstRequestTimer)
+
 # 注册路由
 app.include_router(food.router, prefix="/api", tags=["美食记录"])
 app.include_router(movie.router, prefix="/api", tags=["电影记录"]) 
 app.include_router(calendar.router, prefix="/api", tags=["日历备注"])
 app.include_router(files.router, prefix="/api", tags=["文件管理"])
+app.include_router(jobs.router, prefix="/api", tags=["后台任务"])
+app.include_router(timeline.router, prefix="/api", tags=["时间线"])
+app.include_router(sync.router, prefix="/api", tags=["增量同步"])
+app.include_router(events.router, prefix="/api", tags=["数据变更推送"])
 
 
 @app.get("/")
 async def root():
     """根路径"""
+    if settings.static_dir:
+        from app.static import index_response
+        return index_response(settings.static_dir)
     return {"message": "小雨微寒个人网站后端服务", "version": "2.0.0", "status": "running"}
 
 
@@ -80,6 +148,25 @@ async def health_check():
     }
 
 
+@app.get("/api/health/startup")
+async def startup_report():
+    """worker启动耗时报告"""
+    return startup.report()
+
+
+@app.get("/api/health/cache")
+async def cache_stats():
+    """共享缓存命中统计"""
+    stats = cache_client.stats()
+    return {"enabled": settings.cache_enabled, "available": stats is not None, "stats": stats}
+
+
+@app.get("/api/health/coalesce")
+async def coalesce_stats():
+    """本worker的请求合并统计（saved 为节省的执行次数）"""
+    return {"enabled": settings.coalesce_enabled, "stats": single_flight.stats()}
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """全局异常处理"""
@@ -93,8 +180,15 @@ async def global_exception_handler(request, exc):
     )
 
 
+# 静态资源服务模式：挂载构建产物（必须放在所有API路由之后）
+if settings.static_dir:
+    from app.static import PrecompressedStaticFiles
+    app.mount("/", PrecompressedStaticFiles(directory=settings.static_dir, html=True), name="static")
+
+
 if __name__ == "__main__":
     # 本地开发运行
+    import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+读写分离测试脚本
+用两个本地数据库实例验证：只读请求读副本、写后读主库、副本延迟过大时回到主库
+
+用法:
+    # 两个互不复制的实例（脚本手动同步心跳来模拟复制）
+    python test_replicas.py --primary mysql+pymysql://u:p@127.0.0.1:3306/xywh \\
+                            --replica mysql+pymysql://u:p@127.0.0.1:3307/xywh
+    # 也可以使用两个SQLite文件
+    python test_replicas.py --primary sqlite:////tmp/primary.db --replica sqlite:////tmp/replica.db
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="读写分离测试")
+    parser.add_argument("--primary", required=True, help="主库URL")
+    parser.add_argument("--replica", required=True, help="副本URL（与主库之间不需要配置复制）")
+    args = parser.parse_args()
+
+    # 必须在导入应用之前设置
+    os.environ["DATABASE_URL"] = args.primary
+    os.environ["REPLICA_URLS"] = json.dumps([args.replica])
+    os.environ["CACHE_ENABLED"] = "false"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["REPLICA_LAG_CHECK_SECONDS"] = "0"
+
+    from fastapi.testclient import TestClient
+    from app import models  # noqa: F401
+    from app.config import settings
+    from app.database import Base, engine, replica_heartbeat, replicas
+    from app.read_routing import PIN_COOKIE
+    from main import app
+
+    replica = replicas.engines[0]
+    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=replica)
+
+    def sync_heartbeat(age_seconds: float = 0):
+        """模拟复制：把主库心跳（减去 age_seconds）写到副本"""
+        beat_ms = int((time.time() - age_seconds) * 1000)
+        with replica.begin() as connection:
+            connection.execute(replica_heartbeat.delete())
+            connection.execute(replica_heartbeat.insert().values(id=1, beat_ms=beat_ms))
+
+    def food_total(client, **kwargs) -> int:
+        return client.get("/api/food", **kwargs).json()["total"]
+
+    with TestClient(app) as client:
+        results = []
+
+        # 主库写入一条记录；副本上没有这条记录，读到的总数不同即可区分读的是哪个库
+        primary_before = food_total(client, cookies={PIN_COOKIE: str(time.time() + 60)})
+        response = client.post("/api/food/", json={"name": "读写分离测试"})
+        assert response.status_code == 200, response.text
+        pinned_cookie = response.cookies.get(PIN_COOKIE)
+        print(f"📝 写入主库，Set-Cookie {PIN_COOKIE}={pinned_cookie}")
+        client.cookies.clear()
+
+        sync_heartbeat()
+        replica_total = food_total(client)
+        results.append(("只读请求读副本", replica_total != primary_before + 1))
+
+        pinned_total = food_total(client, cookies={PIN_COOKIE: pinned_cookie})
+        results.append(("写后读主库", pinned_total == primary_before + 1))
+
+        sync_heartbeat(age_seconds=settings.replica_max_lag_seconds + 5)
+        lagging_total = food_total(client)
+        results.append((f"副本延迟 {replicas.lag_seconds()[0]}s 时回到主库", lagging_total == primary_before + 1))
+
+        print("=" * 50)
+        for name, passed in results:
+            print(f"{'✅' if passed else '❌'} {name}")
+        return 0 if all(passed for _, passed in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量同步测试脚本
+验证单个上传和批量上传的文件都以具体记录出现在 /api/sync 的 upserted 中（不触发全量重置）
+
+用法:
+    python test_sync.py
+    默认使用临时SQLite库和临时上传目录，可通过 --database-url 指向MySQL测试库（不要指向生产库）
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量同步测试")
+    parser.add_argument("--database-url", default=f"sqlite:///{tempfile.mkdtemp(prefix='xywh_sync_')}/sync.db")
+    args = parser.parse_args()
+
+    # 必须在导入应用之前设置
+    upload_dir = tempfile.mkdtemp(prefix="xywh_sync_uploads_")
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["UPLOAD_DIR"] = upload_dir
+    os.environ["CACHE_ENABLED"] = "false"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["SYNC_SETTLE_SECONDS"] = "0"
+
+    from fastapi.testclient import TestClient
+    from main import app
+
+    def sync(client, token: str) -> dict:
+        response = client.get("/api/sync", params={"since": token})
+        assert response.status_code == 200, response.text
+        return response.json()["data"]
+
+    def upserted_ids(result: dict) -> set:
+        return {record["id"] for record in result["changes"].get("file", {}).get("upserted", [])}
+
+    try:
+        with TestClient(app) as client:
+            results = []
+            token = client.get("/api/sync").json()["data"]["token"]
+
+            response = client.post("/api/files/upload", files={"file": ("single.txt", b"single", "text/plain")})
+            assert response.status_code == 200, response.text
+            single_id = response.json()["data"]["id"]
+            result = sync(client, token)
+            results.append(("单个上传出现在 upserted 中", not result["reset"] and single_id in upserted_ids(result)))
+            token = result["token"]
+
+            parts = [("files", (f"batch{index}.txt", f"batch {index}".encode(), "text/plain")) for index in range(3)]
+            response = client.post("/api/files/upload/batch", files=parts)
+            assert response.status_code == 200, response.text
+            batch_ids = {record["id"] for record in response.json()["data"]["uploaded"]}
+            result = sync(client, token)
+            results.append(("批量上传不触发全量重置", not result["reset"]))
+            results.append(("批量上传的文件都出现在 upserted 中", len(batch_ids) == 3 and batch_ids <= upserted_ids(result)))
+
+            print("=" * 50)
+            for name, passed in results:
+                print(f"{'✅' if passed else '❌'} {name}")
+            return 0 if all(passed for _, passed in results) else 1
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,7 @@ set -e
 SITE_ROOT="/www/wwwroot/xiaoyuweihan"
 BACKEND_DIR="${SITE_ROOT}/backend"
 SERVICE_NAME="xiaoyuweihan-backend"
+WORKER_SERVICE_NAME="xiaoyuweihan-worker"
 
 # 颜色定义
 RED='\033[0;31m'
@@ -58,6 +59,7 @@ stop_services() {
         log_warning "无法通过systemctl停止服务，尝试直接杀死进程"
         pkill -f "gunicorn.*main:app" 2>/dev/null || true
     }
+    systemctl stop "$WORKER_SERVICE_NAME" 2>/dev/null || true
     
     sleep 2
     log_success "服务已停止"
@@ -161,6 +163,7 @@ start_services() {
     log_info "🚀 启动服务..."
     
     systemctl start "$SERVICE_NAME"
+    systemctl start "$WORKER_SERVICE_NAME" 2>/dev/null || log_warning "任务worker服务未安装"
     sleep 3
     
     if systemctl is-active --quiet "$SERVICE_NAME"; then
@@ -160,6 +160,22 @@ class ApiService {
         });
     }
     
+    // 批量上传：返回 { uploaded: [...], failed: [{ index, filename, error }] }
+    async uploadFiles(files, description = '', category = '') {
+        const formData = new FormData();
+        for (const file of files) {
+            formData.append('files', file);
+        }
+        if (description) formData.append('description', description);
+        if (category) formData.append('custom_category', category);
+        
+        return await this.request('/files/upload/batch', {
+            method: 'POST',
+            headers: {}, // 让浏览器设置Content-Type
+            body: formData
+        });
+    }
+    
     async updateFileInfo(id, data) {
         return await this.request(`/files/${id}`, {
             method: 'PUT',
@@ -181,6 +197,39 @@ class ApiService {
         return `${this.baseURL}/api/files/download/${fileId}`;
     }
     
+    // 打包下载地址：{ ids: [1, 2, 3] } 或 { category, file_type }
+    getArchiveUrl(params = {}) {
+        const query = { ...params };
+        if (Array.isArray(query.ids)) {
+            query.ids = query.ids.join(',');
+        }
+        return `${this.baseURL}/api/files/archive?${new URLSearchParams(query).toString()}`;
+    }
+    
+    // 时间线API（各类记录按创建时间倒序合并，翻页时传入上一页的 next_cursor）
+    async getTimeline(params = {}) {
+        const queryString = new URLSearchParams(params).toString();
+        const endpoint = `/timeline${queryString ? '?' + queryString : ''}`;
+        return await this.request(endpoint);
+    }
+    
+    // 增量同步API（since 为上次返回的 token；reset 为 true 时需全量拉取各列表）
+    async syncChanges(since = null, limit = 500) {
+        const params = { limit };
+        if (since !== null) params.since = since;
+        return await this.request(`/sync?${new URLSearchParams(params).toString()}`);
+    }
+    
+    // 数据变更推送（SSE），返回 EventSource，调用 close() 取消订阅
+    // onChange({entity, id, op, version})；onReset() 表示错过了变更，需重新拉取列表
+    subscribeChanges(onChange, { types = [], onReset = null } = {}) {
+        const query = types.length ? `?types=${types.join(',')}` : '';
+        const source = new EventSource(`${this.baseURL}/api/events${query}`);
+        source.addEventListener('change', (event) => onChange(JSON.parse(event.data)));
+        source.addEventListener('reset', () => onReset && onReset());
+        return source;
+    }
+    
     // 健康检查
     async healthCheck() {
         return await this.request('/health');